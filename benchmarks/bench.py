@@ -0,0 +1,208 @@
+"""
+Benchmark servisnog sloja nad sintetickim podacima.
+
+Primer:
+    python -m benchmarks.bench --canteens 20 --students 20000 --reservations 100000 --days 30 --output bench.json
+    python -m benchmarks.bench ... --baseline bench.json --threshold 0.25
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time as timer
+from datetime import date, time, timedelta
+from typing import Callable, Dict, List
+
+from src.domain.models import Canteen, Student
+from src.dto.reservation_dto import CreateReservationDTO
+from src.repository.repo import MemoryRepository
+from src.services.canteen_service import CanteenService
+from src.services.reservation_service import ReservationService, MAX_BATCH_SIZE
+
+WORKING_HOURS = [
+    {"meal": "breakfast", "from": "07:00", "to": "10:00"},
+    {"meal": "lunch", "from": "12:00", "to": "16:00"},
+    {"meal": "dinner", "from": "18:00", "to": "21:00"},
+]
+SLOT_STARTS = [time(h, m) for h in list(range(7, 10)) + list(range(12, 16)) + list(range(18, 21)) for m in (0, 30)]
+
+
+class Dataset:
+    def __init__(self, repo, canteens: List[Canteen], students: List[Student], first_day: date, days: int):
+        self.repo = repo
+        self.canteens = canteens
+        self.students = students
+        self.first_day = first_day
+        self.days = days
+
+
+def create_repository(backend: str):
+    if backend == "sqlite":
+        from src.repository.sqlite_repo import SqliteRepository
+        return SqliteRepository(os.path.join(tempfile.mkdtemp(prefix="canteen-bench-"), "bench.db"))
+    return MemoryRepository()
+
+
+def random_payload(rng: random.Random, dataset: Dataset, student: Student, canteen: Canteen) -> CreateReservationDTO:
+    return CreateReservationDTO(
+        studentId=student.id,
+        canteenId=canteen.id,
+        date=dataset.first_day + timedelta(days=rng.randrange(dataset.days)),
+        time=rng.choice(SLOT_STARTS),
+        duration=rng.choice([30, 60]),
+    )
+
+
+def build_dataset(args, rng: random.Random) -> Dataset:
+    repo = create_repository(args.backend)
+    canteens = [repo.add_canteen(Canteen(name=f"Menza {i}", location="Bench", capacity=args.capacity, workingHours=WORKING_HOURS))
+                for i in range(args.canteens)]
+    students = repo.add_students([Student(name=f"Student {i}", email=f"student{i}@bench.test") for i in range(args.students)])
+    dataset = Dataset(repo, canteens, students, date.today() + timedelta(days=1), args.days)
+
+    payloads = [random_payload(rng, dataset, rng.choice(students), rng.choice(canteens)) for _ in range(args.reservations)]
+    book_in_batches(ReservationService(repo), payloads)
+    return dataset
+
+
+def book_in_batches(reservation_service: ReservationService, payloads: List[CreateReservationDTO]):
+    for offset in range(0, len(payloads), MAX_BATCH_SIZE):
+        reservation_service.create_reservations(payloads[offset:offset + MAX_BATCH_SIZE])
+
+
+def measure(operation: Callable[[], object], repeat: int) -> Dict:
+    samples = []
+    for _ in range(repeat):
+        start = timer.perf_counter()
+        operation()
+        samples.append(timer.perf_counter() - start)
+    return summarize(samples)
+
+
+def summarize(samples: List[float]) -> Dict:
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+def run_benchmarks(args) -> Dict:
+    rng = random.Random(args.seed)
+
+    setup_start = timer.perf_counter()
+    dataset = build_dataset(args, rng)
+    setup_seconds = timer.perf_counter() - setup_start
+
+    repo = dataset.repo
+    reservation_service = ReservationService(repo)
+    canteen_service = CanteenService(repo, capacity_engine=args.engine, status_cache_size=0)
+    admin = repo.add_student(Student(name="Bench Admin", email="admin@bench.test", isAdmin=True))
+
+    # Novi studenti, da merenje kreiranja ne zavisi od preklapanja sa postojecim rezervacijama
+    bench_students = iter(repo.add_students([Student(name=f"Bench {i}", email=f"bench{i}@bench.test") for i in range(args.repeat)]))
+    created = []
+
+    def create():
+        payload = random_payload(rng, dataset, next(bench_students), rng.choice(dataset.canteens))
+        try:
+            created.append(reservation_service.create_reservation(payload))
+        except ValueError:
+            pass
+
+    def cancel():
+        if created:
+            reservation = created.pop()
+            reservation_service.cancel_reservation(reservation.id, reservation.studentId)
+
+    last_day = dataset.first_day + timedelta(days=dataset.days - 1)
+
+    def capacity_status():
+        canteen_service.get_capacity_status(None, dataset.first_day, last_day, time(7, 0), time(21, 0), 30)
+
+    def delete_cascade():
+        canteen = repo.add_canteen(Canteen(name="Za brisanje", location="Bench", capacity=args.capacity, workingHours=WORKING_HOURS))
+        book_in_batches(reservation_service, [random_payload(rng, dataset, rng.choice(dataset.students), canteen) for _ in range(args.cascade_size)])
+        start = timer.perf_counter()
+        canteen_service.delete_canteen(admin.id, canteen.id)
+        return timer.perf_counter() - start
+
+    results = {
+        "create_reservation": measure(create, args.repeat),
+        "cancel_reservation": measure(cancel, args.repeat),
+        "get_capacity_status": measure(capacity_status, args.status_repeat),
+    }
+
+    # Meri se samo brisanje, ne i pravljenje rezervacija koje se brisu
+    results["delete_canteen_cascade"] = summarize([delete_cascade() for _ in range(args.cascade_repeat)])
+
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "threshold")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "setup_seconds": setup_seconds,
+        "results": results,
+    }
+
+
+def compare_with_baseline(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    regressions = []
+    for name, metrics in current["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        limit = previous["p50_ms"] * (1 + threshold)
+        if metrics["p50_ms"] > limit:
+            regressions.append(f"{name}: p50 {metrics['p50_ms']:.3f} ms > {limit:.3f} ms (baseline {previous['p50_ms']:.3f} ms)")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark servisa za rezervaciju menzi")
+    parser.add_argument("--canteens", type=int, default=10)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--reservations", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--capacity", type=int, default=200)
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--engine", choices=["python", "numpy"], default="python")
+    parser.add_argument("--repeat", type=int, default=500, help="broj merenja za kreiranje i otkazivanje")
+    parser.add_argument("--status-repeat", type=int, default=20)
+    parser.add_argument("--cascade-repeat", type=int, default=5)
+    parser.add_argument("--cascade-size", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="putanja JSON fajla sa rezultatima")
+    parser.add_argument("--baseline", help="JSON rezultati prethodnog pokretanja za poredjenje")
+    parser.add_argument("--threshold", type=float, default=0.2, help="dozvoljeno relativno pogorsanje p50 u odnosu na baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = run_benchmarks(args)
+
+    for name, metrics in report["results"].items():
+        print(f"{name:<24} p50 {metrics['p50_ms']:9.3f} ms  p95 {metrics['p95_ms']:9.3f} ms  mean {metrics['mean_ms']:9.3f} ms  ({metrics['runs']} runs)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(report, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
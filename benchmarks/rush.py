@@ -0,0 +1,251 @@
+"""
+Simulacija navale u trenutku otvaranja termina za rucak.
+
+Podrazumevano se aplikacija (main:app) pokrece u istom procesu preko ASGI transporta;
+sa --url se gadja lokalno pokrenut uvicorn. Skripta pravi sopstvene menze i studente
+(sa jedinstvenim prefiksom) i ne brise postojece podatke.
+
+Primer:
+    python -m benchmarks.rush --students 2000 --canteens 5 --concurrency 200 --duration 20 --skew 1.2
+    python -m benchmarks.rush --url http://localhost:8080 --duration 30 --output rush.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time as timer
+import uuid
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import anyio
+import httpx
+
+WORKING_HOURS = [
+    {"meal": "breakfast", "from": "07:00", "to": "10:00"},
+    {"meal": "lunch", "from": "12:00", "to": "16:00"},
+    {"meal": "dinner", "from": "18:00", "to": "21:00"},
+]
+# Termini poredjani po popularnosti; --skew odredjuje koliko su prvi favorizovani
+POPULAR_SLOTS = ["12:30", "13:00", "12:00", "13:30", "14:00", "14:30", "15:00", "15:30",
+                 "18:30", "19:00", "08:00", "08:30", "18:00", "19:30", "20:00", "07:30", "09:00", "20:30"]
+
+
+def zipf_weights(count: int, skew: float) -> List[float]:
+    return [1.0 / (rank ** skew) for rank in range(1, count + 1)]
+
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * q))]
+
+
+class RushStats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.pool_samples: List[float] = []
+        self.pool_total: Optional[int] = None
+
+    def record(self, route: str, seconds: float, status_code: Optional[int]):
+        self.latencies[route].append(seconds)
+        group = "error" if status_code is None else f"{status_code // 100}xx"
+        self.statuses[route][group] += 1
+
+    def report(self, elapsed: float) -> Dict:
+        routes = {}
+        total = 0
+        for route, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            statuses = dict(self.statuses[route])
+            failures = statuses.get("5xx", 0) + statuses.get("error", 0)
+            total += len(samples)
+            routes[route] = {
+                "requests": len(samples),
+                "throughput_rps": len(samples) / elapsed,
+                "p50_ms": percentile(samples, 0.50) * 1000,
+                "p95_ms": percentile(samples, 0.95) * 1000,
+                "p99_ms": percentile(samples, 0.99) * 1000,
+                "error_rate": failures / len(samples),
+                "statuses": statuses,
+            }
+
+        thread_pool = None
+        if self.pool_samples:
+            thread_pool = {
+                "limit": self.pool_total,
+                "mean_busy": sum(self.pool_samples) / len(self.pool_samples),
+                "max_busy": max(self.pool_samples),
+                "saturated_share": sum(1 for busy in self.pool_samples if busy >= self.pool_total) / len(self.pool_samples),
+            }
+
+        return {"elapsed_seconds": elapsed, "requests": total, "throughput_rps": total / elapsed,
+                "routes": routes, "thread_pool": thread_pool}
+
+
+class Rush:
+    def __init__(self, client: httpx.AsyncClient, args, stats: RushStats):
+        self.client = client
+        self.args = args
+        self.stats = stats
+        self.rng = random.Random(args.seed)
+        self.prefix = uuid.uuid4().hex[:8]
+        self.canteen_ids: List[str] = []
+        self.student_ids: List[str] = []
+        self.booked: List[tuple] = []
+        self.days = [date.today() + timedelta(days=offset) for offset in range(1, args.days + 1)]
+        self.canteen_weights = zipf_weights(args.canteens, args.skew)
+        self.slot_weights = zipf_weights(len(POPULAR_SLOTS), args.skew)
+
+    async def request(self, route: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = timer.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.stats.record(route, timer.perf_counter() - start, None)
+            return None
+        self.stats.record(route, timer.perf_counter() - start, response.status_code)
+        return response
+
+    async def setup(self):
+        admin = await self.client.post("/students/", json={"name": "Rush Admin", "email": f"admin-{self.prefix}@rush.test", "isAdmin": True})
+        admin.raise_for_status()
+        admin_id = admin.json()["id"]
+
+        for index in range(self.args.canteens):
+            payload = {"name": f"Rush {index}", "location": "Rush", "capacity": self.args.capacity, "workingHours": WORKING_HOURS}
+            response = await self.client.post("/canteens/", json=payload, headers={"studentId": admin_id})
+            response.raise_for_status()
+            self.canteen_ids.append(response.json()["id"])
+
+        semaphore = asyncio.Semaphore(50)
+
+        async def create_student(index: int):
+            async with semaphore:
+                response = await self.client.post("/students/", json={"name": f"Rush {index}", "email": f"s{index}-{self.prefix}@rush.test"})
+                response.raise_for_status()
+                self.student_ids.append(response.json()["id"])
+
+        await asyncio.gather(*(create_student(index) for index in range(self.args.students)))
+
+    def pick_canteen(self) -> str:
+        return self.rng.choices(self.canteen_ids, weights=self.canteen_weights)[0]
+
+    async def book(self):
+        payload = {
+            "studentId": self.rng.choice(self.student_ids),
+            "canteenId": self.pick_canteen(),
+            "date": self.rng.choice(self.days).isoformat(),
+            "time": self.rng.choices(POPULAR_SLOTS, weights=self.slot_weights)[0],
+            "duration": self.rng.choice([30, 60]),
+        }
+        response = await self.request("POST /reservations", "POST", "/reservations/", json=payload)
+        if response is not None and response.status_code == 201:
+            self.booked.append((response.json()["id"], payload["studentId"]))
+
+    async def cancel(self):
+        if not self.booked:
+            return await self.book()
+        reservation_id, student_id = self.booked.pop(self.rng.randrange(len(self.booked)))
+        await self.request("DELETE /reservations/{id}", "DELETE", f"/reservations/{reservation_id}", headers={"studentId": student_id})
+
+    async def poll(self):
+        day = self.rng.choice(self.days).isoformat()
+        params = {"startDate": day, "endDate": day, "startTime": "12:00", "endTime": "16:00", "duration": 30}
+        if self.rng.random() < self.args.single_canteen_share:
+            await self.request("GET /canteens/{id}/status", "GET", f"/canteens/{self.pick_canteen()}/status", params=params)
+        else:
+            await self.request("GET /canteens/status", "GET", "/canteens/status", params=params)
+
+    async def virtual_user(self, deadline: float):
+        actions = [self.book, self.cancel, self.poll]
+        weights = [self.args.book_weight, self.args.cancel_weight, self.args.poll_weight]
+        while timer.perf_counter() < deadline:
+            await self.rng.choices(actions, weights=weights)[0]()
+
+    async def run(self) -> float:
+        deadline = timer.perf_counter() + self.args.duration
+        start = timer.perf_counter()
+        await asyncio.gather(*(self.virtual_user(deadline) for _ in range(self.args.concurrency)))
+        return timer.perf_counter() - start
+
+
+async def sample_thread_pool(stats: RushStats, stop: asyncio.Event, interval: float = 0.01):
+    # anyio thread pool kroz koji FastAPI izvrsava sinhrone handlere; meri se samo u istom procesu
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    stats.pool_total = int(limiter.total_tokens)
+    while not stop.is_set():
+        stats.pool_samples.append(limiter.borrowed_tokens)
+        await asyncio.sleep(interval)
+
+
+async def main_async(args) -> Dict:
+    stats = RushStats()
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        from main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://rush", timeout=args.timeout)
+
+    async with client:
+        rush = Rush(client, args, stats)
+        await rush.setup()
+
+        stop = asyncio.Event()
+        sampler = None if args.url else asyncio.create_task(sample_thread_pool(stats, stop))
+        elapsed = await rush.run()
+        stop.set()
+        if sampler:
+            await sampler
+
+    return stats.report(elapsed)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test navale na rezervacije")
+    parser.add_argument("--url", help="adresa pokrenutog servera; bez nje aplikacija radi u istom procesu")
+    parser.add_argument("--canteens", type=int, default=5)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--capacity", type=int, default=100)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=100, help="broj istovremenih virtuelnih korisnika")
+    parser.add_argument("--duration", type=float, default=10.0, help="trajanje navale u sekundama")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf eksponent za popularnost menzi i termina")
+    parser.add_argument("--book-weight", type=float, default=0.5)
+    parser.add_argument("--cancel-weight", type=float, default=0.1)
+    parser.add_argument("--poll-weight", type=float, default=0.4)
+    parser.add_argument("--single-canteen-share", type=float, default=0.7, help="udeo upita statusa za jednu menzu")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="putanja JSON fajla sa rezultatima")
+    return parser.parse_args(argv)
+
+
+def print_report(report: Dict):
+    print(f"{report['requests']} zahteva za {report['elapsed_seconds']:.1f} s ({report['throughput_rps']:.0f} req/s)")
+    for route, metrics in report["routes"].items():
+        print(f"{route:<28} {metrics['requests']:>7}  {metrics['throughput_rps']:8.0f} req/s  "
+              f"p50 {metrics['p50_ms']:8.2f} ms  p95 {metrics['p95_ms']:8.2f} ms  p99 {metrics['p99_ms']:8.2f} ms  "
+              f"greske {metrics['error_rate']:.2%}  {metrics['statuses']}")
+    pool = report["thread_pool"]
+    if pool:
+        print(f"thread pool: limit {pool['limit']}, prosecno zauzeto {pool['mean_busy']:.1f}, "
+              f"max {pool['max_busy']:.0f}, zasicen {pool['saturated_share']:.1%} vremena")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,52 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from src.api import students, canteens, reservations
+from fastapi.responses import PlainTextResponse
+from src.api import students, canteens, reservations, jobs
+from src.metrics import MetricsMiddleware, registry
+from src.profiling import ProfilingMiddleware
+from src.services.archiver import run_archiver
+from src.services.idempotency import idempotency_cache
+from src.services.jobs import job_queue
+from src.repository.repo import repo, async_repo
+from src import config
 
-app = FastAPI(title="Rezervacija Menzi")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    archiver = None
+    if config.ARCHIVE_INTERVAL > 0 and hasattr(repo, "archive_reservations_before"):
+        archiver = asyncio.create_task(run_archiver(repo, config.ARCHIVE_INTERVAL))
+    yield
+    if archiver is not None:
+        archiver.cancel()
+    # Zapoceti pozadinski poslovi se zavrsavaju dok je repozitorijum jos otvoren
+    job_queue.shutdown()
+    # Trajni repozitorijum pri gasenju upisuje ostatak loga na disk
+    close = getattr(repo, "close", None)
+    if close is not None:
+        close()
+
+app = FastAPI(title="Rezervacija Menzi", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+if config.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware, repo=async_repo, directory=config.PROFILE_DIR, sample_rate=config.PROFILE_SAMPLE_RATE)
 
 app.include_router(students.router, prefix="/students", tags=["Students"])
 app.include_router(canteens.router, prefix="/canteens", tags=["Canteens"])
 app.include_router(reservations.router, prefix="/reservations", tags=["Reservations"])
+app.include_router(jobs.router, prefix="/jobs", tags=["Jobs"])
 
-from src.repository.repo import repo 
 @app.post("/clear-database", status_code=204, tags=["Utility"])
 async def clear_database():
-    repo.clear_all()
-    return {}
\ No newline at end of file
+    await async_repo.clear_all()
+    # clear_all pomera verzije, pa stari termini ionako nisu dostupni; kes se prazni da ne drzi memoriju
+    if canteens.canteen_service.status_cache is not None:
+        canteens.canteen_service.status_cache.clear()
+    # Sacuvani odgovori se odnose na obrisane rezervacije, pa ponovljen kljuc pravi novu
+    if idempotency_cache is not None:
+        idempotency_cache.clear()
+    return {}
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Utility"])
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,105 +1,278 @@
+import asyncio
+import json
 from datetime import date, time
-from fastapi import APIRouter, Depends, HTTPException, Query, status, Header
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status, Header
+from fastapi.responses import StreamingResponse
 from src.domain.models import Canteen
 from src.services.canteen_service import CanteenService
-from src.repository.repo import repo
+from src.services.events import capacity_events, Subscription, DAY_CHANGED, CANTEEN_DELETED
+from src.services.jobs import job_queue, JobQueueFull
+from src.repository.repo import repo, async_repo
+from src import profiling
+from src.api import serialization
+from src import config
 from src.dto.canteen_dto import UpdateCanteenDTO
-from typing import List
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 
 
-router = APIRouter()
-canteen_service = CanteenService(repo)
+router = APIRouter(route_class=profiling.route_class)
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+canteen_service = CanteenService(repo, capacity_engine=config.CAPACITY_ENGINE, status_cache_size=config.STATUS_CACHE_SIZE,
+                                 events=capacity_events, jobs=job_queue, cascade_chunk_size=config.JOB_CHUNK_SIZE)
 
-def get_admin_id(student_id: str = Header(..., alias="studentId")):
+def _status_runner(start_date: date, end_date: date):
+    # Status jednog dana je jeftin (cesto iz kesa) i racuna se na event loop-u, a opseg dana u thread pool-u
+    return async_repo.run if start_date == end_date else async_repo.offload
+
+async def get_admin_id(student_id: str = Header(..., alias="studentId")):
     return student_id
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return any(tag.strip() in (etag, "*") for tag in if_none_match.split(","))
+
+def _wants_ndjson(accept: Optional[str]) -> bool:
+    return bool(accept) and NDJSON_MEDIA_TYPE in accept
+
+def _ndjson_response(records: AsyncIterator[Dict], etag: str) -> StreamingResponse:
+    # Jedan zapis (menza x dan) po liniji; klijent dobija prve bajtove odmah, a
+    # memorija servera ne raste sa duzinom opsega
+    async def lines():
+        async for record in records:
+            yield json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE, headers={"ETag": etag})
+
+def _sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+def _slot_map(capacity_data: List[Dict]) -> Dict[Tuple[str, str], Dict]:
+    return {(slot["date"], slot["startTime"]): slot for canteen in capacity_data for slot in canteen["slots"]}
+
+async def _capacity_event_stream(subscription: Subscription, query: Tuple, capacity_data: List[Dict], etag: str) -> AsyncIterator[str]:
+    # Prvo ceo status ("snapshot"), zatim samo termini cija se slobodna mesta promene ("delta").
+    # Dogadjaji koji stignu zajedno se spajaju, pa se svaki izmenjen dan racuna jednom. Bez dogadjaja
+    # se na SSE_HEARTBEAT_SECONDS salje keepalive i proverava ETag, da se vide i izmene iz drugih procesa.
+    canteen_id, start_date, end_date, start_time, end_time, duration = query
+    slots = _slot_map(capacity_data)
+    try:
+        yield _sse_event("snapshot", {"canteenId": canteen_id, "slots": list(slots.values())})
+        while True:
+            try:
+                events = [await asyncio.wait_for(subscription.queue.get(), config.SSE_HEARTBEAT_SECONDS)]
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                events = []
+            while not subscription.queue.empty():
+                events.append(subscription.queue.get_nowait())
+
+            if None in events:
+                # Klijent nije stizao da cita i izbacen je; moze ponovo da se poveze
+                yield _sse_event("dropped", {"canteenId": canteen_id})
+                return
+            if any(event["type"] == CANTEEN_DELETED for event in events):
+                yield _sse_event("deleted", {"canteenId": canteen_id})
+                return
+
+            if events and all(event["type"] == DAY_CHANGED for event in events):
+                # Samo izmene rezervacija: racunaju se samo ti dani, ako su u opsegu toka
+                days = {event["date"] for event in events if start_date <= event["date"] <= end_date}
+                if not days:
+                    continue
+                fresh = {}
+                for day in sorted(days):
+                    day_data = await async_repo.run(canteen_service.get_capacity_status, canteen_id, day, day, start_time, end_time, duration)
+                    fresh.update(_slot_map(day_data))
+                previous = {key: slot for key, slot in slots.items() if date.fromisoformat(key[0]) in days}
+                etag = await async_repo.run(canteen_service.get_capacity_status_etag, canteen_id, start_date, end_date, start_time, end_time, duration)
+            else:
+                # Izmena menze ili keepalive: ceo opseg, ako se ETag promenio
+                new_etag = await async_repo.run(canteen_service.get_capacity_status_etag, canteen_id, start_date, end_date, start_time, end_time, duration)
+                if new_etag == etag:
+                    continue
+                etag = new_etag
+                fresh = _slot_map(await _status_runner(start_date, end_date)(canteen_service.get_capacity_status, canteen_id, start_date, end_date, start_time, end_time, duration))
+                previous = slots
+
+            changed = [{"date": slot["date"], "startTime": slot["startTime"], "remainingCapacity": slot["remainingCapacity"]}
+                       for key, slot in fresh.items() if previous.get(key) != slot]
+            changed += [{"date": key[0], "startTime": key[1], "removed": True} for key in previous if key not in fresh]
+            slots = {key: slot for key, slot in slots.items() if key not in previous}
+            slots.update(fresh)
+            if changed:
+                yield _sse_event("delta", {"canteenId": canteen_id, "slots": changed})
+    finally:
+        capacity_events.unsubscribe(subscription)
+
 @router.get("/status", response_model=List[dict]) 
-def get_capacity_endpoint(
+async def get_capacity_endpoint(
+    response: Response,
     start_date: date = Query(..., alias="startDate"),
     end_date: date = Query(..., alias="endDate"),
     start_time: time = Query(..., alias="startTime"), 
     end_time: time = Query(..., alias="endTime"),
     duration: int = Query(..., alias="duration"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    accept: Optional[str] = Header(None),
 ):
     try:
-        capacity_data = canteen_service.get_capacity_status(
-            None, start_date, end_date, start_time, end_time, duration
-        )
-        return capacity_data
+        etag = await async_repo.run(canteen_service.get_capacity_status_etag, None, start_date, end_date, start_time, end_time, duration)
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        if _wants_ndjson(accept):
+            records = await async_repo.run(canteen_service.iter_capacity_status, None, start_date, end_date, start_time, end_time, duration)
+            return _ndjson_response(async_repo.iterate(records), etag)
+
+        capacity_data = await _status_runner(start_date, end_date)(canteen_service.get_capacity_status, None, start_date, end_date, start_time, end_time, duration)
+        response.headers["ETag"] = etag
+        return serialization.render(capacity_data, response=response)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
     
 @router.get("/{canteen_id}/status", response_model=dict) 
-def get_single_canteen_capacity_endpoint(
+async def get_single_canteen_capacity_endpoint(
     canteen_id: str,
+    response: Response,
     start_date: date = Query(..., alias="startDate"),
     end_date: date = Query(..., alias="endDate"),
     start_time: time = Query(..., alias="startTime"), 
     end_time: time = Query(..., alias="endTime"),
     duration: int = Query(..., alias="duration"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    accept: Optional[str] = Header(None),
 ):
     try:
-        capacity_data = canteen_service.get_capacity_status(
-            canteen_id, start_date, end_date, start_time, end_time, duration
-        )
+        etag = await async_repo.run(canteen_service.get_capacity_status_etag, canteen_id, start_date, end_date, start_time, end_time, duration)
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        if _wants_ndjson(accept):
+            records = await async_repo.run(canteen_service.iter_capacity_status, canteen_id, start_date, end_date, start_time, end_time, duration)
+            return _ndjson_response(async_repo.iterate(records), etag)
+
+        capacity_data = await _status_runner(start_date, end_date)(canteen_service.get_capacity_status, canteen_id, start_date, end_date, start_time, end_time, duration)
+        response.headers["ETag"] = etag
         if not capacity_data:
-            return {"canteenId": canteen_id, "slots": []}
+            return serialization.render({"canteenId": canteen_id, "slots": []}, response=response)
         
-        return capacity_data[0]
+        return serialization.render(capacity_data[0], response=response)
+    except ValueError as e:
+        if "nije pronađena" in str(e):
+             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        else:
+             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.get("/{canteen_id}/status/stream")
+async def stream_canteen_capacity_endpoint(
+    canteen_id: str,
+    start_date: date = Query(..., alias="startDate"),
+    end_date: date = Query(..., alias="endDate"),
+    start_time: time = Query(..., alias="startTime"),
+    end_time: time = Query(..., alias="endTime"),
+    duration: int = Query(..., alias="duration"),
+):
+    # Pretplata pre citanja pocetnog stanja, da se ne izgubi izmena izmedju ta dva koraka
+    subscription = capacity_events.subscribe(canteen_id)
+    try:
+        await async_repo.run(canteen_service.get_canteen_by_id, canteen_id)
+        etag = await async_repo.run(canteen_service.get_capacity_status_etag, canteen_id, start_date, end_date, start_time, end_time, duration)
+        capacity_data = await _status_runner(start_date, end_date)(canteen_service.get_capacity_status, canteen_id, start_date, end_date, start_time, end_time, duration)
     except ValueError as e:
+        capacity_events.unsubscribe(subscription)
         if "nije pronađena" in str(e):
              raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
         else:
              raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
+        capacity_events.unsubscribe(subscription)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
+    query = (canteen_id, start_date, end_date, start_time, end_time, duration)
+    return StreamingResponse(_capacity_event_stream(subscription, query, capacity_data, etag), media_type=SSE_MEDIA_TYPE,
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/next-available", response_model=List[dict])
+async def get_next_available_endpoint(
+    meal: str = Query(...),
+    duration: int = Query(...),
+    party_size: int = Query(1, alias="partySize"),
+    canteen_ids: Optional[List[str]] = Query(None, alias="canteenId"),
+    limit: int = Query(5),
+    start_date: Optional[date] = Query(None, alias="startDate"),
+    end_date: Optional[date] = Query(None, alias="endDate"),
+):
+    try:
+        slots = await async_repo.offload(canteen_service.find_next_available, meal, duration, party_size, canteen_ids, limit, start_date, end_date)
+        return serialization.render(slots)
+    except ValueError as e:
+        if "nije pronađena" in str(e):
+             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        else:
+             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @router.post("/", response_model=Canteen, status_code=status.HTTP_201_CREATED)
-def create_canteen_endpoint(payload: Canteen, admin_id: str = Depends(get_admin_id)):
+async def create_canteen_endpoint(payload: Canteen, admin_id: str = Depends(get_admin_id)):
     try:
-        new_canteen = canteen_service.create_canteen(admin_id, payload)
-        return new_canteen
+        new_canteen = await async_repo.run(canteen_service.create_canteen, admin_id, payload)
+        return serialization.render(new_canteen, status_code=status.HTTP_201_CREATED)
     except PermissionError as e:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
 @router.get("/", response_model=List[Canteen])
-def get_all_canteens_endpoint():
+async def get_all_canteens_endpoint():
     try:
-        canteens = canteen_service.get_all_canteens()
-        return canteens
+        canteens = await async_repo.run(canteen_service.get_all_canteens)
+        return serialization.render(canteens)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Greška pri dohvatanju menzi.")
 
 @router.get("/{canteen_id}", response_model=Canteen)
-def get_single_canteen_endpoint(canteen_id: str):
+async def get_single_canteen_endpoint(canteen_id: str):
     try:
-        canteen = canteen_service.get_canteen_by_id(canteen_id)
-        return canteen
+        canteen = await async_repo.run(canteen_service.get_canteen_by_id, canteen_id)
+        return serialization.render(canteen)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Greška pri dohvatanju menze.")
 
-@router.put("/{canteen_id}", response_model=Canteen)
-def update_canteen_endpoint(
+@router.put("/{canteen_id}", response_model=Union[Canteen, Dict[str, Any]])
+async def update_canteen_endpoint(
     canteen_id: str, 
     payload: UpdateCanteenDTO, 
-    student_id: str = Depends(get_admin_id)
+    student_id: str = Depends(get_admin_id),
+    dry_run: bool = Query(False, alias="dryRun"),
+    impact: bool = Query(False, alias="impact")
 ):
+    # dryRun vraca samo izvestaj o rezervacijama koje bi izmena pogodila (preko kapaciteta ili
+    # van radnog vremena) i ne menja menzu; impact primenjuje izmenu i vraca menzu i izvestaj
 
-    update_data = payload.model_dump(exclude_none=True)
+    # Iteracija kroz model cuva WorkingHour objekte (model_dump bi ih pretvorio u recnike sa stringovima)
+    update_data = {field: value for field, value in payload if value is not None}
 
     if not update_data:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nema podataka za ažuriranje.")
         
     try:
-        updated_canteen = canteen_service.update_canteen(student_id, canteen_id, update_data)
-        return updated_canteen
+        if dry_run:
+            report = await async_repo.offload(canteen_service.preview_canteen_update, student_id, canteen_id, update_data)
+            return serialization.render(report)
+        updated_canteen = await async_repo.run(canteen_service.update_canteen, student_id, canteen_id, update_data)
+        if impact:
+            report = await async_repo.offload(canteen_service.get_update_impact, updated_canteen)
+            return serialization.render({"canteen": updated_canteen, "impact": report})
+        return serialization.render(updated_canteen)
     except PermissionError as e:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
     except ValueError as e:
@@ -108,12 +281,16 @@ def update_canteen_endpoint(
         else:
              raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-@router.delete("/{canteen_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_canteen_endpoint(canteen_id: str, admin_id: str = Depends(get_admin_id)):
+@router.delete("/{canteen_id}", status_code=status.HTTP_202_ACCEPTED)
+async def delete_canteen_endpoint(canteen_id: str, response: Response, admin_id: str = Depends(get_admin_id)):
+    # Menza je obrisana odmah; brisanje njenih rezervacija se prati preko GET /jobs/{id}
     try:
-        canteen_service.delete_canteen(admin_id, canteen_id)
-        return {}
+        job = await async_repo.run(canteen_service.delete_canteen, admin_id, canteen_id)
+        response.headers["Location"] = f"/jobs/{job.id}"
+        return serialization.render(job.to_dict(), status_code=status.HTTP_202_ACCEPTED, response=response)
     except PermissionError as e:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
     except ValueError as e:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
\ No newline at end of file
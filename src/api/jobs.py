@@ -0,0 +1,14 @@
+from fastapi import APIRouter, HTTPException, status
+from src.services.jobs import job_queue
+from src import profiling
+from src.api import serialization
+
+
+router = APIRouter(route_class=profiling.route_class)
+
+@router.get("/{job_id}", response_model=dict)
+async def get_job_endpoint(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Posao sa ID-jem '{job_id}' nije pronađen.")
+    return serialization.render(job.to_dict())
@@ -1,31 +1,84 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status, Header
 from src.domain.models import Reservation
 from src.services.reservation_service import ReservationService
-from src.dto.reservation_dto import CreateReservationDTO
-from src.repository.repo import repo
+from src.dto.reservation_dto import CreateReservationDTO, BatchReservationResultDTO
+from src.repository.repo import repo, async_repo
+from src import profiling
+from src.api import serialization
+from src.services.events import capacity_events
+from src.services.idempotency import idempotency_cache, IdempotencyKeyInUse, IdempotencyKeyMismatch, MAX_KEY_LENGTH
 
 
-router = APIRouter()
-reservation_service = ReservationService(repo)
+router = APIRouter(route_class=profiling.route_class)
+reservation_service = ReservationService(repo, events=capacity_events)
 
-def get_student_id(student_id: str = Header(..., alias="studentId")):
+async def get_student_id(student_id: str = Header(..., alias="studentId")):
     return student_id
 
 @router.post("/", response_model=Reservation, status_code=status.HTTP_201_CREATED)
-def create_reservation_endpoint(payload: CreateReservationDTO):
+async def create_reservation_endpoint(payload: CreateReservationDTO, response: Response,
+                                      idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    if idempotency_key is None or idempotency_cache is None:
+        status_code, content = await _create_reservation(payload)
+        return _reservation_response(status_code, content, response)
+
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Idempotency-Key mora imati od 1 do {MAX_KEY_LENGTH} znakova.")
+
+    # Kljuc vazi u okviru studenta, pa tudji kljuc ne moze da vrati tudju rezervaciju
+    key = (payload.studentId, idempotency_key)
+    try:
+        cached = idempotency_cache.begin(key, payload)
+    except IdempotencyKeyInUse as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e), headers={"Retry-After": "1"})
+    except IdempotencyKeyMismatch as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    if cached is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+        return _reservation_response(*cached, response)
+
+    # Cuvaju se i odbijeni zahtevi (400), a posle neocekivane greske ili prekida ponovni pokusaj ide ispocetka
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    try:
+        status_code, content = await _create_reservation(payload)
+    finally:
+        if status_code == status.HTTP_500_INTERNAL_SERVER_ERROR:
+            idempotency_cache.release(key)
+        else:
+            idempotency_cache.complete(key, status_code, content)
+    return _reservation_response(status_code, content, response)
+
+async def _create_reservation(payload: CreateReservationDTO):
+    # Vraca (status, rezervacija ili poruka greske)
+    try:
+        new_reservation = await async_repo.run(reservation_service.create_reservation, payload)
+        return status.HTTP_201_CREATED, new_reservation
+    except ValueError as e:
+        return status.HTTP_400_BAD_REQUEST, str(e)
+    except Exception as e:
+        return status.HTTP_500_INTERNAL_SERVER_ERROR, "Greška pri kreiranju rezervacije."
+
+def _reservation_response(status_code: int, content, response: Response):
+    if status_code != status.HTTP_201_CREATED:
+        replayed = response.headers.get("Idempotent-Replayed")
+        raise HTTPException(status_code=status_code, detail=content, headers={"Idempotent-Replayed": replayed} if replayed else None)
+    return serialization.render(content, status_code=status_code, response=response)
+    
+@router.post("/batch", response_model=BatchReservationResultDTO)
+async def create_reservations_batch_endpoint(payloads: List[CreateReservationDTO], atomic: bool = Query(False)):
     try:
-        new_reservation = reservation_service.create_reservation(payload)
-        return new_reservation
+        return serialization.render(await async_repo.offload(reservation_service.create_reservations, payloads, atomic=atomic))
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Greška pri kreiranju rezervacije.")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Greška pri kreiranju grupne rezervacije.")
     
 @router.delete("/{reservation_id}", response_model=Reservation)
-def cancel_reservation_endpoint(reservation_id: str, student_id: str = Depends(get_student_id)):
+async def cancel_reservation_endpoint(reservation_id: str, student_id: str = Depends(get_student_id)):
     try:
-        cancelled_reservation = reservation_service.cancel_reservation(reservation_id, student_id)
-        return cancelled_reservation
+        cancelled_reservation = await async_repo.run(reservation_service.cancel_reservation, reservation_id, student_id)
+        return serialization.render(cancelled_reservation)
     except PermissionError as e:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
     except ValueError as e:
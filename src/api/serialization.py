@@ -0,0 +1,62 @@
+from datetime import time
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson je opciona zavisnost
+    orjson = None
+
+from fastapi import Response
+from pydantic import BaseModel
+from src.domain.models import Student, Canteen, WorkingHour, Reservation
+from src import config
+
+JSON_ENCODERS = ("pydantic", "orjson")
+
+if config.JSON_ENCODER not in JSON_ENCODERS:
+    raise ValueError(f"Nepoznat JSON_ENCODER '{config.JSON_ENCODER}', dozvoljeno: {', '.join(JSON_ENCODERS)}.")
+if config.JSON_ENCODER == "orjson" and orjson is None:
+    raise RuntimeError("JSON_ENCODER=orjson zahteva instaliran orjson paket.")
+
+
+def _format_time(value: time) -> str:
+    # Isto sto i strftime("%H:%M") iz field_serializer-a modela
+    return f"{value.hour:02d}:{value.minute:02d}"
+
+
+def _default(obj: Any) -> Any:
+    # orjson poziva ovu funkciju samo za tipove koje ne zna sam (modele); recnici, liste,
+    # stringovi i datumi iz servisa se serijalizuju direktno
+    if isinstance(obj, Reservation):
+        values = dict(obj.__dict__)
+        values["time"] = _format_time(obj.time)
+        return values
+    if isinstance(obj, WorkingHour):
+        return {"meal": obj.meal, "from": _format_time(obj.from_time), "to": _format_time(obj.to_time)}
+    if isinstance(obj, (Student, Canteen)):
+        return obj.__dict__
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json", by_alias=True)
+    raise TypeError(f"Tip {type(obj).__name__} nije moguće serijalizovati u JSON.")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default)
+
+
+def render(content: Any, status_code: int = 200, response: Optional[Response] = None) -> Any:
+    # Sa JSON_ENCODER=orjson endpoint vraca gotov odgovor, pa FastAPI preskace ponovnu validaciju
+    # kroz response_model; zaglavlja postavljena na ubacenom Response objektu se prenose.
+    # Inace se sadrzaj vraca nepromenjen i ide uobicajenim putem.
+    if config.JSON_ENCODER != "orjson":
+        return content
+
+    fast_response = FastJSONResponse(content, status_code=status_code)
+    if response is not None:
+        for name, value in response.headers.items():
+            if name != "content-length":
+                fast_response.headers[name] = value
+    return fast_response
@@ -1,24 +1,83 @@
-from fastapi import APIRouter, HTTPException, status
+import csv
+import json
+from typing import AsyncIterator, Dict, List, Tuple
+from fastapi import APIRouter, HTTPException, Request, status
 from src.domain.models import Student
-from src.services.student_service import StudentService, CreateStudentDTO
-from src.repository.repo import repo
+from src.services.student_service import StudentService, StudentImport, CreateStudentDTO
+from src.repository.repo import repo, async_repo
+from src import profiling
+from src.api import serialization
+from src.dto.student_dto import StudentImportResultDTO
 
-router = APIRouter()
+router = APIRouter(route_class=profiling.route_class)
 
 student_service = StudentService(repo)
 
+IMPORT_CHUNK_SIZE = 1000
+
 @router.post("/", response_model=Student, status_code=status.HTTP_201_CREATED)
-def create_student_endpoint(payload: CreateStudentDTO):
+async def create_student_endpoint(payload: CreateStudentDTO):
     try:
-        new_student = student_service.create_student(payload)
-        return new_student
+        new_student = await async_repo.run(student_service.create_student, payload)
+        return serialization.render(new_student, status_code=status.HTTP_201_CREATED)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.post("/import", response_model=StudentImportResultDTO)
+async def import_students_endpoint(request: Request):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in ("text/csv", "application/x-ndjson"):
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail="Podržani formati su text/csv i application/x-ndjson.")
+
+    student_import = StudentImport(repo)
+    chunk: List[Tuple[int, Dict]] = []
+    header = None
+
+    async for line_number, line in _iter_lines(request):
+        if not line.strip():
+            continue
+
+        if content_type == "text/csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [column.strip() for column in values]
+                continue
+            data = {column: value.strip() for column, value in zip(header, values) if value.strip()}
+        else:
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                student_import.add_error(line_number, f"Neispravan JSON: {e.msg}")
+                continue
+
+        chunk.append((line_number, data))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await async_repo.offload(student_import.add_chunk, chunk)
+            chunk = []
+
+    if chunk:
+        await async_repo.offload(student_import.add_chunk, chunk)
+
+    return serialization.render(student_import.report())
+
+async def _iter_lines(request: Request) -> AsyncIterator[Tuple[int, str]]:
+    # Telo se cita u delovima kako stize; jedan student po liniji
+    buffer = b""
+    line_number = 0
+    async for body_chunk in request.stream():
+        buffer += body_chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            yield line_number, line.decode("utf-8", errors="replace").rstrip("\r")
+    if buffer:
+        yield line_number + 1, buffer.decode("utf-8", errors="replace").rstrip("\r")
     
 @router.get("/{student_id}", response_model=Student)
-def get_student_endpoint(student_id: str):
+async def get_student_endpoint(student_id: str):
     try:
-        student = student_service.get_student(student_id)
-        return student
+        student = await async_repo.run(student_service.get_student, student_id)
+        return serialization.render(student)
     except ValueError as e:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
@@ -0,0 +1,49 @@
+import os
+
+# "memory", "durable" (memorija + log izmena i snapshot-ovi u DATA_DIR) ili "sqlite"
+REPOSITORY_BACKEND = os.getenv("REPOSITORY_BACKEND", "memory")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "canteen.db")
+# Broj unosa (menza x dan) zauzetosti u deljenoj memoriji za vise worker procesa nad SQLite bazom (0 iskljucuje);
+# ime segmenta se podrazumevano izvodi iz putanje baze
+SHARED_OCCUPANCY_ENTRIES = int(os.getenv("SHARED_OCCUPANCY_ENTRIES", "0"))
+SHARED_OCCUPANCY_NAME = os.getenv("SHARED_OCCUPANCY_NAME", "")
+DATA_DIR = os.getenv("DATA_DIR", "data")
+# Najvise koliko sekundi izmena moze da ceka na fsync (0 = fsync posle svake izmene)
+LOG_FSYNC_INTERVAL = float(os.getenv("LOG_FSYNC_INTERVAL", "0.05"))
+# Posle koliko zapisa u logu se pravi novi snapshot
+SNAPSHOT_EVERY = int(os.getenv("SNAPSHOT_EVERY", "20000"))
+
+# "python" ili "numpy" (zahteva instaliran numpy)
+CAPACITY_ENGINE = os.getenv("CAPACITY_ENGINE", "python")
+
+# Profilisanje pojedinacnih zahteva: admin salje zaglavlje "X-Profile: 1" (uz svoj studentId),
+# ili se nasumicno profilise PROFILE_SAMPLE_RATE udeo zahteva; profili se upisuju u PROFILE_DIR
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Broj kesiranih lista termina (menza x dan x upit) za /canteens/status; 0 iskljucuje kes
+STATUS_CACHE_SIZE = int(os.getenv("STATUS_CACHE_SIZE", "10000"))
+
+# "pydantic" ili "orjson" (zahteva instaliran orjson): orjson odgovore serijalizuje direktno u bajtove,
+# bez ponovne validacije kroz response_model
+JSON_ENCODER = os.getenv("JSON_ENCODER", "pydantic")
+
+# Na koliko sekundi se rezervacije proslih dana premestaju u arhivu (0 iskljucuje)
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "3600"))
+
+# Server-sent events za /canteens/{id}/status/stream: najvise dogadjaja u redu jednog klijenta
+# (spor klijent se izbacuje) i na koliko sekundi se salje keepalive uz proveru izmena iz drugih procesa
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "64"))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+# Pozadinski poslovi (npr. brisanje rezervacija obrisane menze): broj niti, najvise poslova koji cekaju
+# i koliko rezervacija se brise u jednom koraku (izmedju koraka rade ostali zahtevi)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "1000"))
+
+# Idempotency-Key za POST /reservations: najvise sacuvanih odgovora (0 iskljucuje) i koliko sekundi
+# ponovljeni zahtev sa istim kljucem dobija sacuvan odgovor
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
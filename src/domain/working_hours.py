@@ -0,0 +1,74 @@
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+from src.domain.models import WorkingHour
+
+MINUTES_PER_DAY = 24 * 60
+# Rezervacija pocinje na pun sat ili na pola sata
+SLOT_STEP_MINUTES = 30
+
+
+def _minute_of_day(value: time) -> int:
+    return value.hour * 60 + value.minute
+
+
+def _whole_minute(value: time) -> bool:
+    return not value.second and not value.microsecond
+
+
+class WorkingHoursTable:
+    # Radno vreme menze unapred razvijeno po minutima dana: za svaki minut obrok kome pripada
+    # i kraj najduzeg intervala koji ga sadrzi, pa su odredjivanje obroka za termin i provera
+    # da li je menza otvorena jedan pristup listi. Pravi se samo kada se radno vreme promeni.
+    # Granice ili termini koji nisu na pun minut (sekunde) idu linearnom proverom kao ranije.
+    def __init__(self, working_hours: List[WorkingHour]):
+        self.working_hours = working_hours
+        self._exact = all(_whole_minute(h.from_time) and _whole_minute(h.to_time) for h in working_hours)
+        self._meals: List[Optional[WorkingHour]] = [None] * MINUTES_PER_DAY
+        self._open_until: List[int] = [0] * MINUTES_PER_DAY
+        self._meal_slots: Dict[Tuple[str, int], List[time]] = {}
+        if not self._exact:
+            return
+
+        # Obrnutim redom, da kod preklapanja vazi prvi interval iz liste (kao pri linearnoj pretrazi)
+        for h in reversed(working_hours):
+            start, end = _minute_of_day(h.from_time), _minute_of_day(h.to_time)
+            for minute in range(start, end):
+                self._meals[minute] = h
+                self._open_until[minute] = max(self._open_until[minute], end)
+
+    def meal_for(self, slot_time: time) -> Optional[WorkingHour]:
+        if self._exact and _whole_minute(slot_time):
+            return self._meals[_minute_of_day(slot_time)]
+
+        for h in self.working_hours:
+            if h.from_time <= slot_time < h.to_time:
+                return h
+        return None
+
+    def is_open(self, start_time: time, duration: int) -> bool:
+        # Ceo termin [start_time, start_time + duration] mora biti unutar jednog intervala
+        if self._exact and _whole_minute(start_time):
+            minute = _minute_of_day(start_time)
+            return minute + duration <= self._open_until[minute]
+
+        slot_start = datetime.combine(date.min, start_time)
+        slot_end = slot_start + timedelta(minutes=duration)
+        return any(datetime.combine(date.min, h.from_time) <= slot_start and slot_end <= datetime.combine(date.min, h.to_time)
+                   for h in self.working_hours)
+
+    def meal_slots(self, meal: str, duration: int) -> List[time]:
+        # Rastuci pocetci termina (na pun sat ili pola sata) u kojima ceo termin pada u interval obroka
+        key = (meal, duration)
+        slots = self._meal_slots.get(key)
+        if slots is None:
+            starts = set()
+            for h in self.working_hours:
+                if h.meal != meal:
+                    continue
+                start_s = h.from_time.hour * 3600 + h.from_time.minute * 60 + h.from_time.second + (h.from_time.microsecond > 0)
+                end_s = h.to_time.hour * 3600 + h.to_time.minute * 60 + h.to_time.second
+                step_s = SLOT_STEP_MINUTES * 60
+                for slot_s in range(-(-start_s // step_s) * step_s, end_s - duration * 60 + 1, step_s):
+                    starts.add(slot_s // 60)
+            slots = self._meal_slots[key] = [time(minute // 60, minute % 60) for minute in sorted(starts)]
+        return slots
@@ -1,9 +1,22 @@
 from datetime import date, time
+from typing import List, Optional
 from pydantic import BaseModel
+from src.domain.models import Reservation
 
 class CreateReservationDTO(BaseModel):
     studentId: str
     canteenId: str
     date: date
     time: time 
-    duration: int
\ No newline at end of file
+    duration: int
+
+class BatchReservationItemResultDTO(BaseModel):
+    index: int
+    status: str
+    reservation: Optional[Reservation] = None
+    error: Optional[str] = None
+
+class BatchReservationResultDTO(BaseModel):
+    created: int
+    failed: int
+    results: List[BatchReservationItemResultDTO]
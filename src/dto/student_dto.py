@@ -0,0 +1,12 @@
+from typing import List
+from pydantic import BaseModel
+
+
+class StudentImportErrorDTO(BaseModel):
+    row: int
+    error: str
+
+class StudentImportResultDTO(BaseModel):
+    imported: int
+    failed: int
+    errors: List[StudentImportErrorDTO]
@@ -0,0 +1,175 @@
+import functools
+import threading
+import time as timer
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        parts.append(f'{name}="{escaped}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # Po kombinaciji labela: [brojaci po bucket-u (bez kumulacije) + overflow, suma]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: Tuple = ()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, counts[:], total) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.label_names, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            cumulative += counts[-1]
+            bucket_labels = _format_labels(self.label_names, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter("http_requests_total", "Broj HTTP zahteva po ruti i status kodu.", ("method", "route", "status"))
+HTTP_DURATION = registry.histogram("http_request_duration_seconds", "Trajanje HTTP zahteva po ruti.", ("method", "route"))
+REPOSITORY_OPERATIONS = registry.counter("repository_operations_total", "Broj poziva repozitorijuma po operaciji.", ("backend", "operation"))
+REPOSITORY_DURATION = registry.histogram("repository_operation_duration_seconds", "Trajanje operacija repozitorijuma.", ("backend", "operation"))
+REPOSITORY_ROWS_SCANNED = registry.counter("repository_rows_scanned_total", "Broj rezervacija procitanih pri upitima repozitorijuma.", ("backend", "operation"))
+SERVICE_DURATION = registry.histogram("service_operation_duration_seconds", "Trajanje operacija servisnog sloja.", ("service", "operation"))
+
+
+def timed(histogram: Histogram, *labels: str) -> Callable:
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = timer.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(timer.perf_counter() - start, labels)
+        return wrapper
+    return decorator
+
+
+def instrument_repository(backend: str, exclude: Sequence[str] = ("transaction",)) -> Callable:
+    # Dekorator klase: svaka javna metoda repozitorijuma broji pozive i meri trajanje
+    def decorator(cls):
+        for name, member in list(vars(cls).items()):
+            if name.startswith("_") or name in exclude or not callable(member):
+                continue
+            setattr(cls, name, _instrument_method(member, backend, name))
+        return cls
+    return decorator
+
+
+def _instrument_method(method: Callable, backend: str, operation: str) -> Callable:
+    labels = (backend, operation)
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = timer.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            REPOSITORY_DURATION.observe(timer.perf_counter() - start, labels)
+            REPOSITORY_OPERATIONS.inc(labels)
+    return wrapper
+
+
+class MetricsMiddleware:
+    # Cist ASGI middleware (bez BaseHTTPMiddleware) da bi trosak po zahtevu ostao mali
+    # i da streaming odgovori ne bi bili baferovani
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = timer.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Sablon rute (npr. /canteens/{canteen_id}/status) umesto stvarne putanje, da broj serija ostane ogranicen
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            HTTP_DURATION.observe(timer.perf_counter() - start, (method, route_path))
+            HTTP_REQUESTS.inc((method, route_path, str(status_code)))
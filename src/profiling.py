@@ -0,0 +1,156 @@
+import contextvars
+import cProfile
+import functools
+import inspect
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import uuid
+from typing import Callable, List, Optional
+
+import anyio
+from fastapi.routing import APIRoute
+
+from src import config
+
+PROFILE_HEADER = "x-profile"
+SUMMARY_LIMIT = 30
+
+_current_session: contextvars.ContextVar[Optional["ProfileSession"]] = contextvars.ContextVar("profile_session", default=None)
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+class ProfileSession:
+    # Profil jednog zahteva. Event loop nit ima svoj profiler, a svaki sinhroni handler
+    # koji FastAPI posalje u thread pool dobija poseban profiler; na kraju se spajaju.
+    # Profiler event loop-a meri celu nit dok traje zahtev, pa obuhvata i korutine drugih
+    # zahteva iz tog perioda; njihov broj se pamti u other_requests i navodi u pregledu.
+    # Profili iz thread pool-a (profiled_call) pripadaju samo ovom zahtevu.
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.loop_profiler = cProfile.Profile()
+        self.other_requests = 0
+        self._thread_profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add_thread_profiler(self, profiler: cProfile.Profile):
+        with self._lock:
+            self._thread_profilers.append(profiler)
+
+    def stats(self, stream=None) -> pstats.Stats:
+        stats = pstats.Stats(self.loop_profiler, stream=stream)
+        for profiler in self._thread_profilers:
+            stats.add(profiler)
+        return stats
+
+    def save(self, directory: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        summary = io.StringIO()
+        if self.other_requests:
+            summary.write(f"Napomena: deo profila iz event loop niti obuhvata i {self.other_requests} drugih zahteva "
+                          f"obrađenih u istom periodu; deo iz thread pool-a pripada samo ovom zahtevu.\n\n")
+        stats = self.stats(stream=summary)
+        stats.dump_stats(os.path.join(directory, f"{self.request_id}.prof"))
+        stats.sort_stats("cumulative").print_stats(SUMMARY_LIMIT)
+        summary_path = os.path.join(directory, f"{self.request_id}.txt")
+        with open(summary_path, "w") as f:
+            f.write(summary.getvalue())
+        return summary_path
+
+
+def profiled_call(func: Callable) -> Callable:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        session = _current_session.get()
+        if session is None:
+            return func(*args, **kwargs)
+
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            session.add_thread_profiler(profiler)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    # Sinhroni endpoint-i se izvrsavaju u thread pool-u, van dometa profilera event loop-a,
+    # pa se omotavaju; potpis ostaje isti zbog functools.wraps
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = profiled_call(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, repo, directory: str, sample_rate: float):
+        self.app = app
+        self.repo = repo
+        self.directory = directory
+        self.sample_rate = sample_rate
+        # Jedan profilisan zahtev u isto vreme; ostali prolaze bez profilisanja
+        self._busy = threading.Lock()
+        # Zahtevi u obradi i sesija koja je u toku; menjaju se samo na event loop niti
+        self._in_flight = 0
+        self._session: Optional[ProfileSession] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        self._in_flight += 1
+        try:
+            await self._handle(scope, receive, send)
+        finally:
+            self._in_flight -= 1
+
+    async def _handle(self, scope, receive, send):
+        if not await self._should_profile(scope) or not self._busy.acquire(blocking=False):
+            if self._session is not None:
+                self._session.other_requests += 1
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            session = ProfileSession(self._request_id(scope))
+            # Zahtevi koji su vec u obradi ce se takodje izvrsavati na event loop niti
+            session.other_requests = self._in_flight - 1
+            self._session = session
+            token = _current_session.set(session)
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"x-profile-id", session.request_id.encode())]
+                await send(message)
+
+            session.loop_profiler.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                session.loop_profiler.disable()
+                self._session = None
+                _current_session.reset(token)
+            await anyio.to_thread.run_sync(session.save, self.directory)
+        finally:
+            self._busy.release()
+
+    async def _should_profile(self, scope) -> bool:
+        headers = dict(scope["headers"])
+        if headers.get(PROFILE_HEADER.encode()) in (b"1", b"true"):
+            student_id = headers.get(b"studentid")
+            student = await self.repo.get_student_by_id(student_id.decode()) if student_id else None
+            return bool(student and student.isAdmin)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _request_id(self, scope) -> str:
+        request_id = dict(scope["headers"]).get(b"x-request-id", b"").decode(errors="ignore")
+        return request_id if _REQUEST_ID_PATTERN.match(request_id) else uuid.uuid4().hex
+
+
+# Kada je profilisanje iskljuceno rute su obicni APIRoute i middleware se ne dodaje, pa nema nikakvog troska
+route_class = ProfiledRoute if config.PROFILING_ENABLED else APIRoute
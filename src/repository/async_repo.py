@@ -0,0 +1,98 @@
+import functools
+from datetime import date
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Protocol, TypeVar
+
+import anyio
+from starlette.concurrency import iterate_in_threadpool
+
+from src.domain.models import Student, Canteen, Reservation
+from src.domain.working_hours import WorkingHoursTable
+from src.repository.occupancy import DayOccupancy
+from src import profiling
+
+T = TypeVar("T")
+
+# Koliko zapisa toka se posalje pre nego sto se event loop prepusti drugim zahtevima
+INLINE_ITERATE_BATCH = 8
+
+
+class AsyncRepository(Protocol):
+    # Asinhroni interfejs repozitorijuma. blocking_io kaze da li pozivi blokiraju
+    # (I/O nad fajlom ili mrezom), pa moraju u thread pool, ili se izvrsavaju odmah na event loop-u
+    blocking_io: bool
+
+    async def add_student(self, data: Student) -> Student: ...
+    async def add_students(self, data: List[Student]) -> List[Student]: ...
+    async def get_student_by_id(self, student_id: str) -> Optional[Student]: ...
+    async def get_student_by_email(self, email: str) -> Optional[Student]: ...
+
+    async def add_canteen(self, data: Canteen) -> Canteen: ...
+    async def get_canteen_by_id(self, canteen_id: str) -> Optional[Canteen]: ...
+    async def get_all_canteens(self) -> List[Canteen]: ...
+    async def update_canteen(self, canteen_id: str, data: dict) -> Optional[Canteen]: ...
+    async def get_working_hours(self, canteen: Canteen) -> WorkingHoursTable: ...
+    async def delete_canteen(self, canteen_id: str) -> bool: ...
+
+    async def add_reservation(self, data: Reservation) -> Reservation: ...
+    async def add_reservations(self, data: List[Reservation]) -> List[Reservation]: ...
+    async def get_reservation_by_id(self, reservation_id: str) -> Optional[Reservation]: ...
+    async def get_reservations_by_student_id(self, student_id: str, since: Optional[date] = None) -> List[Reservation]: ...
+    async def cancel_reservation(self, reservation_id: str) -> Reservation: ...
+    async def get_active_reservations_by_canteen_and_date(self, canteen_id: str, reservation_date: date) -> List[Reservation]: ...
+    async def get_active_dates(self, canteen_id: str, since: date) -> List[date]: ...
+    async def delete_reservations_by_canteen_id(self, canteen_id: str, limit: Optional[int] = None) -> int: ...
+
+    async def get_occupancy(self, canteen_id: str, reservation_date: date) -> DayOccupancy: ...
+    async def get_canteen_version(self, canteen_id: str) -> int: ...
+    async def get_day_version(self, canteen_id: str, reservation_date: date) -> int: ...
+
+    async def clear_all(self) -> None: ...
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T: ...
+    async def offload(self, func: Callable[..., T], *args, **kwargs) -> T: ...
+    def iterate(self, iterator: Iterator[T]) -> AsyncIterator[T]: ...
+
+
+class AsyncRepositoryAdapter:
+    # Prilagodjava sinhroni repozitorijum (MemoryRepository, SqliteRepository) na AsyncRepository.
+    # Repozitorijum u memoriji nikad ne blokira, pa se njegovi kratki pozivi i servisni kod koji
+    # ga koristi izvrsavaju direktno na event loop-u, bez skoka u thread pool. Skupe operacije
+    # (opseg dana, grupni upis, uvoz) pozivalac salje preko offload, koji uvek ide u thread pool.
+    def __init__(self, repo):
+        self.repo = repo
+        self.blocking_io = getattr(repo, "blocking_io", True)
+
+    def __getattr__(self, name: str):
+        method = getattr(self.repo, name)
+        if name.startswith("_") or name == "transaction" or not callable(method):
+            raise AttributeError(name)
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+        return call
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        # Izvrsava jedinicu posla nad repozitorijumom (npr. metodu servisa) tamo gde sme da blokira
+        if not self.blocking_io:
+            return func(*args, **kwargs)
+        return await self.offload(func, *args, **kwargs)
+
+    async def offload(self, func: Callable[..., T], *args, **kwargs) -> T:
+        # CPU-tezak posao ide u thread pool i kada repozitorijum ne blokira, da event loop
+        # za to vreme opsluzuje ostale zahteve
+        return await anyio.to_thread.run_sync(functools.partial(profiling.profiled_call(func), *args, **kwargs))
+
+    def iterate(self, iterator: Iterator[T]) -> AsyncIterator[T]:
+        if not self.blocking_io:
+            return _iterate_inline(iterator)
+        return iterate_in_threadpool(iterator)
+
+
+async def _iterate_inline(iterator: Iterator[T]) -> AsyncIterator[T]:
+    # Slanje zapisa cesto ne ceka na mrezu, pa se loop posle svakih INLINE_ITERATE_BATCH
+    # zapisa eksplicitno prepusta, da dug izvoz ne zaustavi ostale zahteve
+    for count, item in enumerate(iterator, 1):
+        yield item
+        if count % INLINE_ITERATE_BATCH == 0:
+            await anyio.sleep(0)
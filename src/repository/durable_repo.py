@@ -0,0 +1,349 @@
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+from datetime import date, time
+from typing import Dict, List, Optional, Set, Tuple
+from src.domain.models import Student, Canteen, Reservation
+from src.repository.occupancy import DayOccupancy
+from src.repository.repo import MemoryRepository
+
+_SNAPSHOT_MAGIC = b"CNTSNAP1"
+# Najvise zapisa rezervacija koji se pri ponavljanju loga upisuju zajedno
+_REPLAY_BATCH_SIZE = 4096
+_SEGMENT_PATTERN = re.compile(r"^wal-(\d{8})\.log$")
+_SNAPSHOT_PATTERN = re.compile(r"^snapshot-(\d{8})\.bin$")
+
+
+def _segment_name(number: int) -> str:
+    return f"wal-{number:08d}.log"
+
+
+def _snapshot_name(number: int) -> str:
+    return f"snapshot-{number:08d}.bin"
+
+
+def _list_numbered(directory: str, pattern: re.Pattern) -> List[int]:
+    return sorted(int(match.group(1)) for match in map(pattern.match, os.listdir(directory)) if match)
+
+
+class AppendLog:
+    # Log izmena podeljen na segmente (wal-<broj>.log), jedan JSON zapis po liniji.
+    # fsync se radi najkasnije fsync_interval sekundi posle upisa (0 = posle svakog upisa),
+    # pa pri padu masine moze da se izgubi najvise poslednjih fsync_interval sekundi izmena.
+    def __init__(self, directory: str, segment: int, fsync_interval: float):
+        self.directory = directory
+        self.segment = segment
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._file = open(os.path.join(directory, _segment_name(segment)), "ab")
+        self._dirty = False
+        self._closed = threading.Event()
+        self._flusher = None
+        if fsync_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_periodically, name="append-log-fsync", daemon=True)
+            self._flusher.start()
+
+    def append(self, record: List) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+        with self._lock:
+            self._file.write(line)
+            if self.fsync_interval > 0:
+                self._dirty = True
+            else:
+                self._sync()
+
+    def rotate(self) -> int:
+        # Zatvara tekuci segment i otvara sledeci; vraca broj novog segmenta
+        with self._lock:
+            self._sync()
+            self._file.close()
+            self.segment += 1
+            self._file = open(os.path.join(self.directory, _segment_name(self.segment)), "ab")
+            return self.segment
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._lock:
+            self._sync()
+            self._file.close()
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._dirty = False
+
+    def _flush_periodically(self) -> None:
+        # Pod lock-om se radi samo flush; fsync ide na kopiji deskriptora van lock-a, da upisi
+        # (koji bez thread pool-a idu na event loop-u) ne cekaju disk. Kopija vazi i ako
+        # rotate u medjuvremenu zatvori segment.
+        while not self._closed.wait(self.fsync_interval):
+            with self._lock:
+                if not self._dirty:
+                    continue
+                self._file.flush()
+                self._dirty = False
+                descriptor = os.dup(self._file.fileno())
+            try:
+                os.fsync(descriptor)
+            finally:
+                os.close(descriptor)
+
+
+class DurableMemoryRepository(MemoryRepository):
+    # MemoryRepository cije se izmene upisuju u AppendLog. Na svakih snapshot_every zapisa
+    # pravi se snapshot celog stanja (u pozadinskoj niti), a stariji segmenti loga se brisu.
+    # Pri pokretanju se ucitava poslednji snapshot i ponavlja samo rep loga posle njega.
+    def __init__(self, directory: str, fsync_interval: float = 0.05, snapshot_every: int = 20_000):
+        super().__init__()
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        # fsync posle svakog upisa blokira, pa se tada pozivi salju u thread pool
+        self.blocking_io = fsync_interval == 0
+        # Izmena stanja i upis u log su jedna celina u odnosu na pravljenje snapshot-a
+        self._write_lock = threading.RLock()
+        self._records_since_snapshot = 0
+        self._snapshot_thread: Optional[threading.Thread] = None
+        # Obrisane menze cije rezervacije jos nisu sve obrisane; zapis delete_canteen je ujedno i
+        # namera da se one obrisu, pa brisanje prekinuto padom procesa zavrsava sledece pokretanje
+        self._pending_cascades: Set[str] = set()
+
+        os.makedirs(directory, exist_ok=True)
+        snapshots = _list_numbered(directory, _SNAPSHOT_PATTERN)
+        first_segment = snapshots[-1] if snapshots else 1
+        if snapshots:
+            self._load_snapshot(os.path.join(directory, _snapshot_name(first_segment)))
+
+        segments = [number for number in _list_numbered(directory, _SEGMENT_PATTERN) if number >= first_segment]
+        for number in segments:
+            self._records_since_snapshot += self._replay(os.path.join(directory, _segment_name(number)))
+
+        # Novi segment posle svakog pokretanja, da se ne dopisuje iza eventualno prekinutog zapisa
+        self._log = AppendLog(directory, (segments[-1] + 1) if segments else first_segment, fsync_interval)
+        for canteen_id in sorted(self._pending_cascades):
+            self.delete_reservations_by_canteen_id(canteen_id)
+
+    def add_student(self, data: Student) -> Student:
+        with self._write_lock:
+            student = super().add_student(data)
+            self._append(["student", student.model_dump()])
+            return student
+
+    def add_canteen(self, data: Canteen) -> Canteen:
+        with self._write_lock:
+            canteen = super().add_canteen(data)
+            self._append(["canteen", canteen.model_dump(mode="json", by_alias=True)])
+            return canteen
+
+    def update_canteen(self, canteen_id: str, data: dict) -> Optional[Canteen]:
+        with self._write_lock:
+            canteen = super().update_canteen(canteen_id, data)
+            if canteen is not None:
+                self._append(["update_canteen", canteen.model_dump(mode="json", by_alias=True)])
+            return canteen
+
+    def delete_canteen(self, canteen_id: str) -> bool:
+        with self._write_lock:
+            deleted = super().delete_canteen(canteen_id)
+            if deleted:
+                self._pending_cascades.add(canteen_id)
+                self._append(["delete_canteen", canteen_id])
+            return deleted
+
+    def add_reservation(self, data: Reservation) -> Reservation:
+        with self._write_lock:
+            reservation = super().add_reservation(data)
+            self._append(["reservation", reservation.id, reservation.studentId, reservation.canteenId,
+                          reservation.date.isoformat(), reservation.time.strftime("%H:%M"), reservation.duration, reservation.status])
+            return reservation
+
+    def cancel_reservation(self, reservation_id: str) -> Reservation:
+        with self._write_lock:
+            reservation = super().cancel_reservation(reservation_id)
+            if reservation is not None:
+                self._append(["cancel", reservation_id])
+            return reservation
+
+    def delete_reservations_by_canteen_id(self, canteen_id: str, limit: Optional[int] = None) -> int:
+        with self._write_lock:
+            count = super().delete_reservations_by_canteen_id(canteen_id, limit)
+            if limit is None or count < limit:
+                self._pending_cascades.discard(canteen_id)
+            # Pri ponavljanju loga se brisu sve rezervacije menze, sto je isti ishod kao posle svih delova
+            self._append(["delete_reservations", canteen_id])
+            return count
+
+    def clear_all(self):
+        with self._write_lock:
+            super().clear_all()
+            self._pending_cascades.clear()
+            self._append(["clear"])
+
+    def close(self) -> None:
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        self._log.close()
+
+    def snapshot(self) -> None:
+        # Stanje se kopira pod bravom (kratko), a upisuje u fajl van nje
+        with self._write_lock:
+            state = self._capture()
+            segment = self._log.rotate()
+            self._records_since_snapshot = 0
+        self._write_snapshot(state, segment)
+
+    def _append(self, record: List) -> None:
+        self._log.append(record)
+        self._records_since_snapshot += 1
+        if self._records_since_snapshot >= self.snapshot_every and (self._snapshot_thread is None or not self._snapshot_thread.is_alive()):
+            self._snapshot_thread = threading.Thread(target=self.snapshot, name="repository-snapshot", daemon=True)
+            self._snapshot_thread.start()
+
+    def _capture(self) -> Dict:
+        store_meta, columns = self._reservations.dump()
+        return {
+            "students": [student.model_dump() for student in self._students.values()],
+            "canteens": [canteen.model_dump(mode="json", by_alias=True) for canteen in self._canteens.values()],
+            "canteen_versions": dict(self._canteen_versions),
+            "day_versions": [[canteen_id, day.isoformat(), version] for (canteen_id, day), version in self._day_versions.items()],
+            "archive_version": self._archive_version,
+            "pending_cascades": sorted(self._pending_cascades),
+            "occupancy": [[canteen_id, day.isoformat(), occupancy.counts[:], occupancy.long_starts[:]]
+                          for (canteen_id, day), occupancy in self._occupancy.items()],
+            "reservations": store_meta,
+            "columns": columns,
+        }
+
+    def _write_snapshot(self, state: Dict, segment: int) -> None:
+        # Format: magic, duzina JSON opisa, JSON opis, pa sirove kolone rezervacija jedna za drugom
+        columns = state.pop("columns")
+        meta = json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode()
+        path = os.path.join(self.directory, _snapshot_name(segment))
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_SNAPSHOT_MAGIC)
+            f.write(struct.pack("<Q", len(meta)))
+            f.write(meta)
+            for column in columns:
+                f.write(column)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        # Stariji snapshot-ovi i segmenti su sada sadrzani u novom snapshot-u
+        for number in _list_numbered(self.directory, _SNAPSHOT_PATTERN):
+            if number < segment:
+                os.remove(os.path.join(self.directory, _snapshot_name(number)))
+        for number in _list_numbered(self.directory, _SEGMENT_PATTERN):
+            if number < segment:
+                os.remove(os.path.join(self.directory, _segment_name(number)))
+
+    def _load_snapshot(self, path: str) -> None:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped[:len(_SNAPSHOT_MAGIC)] != _SNAPSHOT_MAGIC:
+                raise ValueError(f"Fajl '{path}' nije ispravan snapshot.")
+            offset = len(_SNAPSHOT_MAGIC)
+            (meta_size,) = struct.unpack_from("<Q", mapped, offset)
+            offset += 8
+            state = json.loads(mapped[offset:offset + meta_size])
+            self._reservations.load(state["reservations"], memoryview(mapped)[offset + meta_size:])
+
+        for values in state["students"]:
+            self._insert_student(Student.model_validate(values))
+        for values in state["canteens"]:
+            self._insert_canteen(Canteen.model_validate(values))
+        self._canteen_versions.update(state["canteen_versions"])
+        for canteen_id, day, version in state["day_versions"]:
+            self._day_versions[(canteen_id, date.fromisoformat(day))] = version
+        self._archive_version = state.get("archive_version", 0)
+        self._pending_cascades.update(state.get("pending_cascades", ()))
+        for canteen_id, day, counts, long_starts in state["occupancy"]:
+            occupancy = DayOccupancy()
+            occupancy.counts = counts
+            occupancy.long_starts = long_starts
+            day = date.fromisoformat(day)
+            self._occupancy[(canteen_id, day)] = occupancy
+            self._occupied_days.setdefault(canteen_id, set()).add(day)
+        # Snapshot starijeg formata moze imati zauzetost vec arhiviranih dana
+        self._prune_archived_days()
+
+    def _replay(self, path: str) -> int:
+        # Uzastopni zapisi rezervacija se upisuju zajedno, a pre svakog drugog zapisa se upisuje
+        # ono sto je sakupljeno, pa je redosled izmena isti kao u logu
+        count = 0
+        batch: List[List] = []
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Poslednji zapis je mogao ostati nedovrsen pri padu procesa
+                    break
+                count += 1
+                if record[0] == "reservation":
+                    batch.append(record)
+                    if len(batch) >= _REPLAY_BATCH_SIZE:
+                        self._apply_reservations(batch)
+                        batch = []
+                    continue
+                if batch:
+                    self._apply_reservations(batch)
+                    batch = []
+                self._apply(record)
+        if batch:
+            self._apply_reservations(batch)
+        return count
+
+    def _apply_reservations(self, records: List[List]) -> None:
+        # Rezervacije idu u skladiste kao sirovi redovi, a zauzetost i verzija svakog dana se
+        # menjaju jednom za ceo niz
+        dates: Dict[str, date] = {}
+        times: Dict[str, time] = {}
+        rows = []
+        slots: Dict[Tuple[str, date], List[Tuple[time, int]]] = {}
+        for _, reservation_id, student_id, canteen_id, day, start, duration, status in records:
+            reservation_date = dates.get(day)
+            if reservation_date is None:
+                reservation_date = dates[day] = date.fromisoformat(day)
+            start_time = times.get(start)
+            if start_time is None:
+                start_time = times[start] = time.fromisoformat(start)
+            rows.append((reservation_id, student_id, canteen_id, reservation_date.toordinal(),
+                         start_time.hour * 60 + start_time.minute, duration, status))
+            if status == "Active":
+                slots.setdefault((canteen_id, reservation_date), []).append((start_time, duration))
+
+        self._reservations.add_many(rows)
+        for key, day_slots in slots.items():
+            self._change_occupancy(key, day_slots, 1)
+            self._bump_day_version(key, len(day_slots))
+
+    def _apply(self, record: List) -> None:
+        # Ponavljanje zapisa direktno nad MemoryRepository, bez ponovnog upisa u log
+        operation = record[0]
+        if operation == "student":
+            self._insert_student(Student.model_validate(record[1]))
+        elif operation == "canteen":
+            self._insert_canteen(Canteen.model_validate(record[1]))
+        elif operation == "update_canteen":
+            canteen = Canteen.model_validate(record[1])
+            MemoryRepository.update_canteen(self, canteen.id, {field: value for field, value in canteen if field != "id"})
+        elif operation == "delete_canteen":
+            MemoryRepository.delete_canteen(self, record[1])
+            self._pending_cascades.add(record[1])
+        elif operation == "reservation":
+            self._apply_reservations([record])
+        elif operation == "cancel":
+            MemoryRepository.cancel_reservation(self, record[1])
+        elif operation == "delete_reservations":
+            MemoryRepository.delete_reservations_by_canteen_id(self, record[1])
+            self._pending_cascades.discard(record[1])
+        elif operation == "clear":
+            MemoryRepository.clear_all(self)
+            self._pending_cascades.clear()
+        else:
+            raise ValueError(f"Nepoznata operacija u logu: '{operation}'.")
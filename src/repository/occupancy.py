@@ -0,0 +1,58 @@
+from datetime import time
+from typing import List
+
+BUCKET_MINUTES = 30
+BUCKETS_PER_DAY = 24 * 60 // BUCKET_MINUTES
+
+_BUCKET_US = BUCKET_MINUTES * 60 * 1_000_000
+
+
+def time_offset_us(t: time) -> int:
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * 1_000_000 + t.microsecond
+
+
+def bucket_of(t: time) -> int:
+    return time_offset_us(t) // _BUCKET_US
+
+
+class DayOccupancy:
+    # Broj aktivnih rezervacija po polusatnim intervalima jednog dana jedne menze.
+    # long_starts[b] broji rezervacije koje pocinju u intervalu b i traju i u b + 1,
+    # da bi se rezervacija koja pokriva dva intervala u upitu brojala samo jednom.
+    __slots__ = ("counts", "long_starts")
+
+    def __init__(self):
+        self.counts: List[int] = [0] * BUCKETS_PER_DAY
+        self.long_starts: List[int] = [0] * BUCKETS_PER_DAY
+
+    def copy(self) -> "DayOccupancy":
+        clone = DayOccupancy()
+        clone.counts = self.counts[:]
+        clone.long_starts = self.long_starts[:]
+        return clone
+
+    def add(self, start: time, duration: int, delta: int = 1):
+        first = bucket_of(start)
+        last = min(first + -(-duration // BUCKET_MINUTES) - 1, BUCKETS_PER_DAY - 1)
+        for b in range(first, last + 1):
+            self.counts[b] += delta
+        if last > first:
+            self.long_starts[first] += delta
+
+    def remove(self, start: time, duration: int):
+        self.add(start, duration, -1)
+
+    def is_empty(self) -> bool:
+        return not any(self.counts)
+
+    def count_overlapping(self, start: time, duration: int) -> int:
+        start_us = time_offset_us(start)
+        first = start_us // _BUCKET_US
+        if first >= BUCKETS_PER_DAY:
+            return 0
+        last = min((start_us + duration * 60 * 1_000_000 - 1) // _BUCKET_US, BUCKETS_PER_DAY - 1)
+
+        total = self.counts[first]
+        for b in range(first + 1, last + 1):
+            total += self.counts[b] - self.long_starts[b - 1]
+        return total
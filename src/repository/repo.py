@@ -1,37 +1,67 @@
 import uuid
-from typing import Dict, List, Optional
-from datetime import date
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Set, Tuple
+from datetime import date, time
 from src.domain.models import Student, Canteen, Reservation
+from src.domain.working_hours import WorkingHoursTable
+from src.repository.occupancy import DayOccupancy
+from src.repository.reservation_store import ReservationStore
+from src.repository.async_repo import AsyncRepositoryAdapter
+from src import config
+from src.metrics import instrument_repository, REPOSITORY_ROWS_SCANNED
 
+@instrument_repository("memory")
 class MemoryRepository:
+    # Svi podaci su u memoriji procesa, pa nijedan poziv ne blokira event loop
+    blocking_io = False
+
     def __init__(self):
         self._students: Dict[str, Student] = {}
         self._canteens: Dict[str, Canteen] = {}
-        self._reservations: Dict[str, Reservation] = {}
+        # Tabele radnog vremena po menzi; prave se pri dodavanju menze i izmeni radnog vremena
+        self._working_hours: Dict[str, WorkingHoursTable] = {}
+        # Rezervacije su u kolonskom skladistu sa sopstvenim indeksima po studentu, menzi i danu
+        self._reservations = ReservationStore()
+
+        # Sekundarni indeksi, azuriraju se pri svakoj izmeni
+        self._students_by_email: Dict[str, Student] = {}
+        self._occupancy: Dict[Tuple[str, date], DayOccupancy] = {}
+        # Dani sa zauzetoscu po menzi, da se aktivni dani jedne menze ne traze kroz sve kljuceve
+        self._occupied_days: Dict[str, Set[date]] = {}
+
+        # Verzije za invalidaciju kesa statusa; rastu pri svakoj izmeni menze ili dana
+        self._canteen_versions: Dict[str, int] = {}
+        self._day_versions: Dict[Tuple[str, date], int] = {}
+        # Zajednicka verzija svih arhiviranih dana: njihova zauzetost i verzije se ne cuvaju po danu
+        self._archive_version = 0
+
+    def transaction(self):
+        # Sve izmene su u memoriji; atomicnost rezervacija obezbedjuju brave u servisu
+        return nullcontext()
 
     def add_student(self, data: Student) -> Student:
         if self.get_student_by_email(data.email):
             raise ValueError(f"Student sa ovim email-om {data.email} već postoji.")
         
-        new_id = str(uuid.uuid4())
-        new_student = data.model_copy(update={"id": new_id})
-        self._students[new_id] = new_student
-        return new_student
+        return self._insert_student(data.model_copy(update={"id": str(uuid.uuid4())}))
+
+    def add_students(self, data: List[Student]) -> List[Student]:
+        emails = set()
+        for student in data:
+            if student.email in emails or self.get_student_by_email(student.email):
+                raise ValueError(f"Student sa ovim email-om {student.email} već postoji.")
+            emails.add(student.email)
+
+        return [self.add_student(student) for student in data]
 
     def get_student_by_id(self, student_id: str) -> Optional[Student]:
         return self._students.get(student_id)
     
     def get_student_by_email(self, email: str) -> Optional[Student]:
-        for student in self._students.values():
-            if student.email == email:
-                return student
-        return None
+        return self._students_by_email.get(email)
 
     def add_canteen(self, data: Canteen) -> Canteen:
-        new_id = str(uuid.uuid4())
-        new_canteen = data.model_copy(update={"id": new_id})
-        self._canteens[new_id] = new_canteen
-        return new_canteen
+        return self._insert_canteen(data.model_copy(update={"id": str(uuid.uuid4())}))
     
     def get_canteen_by_id(self, canteen_id: str) -> Optional[Canteen]:
         return self._canteens.get(canteen_id)
@@ -46,50 +76,184 @@ class MemoryRepository:
         existing_canteen = self._canteens[canteen_id]
         update_canteen = existing_canteen.model_copy(update=data)
         self._canteens[canteen_id] = update_canteen
+        if "workingHours" in data:
+            self._working_hours[canteen_id] = WorkingHoursTable(update_canteen.workingHours)
+        self._bump_canteen_version(canteen_id)
         return update_canteen
 
+    def get_working_hours(self, canteen: Canteen) -> WorkingHoursTable:
+        table = self._working_hours.get(canteen.id)
+        # Menza procitana pre izmene radnog vremena dobija tabelu za svoje radno vreme
+        if table is None or table.working_hours is not canteen.workingHours:
+            return WorkingHoursTable(canteen.workingHours)
+        return table
+
     def delete_canteen(self, canteen_id: str) -> bool:
         if canteen_id not in self._canteens:
             return False
         
         del self._canteens[canteen_id]
+        self._working_hours.pop(canteen_id, None)
+        self._bump_canteen_version(canteen_id)
         return True
 
     def add_reservation(self, data: Reservation) -> Reservation:
-        new_id = str(uuid.uuid4())
-        new_reservation = data.model_copy(update={"id": new_id})
-        self._reservations[new_id] = new_reservation
-        return new_reservation
+        return self._insert_reservation(data)
     
+    def add_reservations(self, data: List[Reservation]) -> List[Reservation]:
+        return [self.add_reservation(reservation) for reservation in data]
+
     def get_reservation_by_id(self, reservation_id: str) -> Optional[Reservation]:
         return self._reservations.get(reservation_id)
 
-    def get_reservations_by_student_id(self, student_id: str) -> List[Reservation]:
-        return [res for res in self._reservations.values() if res.studentId == student_id]
+    def get_reservations_by_student_id(self, student_id: str, since: Optional[date] = None) -> List[Reservation]:
+        reservations = self._reservations.by_student(student_id, since)
+        REPOSITORY_ROWS_SCANNED.inc(("memory", "get_reservations_by_student_id"), len(reservations))
+        return reservations
     
     def cancel_reservation(self, reservation_id: str) -> Reservation:
-        reservation = self._reservations.get(reservation_id)
-        if not reservation:
-            return None
-
-        reservation.status = "Cancelled"
-        self._reservations[reservation_id] = reservation
+        reservation, was_active = self._reservations.cancel(reservation_id)
+        if was_active:
+            key = (reservation.canteenId, reservation.date)
+            self._change_occupancy(key, [(reservation.time, reservation.duration)], -1)
+            self._bump_day_version(key)
         return reservation
     
     def get_active_reservations_by_canteen_and_date(self, canteen_id: str, reservation_date: date) -> List[Reservation]:
-        return [res for res in self._reservations.values() if res.canteenId == canteen_id and res.date == reservation_date and res.status == "Active"]
+        reservations = self._reservations.active_by_canteen_and_date(canteen_id, reservation_date)
+        REPOSITORY_ROWS_SCANNED.inc(("memory", "get_active_reservations_by_canteen_and_date"), len(reservations))
+        return reservations
     
-    def delete_reservations_by_canteen_id(self, canteen_id: str) -> int:
-        ids_to_delete = [res_id for res_id, res in self._reservations.items() if res.canteenId == canteen_id]
-        count = 0
-        for res_id in ids_to_delete:
-            del self._reservations[res_id]
-            count += 1
+    def get_active_dates(self, canteen_id: str, since: date) -> List[date]:
+        # Dani od since nadalje u kojima menza ima aktivnih rezervacija (zauzetost postoji samo za njih)
+        since = max(since, self._reservations.archived_until)
+        return sorted(day for day in list(self._occupied_days.get(canteen_id, ())) if day >= since)
+
+    def get_occupancy(self, canteen_id: str, reservation_date: date) -> DayOccupancy:
+        if reservation_date < self._reservations.archived_until:
+            # Arhivirani (prosli) dan se retko trazi, pa se zauzetost racuna iz arhive pri citanju
+            occupancy = DayOccupancy()
+            for reservation in self._reservations.active_by_canteen_and_date(canteen_id, reservation_date):
+                occupancy.add(reservation.time, reservation.duration)
+            return occupancy
+        return self._occupancy.get((canteen_id, reservation_date)) or DayOccupancy()
+
+    def get_canteen_version(self, canteen_id: str) -> int:
+        return self._canteen_versions.get(canteen_id, 0)
+
+    def get_day_version(self, canteen_id: str, reservation_date: date) -> int:
+        if reservation_date < self._reservations.archived_until:
+            return self._archive_version
+        return self._day_versions.get((canteen_id, reservation_date), 0)
+
+    def delete_reservations_by_canteen_id(self, canteen_id: str, limit: Optional[int] = None) -> int:
+        # Sa limit brise najvise limit rezervacija; pozivalac ponavlja dok ne dobije 0
+        count, removed_active = self._reservations.delete_by_canteen(canteen_id, limit)
+        for day, removed in removed_active.items():
+            key = (canteen_id, day)
+            self._change_occupancy(key, removed, -1)
+            self._bump_day_version(key)
         return count
 
+    def archive_reservations_before(self, cutoff: date) -> int:
+        # Prosli dani prelaze u kompaktnu arhivu; i dalje su dostupni za istoriju studenta i izvestaje
+        # Verzija arhive raste pre i posle premestanja, da dan koji upravo prelazi u arhivu nikad
+        # ne dobije verziju koju je vec imao
+        self._raise_archive_version(cutoff)
+        moved = self._reservations.archive_before(cutoff)
+        self._prune_archived_days()
+        return moved
+
     def clear_all(self):
         self._students.clear()
         self._canteens.clear()
+        self._working_hours.clear()
         self._reservations.clear()
+        self._students_by_email.clear()
+        self._occupancy.clear()
+        self._occupied_days.clear()
+        self._canteen_versions.clear()
+        self._day_versions.clear()
+        self._archive_version = 0
+
+    # Upis sa vec dodeljenim ID-jem; koriste ga add_* metode i vracanje stanja iz loga
+
+    def _insert_student(self, student: Student) -> Student:
+        self._students[student.id] = student
+        self._students_by_email[student.email] = student
+        return student
+
+    def _insert_canteen(self, canteen: Canteen) -> Canteen:
+        self._canteens[canteen.id] = canteen
+        self._working_hours[canteen.id] = WorkingHoursTable(canteen.workingHours)
+        return canteen
+
+    def _insert_reservation(self, data: Reservation, reservation_id: Optional[str] = None) -> Reservation:
+        new_reservation = self._reservations.add(data, reservation_id)
+        if new_reservation.status == "Active":
+            key = (new_reservation.canteenId, new_reservation.date)
+            self._change_occupancy(key, [(new_reservation.time, new_reservation.duration)], 1)
+            self._bump_day_version(key)
+        return new_reservation
+
+    def _change_occupancy(self, key: Tuple[str, date], slots: List[Tuple[time, int]], delta: int):
+        # Zauzetost se vodi samo za dane koji nisu arhivirani
+        if key[1] < self._reservations.archived_until:
+            return
+        occupancy = self._occupancy.get(key)
+        if occupancy is None:
+            if delta < 0:
+                return
+            occupancy = self._occupancy[key] = DayOccupancy()
+            self._occupied_days.setdefault(key[0], set()).add(key[1])
+        for start, duration in slots:
+            occupancy.add(start, duration, delta)
+        if occupancy.is_empty():
+            self._drop_occupancy(key)
+
+    def _drop_occupancy(self, key: Tuple[str, date]):
+        self._occupancy.pop(key, None)
+        days = self._occupied_days.get(key[0])
+        if days is not None:
+            days.discard(key[1])
+            if not days:
+                self._occupied_days.pop(key[0], None)
+
+    def _raise_archive_version(self, cutoff: date):
+        # Umesto verzija arhiviranih dana vazi zajednicka verzija arhive, veca od svake do sada
+        # izdate verzije tih dana, pa se stari ETag-ovi i kesirani statusi ne mogu poklopiti sa novim
+        versions = [version for (_, day), version in list(self._day_versions.items()) if day < cutoff]
+        self._archive_version = max([self._archive_version, *versions]) + 1
+
+    def _prune_archived_days(self):
+        # Zauzetost i verzije arhiviranih dana se brisu, pa recnici ne rastu sa istorijom
+        cutoff = self._reservations.archived_until
+        self._raise_archive_version(cutoff)
+        for key in [key for key in list(self._day_versions) if key[1] < cutoff]:
+            self._day_versions.pop(key, None)
+        for key in [key for key in list(self._occupancy) if key[1] < cutoff]:
+            self._drop_occupancy(key)
+
+    def _bump_canteen_version(self, canteen_id: str):
+        self._canteen_versions[canteen_id] = self._canteen_versions.get(canteen_id, 0) + 1
+
+    def _bump_day_version(self, key: Tuple[str, date], count: int = 1):
+        if key[1] < self._reservations.archived_until:
+            self._archive_version += count
+        else:
+            self._day_versions[key] = self._day_versions.get(key, 0) + count
+
+def create_repository():
+    if config.REPOSITORY_BACKEND == "sqlite":
+        from src.repository.sqlite_repo import SqliteRepository
+        return SqliteRepository(config.SQLITE_PATH, shared_occupancy_entries=config.SHARED_OCCUPANCY_ENTRIES,
+                                shared_occupancy_name=config.SHARED_OCCUPANCY_NAME or None)
+    if config.REPOSITORY_BACKEND == "durable":
+        from src.repository.durable_repo import DurableMemoryRepository
+        return DurableMemoryRepository(config.DATA_DIR, fsync_interval=config.LOG_FSYNC_INTERVAL, snapshot_every=config.SNAPSHOT_EVERY)
+    if config.REPOSITORY_BACKEND != "memory":
+        raise ValueError(f"Nepoznat REPOSITORY_BACKEND '{config.REPOSITORY_BACKEND}', dozvoljeno: memory, durable, sqlite.")
+    return MemoryRepository()
 
-repo = MemoryRepository()
\ No newline at end of file
+repo = create_repository()
+async_repo = AsyncRepositoryAdapter(repo)
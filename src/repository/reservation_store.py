@@ -0,0 +1,610 @@
+import threading
+import uuid
+from array import array
+from bisect import bisect_left
+from datetime import date, time
+from typing import Dict, Iterable, List, Optional, Tuple
+from src.domain.models import Reservation
+
+_ID_BYTES = 16
+_DELETED = -1
+# Posle koliko obrisanih redova (i vise od polovine svih) se kolone sabijaju
+_COMPACT_MIN_DELETED = 1024
+_COLUMNS = ("_canteen", "_student", "_day", "_minute", "_duration", "_status")
+_COLUMN_TYPES = ("i", "i", "i", "h", "h", "b")
+_INDEXES = ("_rows_by_student", "_rows_by_canteen", "_active_rows")
+_SEGMENT_INDEXES = ("_rows_by_student", "_rows_by_canteen_day")
+_TIMES = [time(minute // 60, minute % 60) for minute in range(24 * 60)]
+_RESERVATION_FIELDS = frozenset(Reservation.model_fields)
+
+
+def _construct(values: Dict) -> Reservation:
+    # Isto sto i Reservation.model_construct, bez obrade podrazumevanih vrednosti; vrednosti
+    # iz skladista su vec validne, a ovo je najcesca operacija pri citanju. Svaka instanca ima
+    # svoj skup polja, jer ga pydantic menja pri dodeli atributa i model_copy(update=...)
+    reservation = Reservation.__new__(Reservation)
+    object.__setattr__(reservation, "__dict__", values)
+    object.__setattr__(reservation, "__pydantic_fields_set__", set(_RESERVATION_FIELDS))
+    object.__setattr__(reservation, "__pydantic_extra__", None)
+    object.__setattr__(reservation, "__pydantic_private__", None)
+    return reservation
+
+
+def _dump_blocks(source, index_names: Iterable[str]) -> Tuple[Dict, List[bytes]]:
+    # Kolone i indeksi (recnici kljuc -> niz redova, spojeni u jedan blok) kao sirovi bajtovi
+    blocks = [bytes(source._ids)] + [getattr(source, name).tobytes() for name in _COLUMNS]
+    indexes = {}
+    for name in index_names:
+        index = getattr(source, name)
+        indexes[name] = {"keys": list(index), "lengths": [len(rows) for rows in index.values()]}
+        blocks.append(b"".join(rows.tobytes() for rows in index.values()))
+    return {"indexes": indexes, "sizes": [len(block) for block in blocks]}, blocks
+
+
+def _load_blocks(target, meta: Dict, view: memoryview, offset: int, index_names: Iterable[str]) -> int:
+    sizes = iter(meta["sizes"])
+    size = next(sizes)
+    target._ids = bytearray(view[offset:offset + size])
+    offset += size
+    for name, typecode in zip(_COLUMNS, _COLUMN_TYPES):
+        size = next(sizes)
+        column = array(typecode)
+        column.frombytes(view[offset:offset + size])
+        setattr(target, name, column)
+        offset += size
+
+    for name in index_names:
+        size = next(sizes)
+        rows = array("i")
+        rows.frombytes(view[offset:offset + size])
+        offset += size
+        index = {}
+        start = 0
+        for key, length in zip(meta["indexes"][name]["keys"], meta["indexes"][name]["lengths"]):
+            index[tuple(key) if isinstance(key, list) else key] = rows[start:start + length]
+            start += length
+        setattr(target, name, index)
+    return offset
+
+
+class _Interner:
+    # Svaki razlicit string (ID menze, ID studenta, status) se cuva jednom, a redovi drze samo njegov kod
+    __slots__ = ("values", "codes")
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class _ArchiveSegment:
+    # Nepromenljiv deo arhive: redovi sortirani po ID-ju, pa se rezervacija nalazi binarnom
+    # pretragom nad prvih 8 bajtova ID-ja (bez recnika po rezervaciji). Menja se samo status.
+    @classmethod
+    def build(cls, parts: List[Tuple[object, List[int]]]) -> "_ArchiveSegment":
+        # parts: parovi (izvor sa kolonama, redovi iz njega) - topli deo ili segmenti koji se spajaju
+        keys = []
+        for source, rows in parts:
+            ids = source._ids
+            keys.extend(bytes(ids[row * _ID_BYTES:(row + 1) * _ID_BYTES]) for row in rows)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+
+        segment = cls.__new__(cls)
+        segment._ids = bytearray(b"".join(map(keys.__getitem__, order)))
+        for name, typecode in zip(_COLUMNS, _COLUMN_TYPES):
+            values = []
+            for source, rows in parts:
+                values.extend(map(getattr(source, name).__getitem__, rows))
+            setattr(segment, name, array(typecode, map(values.__getitem__, order)))
+        segment._build_lookup()
+
+        segment._rows_by_student = {}
+        segment._rows_by_canteen_day = {}
+        for row, (student, canteen, day) in enumerate(zip(segment._student, segment._canteen, segment._day)):
+            rows = segment._rows_by_student.get(student)
+            if rows is None:
+                rows = segment._rows_by_student[student] = array("i")
+            rows.append(row)
+            rows = segment._rows_by_canteen_day.get((canteen, day))
+            if rows is None:
+                rows = segment._rows_by_canteen_day[(canteen, day)] = array("i")
+            rows.append(row)
+        return segment
+
+    @classmethod
+    def load(cls, meta: Dict, view: memoryview, offset: int) -> Tuple["_ArchiveSegment", int]:
+        segment = cls.__new__(cls)
+        offset = _load_blocks(segment, meta, view, offset, _SEGMENT_INDEXES)
+        segment._build_lookup()
+        return segment, offset
+
+    def dump(self) -> Tuple[Dict, List[bytes]]:
+        return _dump_blocks(self, _SEGMENT_INDEXES)
+
+    def _build_lookup(self):
+        ids = self._ids
+        self._keys = array("Q", [int.from_bytes(ids[offset:offset + 8], "big") for offset in range(0, len(ids), _ID_BYTES)])
+        self.live = sum(1 for status in self._status if status != _DELETED)
+
+    def find(self, id_bytes: bytes, deleted: bool = False) -> Optional[int]:
+        # Sa deleted=True se nalazi i obrisan red (za prenos izmena u segment napravljen van brave)
+        prefix = int.from_bytes(id_bytes[:8], "big")
+        row = bisect_left(self._keys, prefix)
+        while row < len(self._keys) and self._keys[row] == prefix:
+            if (deleted or self._status[row] != _DELETED) and self._ids[row * _ID_BYTES:(row + 1) * _ID_BYTES] == id_bytes:
+                return row
+            row += 1
+        return None
+
+    def live_rows(self) -> List[int]:
+        return [row for row, status in enumerate(self._status) if status != _DELETED]
+
+
+class ReservationStore:
+    # Kolonsko skladiste rezervacija: jedan red je nekoliko celih brojeva u tipiziranim nizovima
+    # (kod menze i studenta, dan kao ordinal, minut u danu, trajanje, kod statusa) i 16 bajtova
+    # UUID-a. Pydantic Reservation se pravi tek kada se red vraca pozivaocu.
+    #
+    # Podeljeno je po datumu: tekuci i buduci dani su u "toplom" delu sa indeksima u recnicima,
+    # a archive_before seli prosle dane u arhivu od nepromenljivih segmenata koji zauzimaju
+    # manje memorije i ne usporavaju upite nad tekucim danima.
+    #
+    # Arhiviranje i sabijanje (prepisivanje) prave nove segmente i kolone van brave: postojecim
+    # redovima se menja samo status, a sabijanje, jedino koje menja brojeve redova, ne ide uporedo
+    # sa drugim prepisivanjem. Izmene statusa u toku prepisivanja se belezi u _changes i pod
+    # bravom prenose na novo stanje, pa se brava drzi samo za zamenu.
+    def __init__(self):
+        # Jedan red se upisuje u vise kolona, pa izmene i citanja iz razlicitih niti idu pod bravom
+        self._lock = threading.Lock()
+        # Najvise jedno prepisivanje u isto vreme
+        self._rebuild_lock = threading.Lock()
+        self._generation = 0
+        self._reset()
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        # Prepisivanje zapoceto pre _reset (clear, load) po generaciji vidi da je stanje zamenjeno
+        self._generation += 1
+        self._rebuilding = False
+        self._changes: List[Tuple[bytes, int]] = []
+
+        self._canteens = _Interner()
+        self._students = _Interner()
+        self._statuses = _Interner()
+        self._active_status = self._statuses.code("Active")
+
+        self._ids = bytearray()
+        for name, typecode in zip(_COLUMNS, _COLUMN_TYPES):
+            setattr(self, name, array(typecode))
+
+        self._rows: Dict[bytes, int] = {}
+        self._rows_by_student: Dict[int, array] = {}
+        self._rows_by_canteen: Dict[int, array] = {}
+        self._active_rows: Dict[Tuple[int, int], array] = {}
+        self._deleted = 0
+        self._dates: Dict[int, date] = {}
+
+        self._segments: List[_ArchiveSegment] = []
+        # Dani pre ovog (ordinal) su arhivirani
+        self._archived_until = 0
+        # Donja granica dana u toplom delu; dok je >= cutoff, arhiviranje nema sta da premesti
+        self._min_day = 0
+
+    def __len__(self) -> int:
+        return len(self._rows) + self.archived_count
+
+    @property
+    def archived_until(self) -> date:
+        # Rezervacije pre ovog dana su arhivirane
+        return date.fromordinal(max(self._archived_until, 1))
+
+    @property
+    def archived_count(self) -> int:
+        return sum(segment.live for segment in self._segments)
+
+    def add(self, data: Reservation, reservation_id: Optional[str] = None) -> Reservation:
+        # reservation_id se zadaje samo pri vracanju ranije upisane rezervacije (npr. iz loga)
+        if data.time.second or data.time.microsecond:
+            raise ValueError("Vreme rezervacije mora biti zadato u celim minutima.")
+
+        new_id = uuid.UUID(reservation_id) if reservation_id else uuid.uuid4()
+        with self._lock:
+            row = len(self._status)
+            self._ids += new_id.bytes
+            self._canteen.append(self._canteens.code(data.canteenId))
+            self._student.append(self._students.code(data.studentId))
+            self._day.append(data.date.toordinal())
+            self._min_day = min(self._min_day, self._day[row])
+            self._minute.append(data.time.hour * 60 + data.time.minute)
+            self._duration.append(data.duration)
+            self._status.append(self._statuses.code(data.status))
+
+            self._rows[new_id.bytes] = row
+            self._index(row)
+            return self._build(self, row)
+
+    def add_many(self, rows: Iterable[Tuple[str, str, str, int, int, int, str]]):
+        # Vracanje ranije upisanih rezervacija (ID, studentId, canteenId, ordinal dana, minut u danu,
+        # trajanje, status) pod jednim zakljucavanjem i bez pravljenja modela, npr. pri ponavljanju loga
+        with self._lock:
+            for reservation_id, student_id, canteen_id, day, minute, duration, status in rows:
+                id_bytes = bytes.fromhex(reservation_id.replace("-", ""))
+                row = len(self._status)
+                self._ids += id_bytes
+                self._canteen.append(self._canteens.code(canteen_id))
+                self._student.append(self._students.code(student_id))
+                self._day.append(day)
+                self._minute.append(minute)
+                self._duration.append(duration)
+                self._status.append(self._statuses.code(status))
+                self._rows[id_bytes] = row
+                self._index(row)
+                if day < self._min_day:
+                    self._min_day = day
+
+    def get(self, reservation_id: str) -> Optional[Reservation]:
+        with self._lock:
+            source, row = self._locate(reservation_id)
+            return self._build(source, row) if source is not None else None
+
+    def by_student(self, student_id: str, since: Optional[date] = None) -> List[Reservation]:
+        # Sa since se preskacu rezervacije pre tog dana, pa arhiva ne usporava proveru novih rezervacija
+        with self._lock:
+            code = self._students.codes.get(student_id)
+            if code is None:
+                return []
+
+            first_day = since.toordinal() if since else 0
+            result = []
+            if first_day < self._archived_until:
+                for segment in self._segments:
+                    result.extend(self._build(segment, row) for row in segment._rows_by_student.get(code, ())
+                                  if segment._status[row] != _DELETED and segment._day[row] >= first_day)
+            result.extend(self._build(self, row) for row in self._rows_by_student.get(code, ())
+                          if self._day[row] >= first_day and self._status[row] != _DELETED)
+            return result
+
+    def active_by_canteen_and_date(self, canteen_id: str, reservation_date: date) -> List[Reservation]:
+        with self._lock:
+            code = self._canteens.codes.get(canteen_id)
+            if code is None:
+                return []
+
+            key = (code, reservation_date.toordinal())
+            result = []
+            if key[1] < self._archived_until:
+                for segment in self._segments:
+                    result.extend(self._build(segment, row) for row in segment._rows_by_canteen_day.get(key, ())
+                                  if segment._status[row] == self._active_status)
+            result.extend(self._build(self, row) for row in self._active_rows.get(key, ()) if self._status[row] == self._active_status)
+            return result
+
+    def cancel(self, reservation_id: str) -> Tuple[Optional[Reservation], bool]:
+        # Vraca otkazanu rezervaciju i da li je pre toga bila aktivna
+        with self._lock:
+            source, row = self._locate(reservation_id)
+            if source is None:
+                return None, False
+
+            was_active = source._status[row] == self._active_status
+            if was_active and source is self:
+                key = (self._canteen[row], self._day[row])
+                active = self._active_rows[key]
+                active.remove(row)
+                if not active:
+                    del self._active_rows[key]
+            self._set_status(source, row, self._statuses.code("Cancelled"))
+            return self._build(source, row), was_active
+
+    def delete_by_canteen(self, canteen_id: str, limit: Optional[int] = None) -> Tuple[int, Dict[date, List[Tuple[time, int]]]]:
+        # Vraca broj obrisanih rezervacija i, po danu, pocetak i trajanje obrisanih aktivnih rezervacija
+        # (da bi se oduzele od zauzetosti). Sa limit se obradjuje najvise toliko redova, da brava bude
+        # drzana kratko; brisanje se nastavlja sledecim pozivom, a gotovo je kada poziv vrati 0.
+        with self._lock:
+            code = self._canteens.codes.get(canteen_id)
+            if code is None:
+                return 0, {}
+
+            budget = limit if limit is not None else len(self._status) + sum(len(segment._status) for segment in self._segments)
+            removed_active: Dict[date, List[Tuple[time, int]]] = {}
+            count = 0
+            for segment in self._segments:
+                for key in [key for key in segment._rows_by_canteen_day if key[0] == code]:
+                    if budget <= 0:
+                        break
+                    rows = segment._rows_by_canteen_day.pop(key)
+                    taken = 0
+                    for row in rows:
+                        if budget <= 0:
+                            break
+                        taken += 1
+                        if segment._status[row] == _DELETED:
+                            # Red obrisan dok je segment pravljen van brave; ne trosi budzet
+                            continue
+                        if segment._status[row] == self._active_status:
+                            removed_active.setdefault(date.fromordinal(segment._day[row]), []).append(
+                                (_TIMES[segment._minute[row]], segment._duration[row]))
+                        self._set_status(segment, row, _DELETED)
+                        segment.live -= 1
+                        count += 1
+                        budget -= 1
+                    if taken < len(rows):
+                        segment._rows_by_canteen_day[key] = rows[taken:]
+
+            rows = self._rows_by_canteen.pop(code, array("i"))
+            budget = max(budget, 0)
+            removed = 0
+            taken = 0
+            for row in rows:
+                if removed >= budget:
+                    break
+                taken += 1
+                if self._status[row] == _DELETED:
+                    # Red premesten u arhivu (indeks se cisti tek pri sabijanju); ne trosi budzet
+                    continue
+                if self._status[row] == self._active_status:
+                    removed_active.setdefault(date.fromordinal(self._day[row]), []).append((_TIMES[self._minute[row]], self._duration[row]))
+                student_rows = self._rows_by_student[self._student[row]]
+                student_rows.remove(row)
+                if not student_rows:
+                    del self._rows_by_student[self._student[row]]
+                del self._rows[self._id_bytes(row)]
+                self._set_status(self, row, _DELETED)
+                removed += 1
+            if taken < len(rows):
+                self._rows_by_canteen[code] = rows[taken:]
+
+            # Obrisani redovi ostaju u _active_rows dok se ne obrise ceo deo menze (ili do sabijanja),
+            # a citanja ih preskacu po statusu; tako jedan deo ne prepravlja indekse svih dana menze
+            if code not in self._rows_by_canteen:
+                for key in [key for key in self._active_rows if key[0] == code]:
+                    del self._active_rows[key]
+
+            self._deleted += removed
+        # Sabijanje ide posle otpustanja brave, u niti pozivaoca (npr. pozadinskog posla)
+        self._compact_if_sparse()
+        return count + removed, removed_active
+
+    def archive_before(self, cutoff: date) -> int:
+        # Seli sve rezervacije pre cutoff dana u novi segment arhive; vraca broj premestenih.
+        # Pretraga redova, pravljenje i spajanje segmenata idu van brave, a pod bravom se samo
+        # zapocinje prepisivanje i na kraju zamenjuje stanje
+        with self._rebuild_lock:
+            with self._lock:
+                cutoff_day = cutoff.toordinal()
+                self._archived_until = max(self._archived_until, cutoff_day)
+                if self._min_day >= cutoff_day:
+                    return 0
+                # Red pre cutoff dana dodat u toku arhiviranja spusta granicu i ceka sledece arhiviranje
+                self._min_day = cutoff_day
+                generation, total, segments = self._begin_rebuild(), len(self._status), list(self._segments)
+
+            # Redovi pre total se ne menjaju osim statusa, a izmene statusa belezi _changes
+            moved = [row for row, (status, day) in enumerate(zip(self._status[:total], self._day[:total]))
+                     if status != _DELETED and day < cutoff_day]
+            built: List[_ArchiveSegment] = []
+            if moved:
+                segments.append(_ArchiveSegment.build([(self, moved)]))
+                built.append(segments[-1])
+                self._merge_segments(segments, built)
+
+            with self._lock:
+                if self._generation != generation:
+                    return 0
+                changes = self._end_rebuild()
+                if not moved:
+                    return 0
+
+                for id_bytes, status in changes:
+                    for segment in built:
+                        row = segment.find(id_bytes, deleted=True)
+                        if row is not None:
+                            if segment._status[row] != _DELETED:
+                                segment._status[row] = status
+                                if status == _DELETED:
+                                    segment.live -= 1
+                            break
+                # Premesteni redovi se samo oznace kao obrisani: izlaze iz _rows i indeksa aktivnih po danu,
+                # a indeksi po studentu i menzi ih preskacu po statusu do sabijanja, koje se radi tek kada
+                # je obrisana vecina redova (kao pri brisanju), a ne pri svakom arhiviranju
+                for row in moved:
+                    if self._status[row] != _DELETED:
+                        self._status[row] = _DELETED
+                        del self._rows[self._id_bytes(row)]
+                        self._deleted += 1
+                for key in [key for key in self._active_rows if key[1] < cutoff_day]:
+                    rows = array("i", (row for row in self._active_rows[key] if row >= total))
+                    if rows:
+                        self._active_rows[key] = rows
+                    else:
+                        del self._active_rows[key]
+                self._segments = segments
+        self._compact_if_sparse()
+        return len(moved)
+
+    def dump(self) -> Tuple[Dict, List[bytes]]:
+        # Kopija stanja za snapshot: opis (kodovi, kljucevi indeksa, duzine) i sirovi bajtovi
+        # kolona i indeksa; indeksi se cuvaju spojeni, da se pri ucitavanju ne grade ponovo
+        with self._lock:
+            meta, blocks = _dump_blocks(self, _INDEXES)
+            meta.update({
+                "canteens": list(self._canteens.values),
+                "students": list(self._students.values),
+                "statuses": list(self._statuses.values),
+                "deleted": self._deleted,
+                "archived_until": self._archived_until,
+                "segments": [],
+            })
+            for segment in self._segments:
+                segment_meta, segment_blocks = segment.dump()
+                meta["segments"].append(segment_meta)
+                blocks.extend(segment_blocks)
+        return meta, blocks
+
+    def load(self, meta: Dict, buffer) -> None:
+        # Vraca stanje iz dump-a; buffer moze biti memorijski mapiran fajl sa blokovima jedan za drugim
+        with self._lock:
+            self._reset()
+            for name, values in (("_canteens", meta["canteens"]), ("_students", meta["students"]), ("_statuses", meta["statuses"])):
+                interner = getattr(self, name)
+                interner.values = list(values)
+                interner.codes = {value: code for code, value in enumerate(values)}
+
+            with memoryview(buffer) as view:
+                offset = _load_blocks(self, meta, view, 0, _INDEXES)
+                for segment_meta in meta["segments"]:
+                    segment, offset = _ArchiveSegment.load(segment_meta, view, offset)
+                    self._segments.append(segment)
+
+            self._deleted = meta["deleted"]
+            self._archived_until = meta["archived_until"]
+            ids = bytes(self._ids)
+            keys = [ids[offset:offset + _ID_BYTES] for offset in range(0, len(ids), _ID_BYTES)]
+            if self._deleted:
+                live = [row for row, status in enumerate(self._status) if status != _DELETED]
+                self._rows = {keys[row]: row for row in live}
+            else:
+                self._rows = dict(zip(keys, range(len(keys))))
+
+    def _locate(self, reservation_id: str) -> Tuple[Optional[object], int]:
+        try:
+            parsed = uuid.UUID(reservation_id)
+        except (ValueError, TypeError, AttributeError):
+            return None, -1
+        # UUID prihvata i druge zapise istog broja; vazi samo kanonski oblik
+        if str(parsed) != reservation_id:
+            return None, -1
+
+        row = self._rows.get(parsed.bytes)
+        if row is not None:
+            return self, row
+        for segment in reversed(self._segments):
+            row = segment.find(parsed.bytes)
+            if row is not None:
+                return segment, row
+        return None, -1
+
+    @staticmethod
+    def _merge_segments(segments: List[_ArchiveSegment], built: List[_ArchiveSegment]):
+        # Segmenti slicne velicine se spajaju (kao binarni brojac), pa ih ima O(log n) i
+        # pretraga po ID-ju ostaje brza, a svaki red se prepisuje O(log n) puta. Radi van
+        # brave nad kopijom liste segmenata; u built ostaju segmenti napravljeni u ovom prolazu
+        while len(segments) >= 2 and segments[-2].live <= 2 * segments[-1].live:
+            last = segments.pop()
+            previous = segments.pop()
+            segments.append(_ArchiveSegment.build([(previous, previous.live_rows()), (last, last.live_rows())]))
+            built[:] = [segment for segment in built if segment is not last and segment is not previous]
+            built.append(segments[-1])
+
+    def _begin_rebuild(self) -> int:
+        # Pod bravom; od ovog trenutka se izmene statusa belezi za novo stanje
+        self._rebuilding = True
+        self._changes = []
+        return self._generation
+
+    def _end_rebuild(self) -> List[Tuple[bytes, int]]:
+        # Pod bravom; vraca izmene statusa nastale u toku prepisivanja
+        self._rebuilding = False
+        changes, self._changes = self._changes, []
+        return changes
+
+    def _set_status(self, source, row: int, status: int):
+        source._status[row] = status
+        if self._rebuilding:
+            self._changes.append((bytes(source._ids[row * _ID_BYTES:(row + 1) * _ID_BYTES]), status))
+
+    def _id_bytes(self, row: int) -> bytes:
+        return bytes(self._ids[row * _ID_BYTES:(row + 1) * _ID_BYTES])
+
+    def _index(self, row: int):
+        self._rows_by_student.setdefault(self._student[row], array("i")).append(row)
+        self._rows_by_canteen.setdefault(self._canteen[row], array("i")).append(row)
+        if self._status[row] == self._active_status:
+            self._active_rows.setdefault((self._canteen[row], self._day[row]), array("i")).append(row)
+
+    def _build(self, source, row: int) -> Reservation:
+        hex_id = source._ids[row * _ID_BYTES:(row + 1) * _ID_BYTES].hex()
+        day = source._day[row]
+        reservation_date = self._dates.get(day)
+        if reservation_date is None:
+            reservation_date = self._dates[day] = date.fromordinal(day)
+        return _construct({
+            "id": f"{hex_id[:8]}-{hex_id[8:12]}-{hex_id[12:16]}-{hex_id[16:20]}-{hex_id[20:]}",
+            "studentId": self._students.values[source._student[row]],
+            "canteenId": self._canteens.values[source._canteen[row]],
+            "date": reservation_date,
+            "time": _TIMES[source._minute[row]],
+            "duration": source._duration[row],
+            "status": self._statuses.values[source._status[row]],
+        })
+
+    def _compact_if_sparse(self):
+        # Poziva se bez brave; dok traje drugo prepisivanje, sabijanje ceka sledecu priliku
+        if not self._rebuild_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                if self._deleted < _COMPACT_MIN_DELETED or self._deleted * 2 <= len(self._status):
+                    return
+                generation, total = self._begin_rebuild(), len(self._status)
+            compacted = self._compacted(total)
+            with self._lock:
+                if self._generation == generation:
+                    self._swap_compacted(compacted, total, self._end_rebuild())
+        finally:
+            self._rebuild_lock.release()
+
+    def _compacted(self, total: int) -> "ReservationStore":
+        # Van brave: obrisani redovi pre total se izbacuju, a indeksi grade iznova nad novim brojevima redova
+        keep = [row for row, status in enumerate(self._status[:total]) if status != _DELETED]
+        compacted = ReservationStore.__new__(ReservationStore)
+        compacted._active_status = self._active_status
+        compacted._ids = bytearray(b"".join(self._ids[row * _ID_BYTES:(row + 1) * _ID_BYTES] for row in keep))
+        for name in _COLUMNS:
+            column = getattr(self, name)
+            setattr(compacted, name, array(column.typecode, map(column.__getitem__, keep)))
+
+        compacted._rows = {}
+        for name in _INDEXES:
+            setattr(compacted, name, {})
+        for row in range(len(keep)):
+            compacted._rows[compacted._id_bytes(row)] = row
+            compacted._index(row)
+        return compacted
+
+    def _swap_compacted(self, compacted: "ReservationStore", total: int, changes: List[Tuple[bytes, int]]):
+        # Pod bravom: na sabijeno stanje se prenose izmene statusa iz toku sabijanja i redovi dodati posle total
+        deleted = 0
+        for id_bytes, status in changes:
+            row = compacted._rows.get(id_bytes)
+            if row is None or compacted._status[row] == status:
+                continue
+            if compacted._status[row] == self._active_status:
+                compacted._active_rows[(compacted._canteen[row], compacted._day[row])].remove(row)
+            compacted._status[row] = status
+            if status == _DELETED:
+                del compacted._rows[id_bytes]
+                deleted += 1
+
+        for row in range(total, len(self._status)):
+            if self._status[row] == _DELETED:
+                continue
+            new_row = len(compacted._status)
+            compacted._ids += self._ids[row * _ID_BYTES:(row + 1) * _ID_BYTES]
+            for name in _COLUMNS:
+                getattr(compacted, name).append(getattr(self, name)[row])
+            compacted._rows[compacted._id_bytes(new_row)] = new_row
+            compacted._index(new_row)
+
+        for name in ("_ids", "_rows") + _COLUMNS + _INDEXES:
+            setattr(self, name, getattr(compacted, name))
+        self._deleted = deleted
@@ -0,0 +1,161 @@
+import fcntl
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+from datetime import date
+from multiprocessing import resource_tracker, shared_memory
+from typing import Iterable, List, Optional, Tuple
+from src.repository.occupancy import BUCKETS_PER_DAY, DayOccupancy
+
+_MAGIC = b"CNTOCC01"
+# magic, broj setova, epoha baze iz koje su brojaci
+_HEADER = struct.Struct("<8sQ16s")
+# kljuc (menza x dan), verzija dana u bazi, brojaci i long_starts iz DayOccupancy
+_ENTRY = struct.Struct(f"<16sq{BUCKETS_PER_DAY}i{BUCKETS_PER_DAY}i")
+_WAYS = 4
+_LOCK_STRIPES = 64
+_EMPTY_KEY = bytes(16)
+
+
+def _entry_key(canteen_id: str, reservation_date: date) -> bytes:
+    return hashlib.blake2b(f"{canteen_id}|{reservation_date.isoformat()}".encode(), digest_size=16).digest()
+
+
+class SharedOccupancy:
+    # Zauzetost (menza x dan) u multiprocessing.shared_memory segmentu koji dele svi worker procesi
+    # na masini. Tabela je skup setova od po _WAYS unosa; set se bira hesom kljuca, a zakljucava
+    # jednom od _LOCK_STRIPES brava (threading.Lock unutar procesa + fcntl brava na bajtu lock
+    # fajla izmedju procesa). Svaki unos nosi verziju dana iz SQLite baze: unos cija se verzija
+    # ne poklapa sa bazom je zastareo i ponovo se racuna iz baze, pa je segment samo kes.
+    def __init__(self, name: str, entries: int, epoch: bytes):
+        self.name = name
+        self.sets = max(1, entries // _WAYS)
+        size = _HEADER.size + self.sets * _WAYS * _ENTRY.size
+        self._thread_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+        self._lock_file = open(os.path.join(tempfile.gettempdir(), f"{name}.lock"), "a+b")
+
+        # Bajt 0 lock fajla stiti pravljenje segmenta, a bajtovi 1..N su brave setova
+        with self._file_lock(0):
+            try:
+                self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                self._shm = shared_memory.SharedMemory(name=name)
+            # Segment nadzivljava workere (resource_tracker bi ga obrisao dok ga drugi jos koriste);
+            # unosi se ionako proveravaju prema bazi, pa posle restarta sluzi kao vec popunjen kes
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+            magic, sets, stored_epoch = _HEADER.unpack_from(self._shm.buf, 0)
+            if magic == _MAGIC and sets != self.sets:
+                raise ValueError(f"Deljeni segment '{name}' ima {sets * _WAYS} unosa, a ocekivano je {self.sets * _WAYS}.")
+            if magic != _MAGIC or stored_epoch != epoch:
+                # Nov segment, ili segment ostao od druge baze: brojaci ne vaze
+                self._shm.buf[_HEADER.size:size] = bytes(size - _HEADER.size)
+                _HEADER.pack_into(self._shm.buf, 0, _MAGIC, self.sets, epoch)
+
+    def get(self, canteen_id: str, reservation_date: date, version: int) -> Optional[DayOccupancy]:
+        key = _entry_key(canteen_id, reservation_date)
+        with self._locked(key) as offsets:
+            for offset in offsets:
+                values = _ENTRY.unpack_from(self._shm.buf, offset)
+                if values[0] == key:
+                    if values[1] != version:
+                        return None
+                    occupancy = DayOccupancy()
+                    occupancy.counts = list(values[2:2 + BUCKETS_PER_DAY])
+                    occupancy.long_starts = list(values[2 + BUCKETS_PER_DAY:])
+                    return occupancy
+        return None
+
+    def put(self, canteen_id: str, reservation_date: date, version: int, occupancy: DayOccupancy) -> None:
+        # Upisuje zauzetost procitanu iz baze, osim ako set vec ima noviju verziju tog dana
+        key = _entry_key(canteen_id, reservation_date)
+        with self._locked(key) as offsets:
+            target = self._find(key, offsets)
+            if target is None:
+                target = self._victim(key, offsets)
+            elif struct.unpack_from("<q", self._shm.buf, target + 16)[0] >= version:
+                return
+            _ENTRY.pack_into(self._shm.buf, target, key, version, *occupancy.counts, *occupancy.long_starts)
+
+    def apply(self, canteen_id: str, reservation_date: date, version: int, changes: Iterable[Tuple]) -> None:
+        # Izmena posle commit-a: brojaci se azuriraju samo ako unos odgovara verziji pre izmene
+        # (version - 1); inace je unos zastareo ili vec ponovo procitan i ostaje kakav jeste
+        key = _entry_key(canteen_id, reservation_date)
+        with self._locked(key) as offsets:
+            target = self._find(key, offsets)
+            if target is None:
+                return
+            values = _ENTRY.unpack_from(self._shm.buf, target)
+            if values[1] != version - 1:
+                return
+            occupancy = DayOccupancy()
+            occupancy.counts = list(values[2:2 + BUCKETS_PER_DAY])
+            occupancy.long_starts = list(values[2 + BUCKETS_PER_DAY:])
+            for start, duration, delta in changes:
+                occupancy.add(start, duration, delta)
+            _ENTRY.pack_into(self._shm.buf, target, key, version, *occupancy.counts, *occupancy.long_starts)
+
+    def close(self) -> None:
+        self._shm.close()
+        self._lock_file.close()
+
+    def _find(self, key: bytes, offsets: List[int]) -> Optional[int]:
+        for offset in offsets:
+            if self._shm.buf[offset:offset + 16] == key:
+                return offset
+        return None
+
+    def _victim(self, key: bytes, offsets: List[int]) -> int:
+        # Prazan unos ako postoji, inace unos izabran hesom kljuca (kes, pa je izbacivanje bezbedno)
+        for offset in offsets:
+            if self._shm.buf[offset:offset + 16] == _EMPTY_KEY:
+                return offset
+        return offsets[key[8] % _WAYS]
+
+    def _locked(self, key: bytes):
+        index = int.from_bytes(key[:8], "little") % self.sets
+        first = _HEADER.size + index * _WAYS * _ENTRY.size
+        return _SetLock(self, index % _LOCK_STRIPES, [first + way * _ENTRY.size for way in range(_WAYS)])
+
+    def _file_lock(self, byte: int):
+        return _FileLock(self._lock_file, byte)
+
+
+class _FileLock:
+    __slots__ = ("file", "byte")
+
+    def __init__(self, file, byte: int):
+        self.file = file
+        self.byte = byte
+
+    def __enter__(self):
+        fcntl.lockf(self.file, fcntl.LOCK_EX, 1, self.byte)
+
+    def __exit__(self, *exc_info):
+        fcntl.lockf(self.file, fcntl.LOCK_UN, 1, self.byte)
+
+
+class _SetLock:
+    # fcntl brave pripadaju procesu, pa niti istog procesa prvo prolaze kroz threading.Lock
+    __slots__ = ("owner", "stripe", "offsets")
+
+    def __init__(self, owner: SharedOccupancy, stripe: int, offsets: List[int]):
+        self.owner = owner
+        self.stripe = stripe
+        self.offsets = offsets
+
+    def __enter__(self) -> List[int]:
+        self.owner._thread_locks[self.stripe].acquire()
+        try:
+            fcntl.lockf(self.owner._lock_file, fcntl.LOCK_EX, 1, self.stripe + 1)
+        except BaseException:
+            self.owner._thread_locks[self.stripe].release()
+            raise
+        return self.offsets
+
+    def __exit__(self, *exc_info):
+        try:
+            fcntl.lockf(self.owner._lock_file, fcntl.LOCK_UN, 1, self.stripe + 1)
+        finally:
+            self.owner._thread_locks[self.stripe].release()
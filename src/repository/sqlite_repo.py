@@ -0,0 +1,385 @@
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import date, time
+from typing import Dict, Iterable, List, Optional, Tuple
+from src.domain.models import Student, Canteen, Reservation, WorkingHour
+from src.domain.working_hours import WorkingHoursTable
+from src.repository.occupancy import DayOccupancy
+from src.metrics import instrument_repository, REPOSITORY_ROWS_SCANNED
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    isAdmin INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS canteens (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    location TEXT NOT NULL,
+    capacity INTEGER NOT NULL,
+    workingHours TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reservations (
+    id TEXT PRIMARY KEY,
+    studentId TEXT NOT NULL,
+    canteenId TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    duration INTEGER NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reservations_canteen_date_status ON reservations (canteenId, date, status);
+CREATE INDEX IF NOT EXISTS idx_reservations_student ON reservations (studentId);
+CREATE TABLE IF NOT EXISTS versions (
+    key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pending_cascades (
+    canteenId TEXT PRIMARY KEY
+) WITHOUT ROWID;
+"""
+
+_STUDENT_COLUMNS = "id, name, email, isAdmin"
+_CANTEEN_COLUMNS = "id, name, location, capacity, workingHours"
+_RESERVATION_COLUMNS = "id, studentId, canteenId, date, time, duration, status"
+_EPOCH_KEY = "epoch"
+# Koliko rezervacija po transakciji brise zavrsavanje prekinutog brisanja menze pri pokretanju
+_CASCADE_CHUNK_SIZE = 10_000
+
+
+@instrument_repository("sqlite")
+class SqliteRepository:
+    # Isti interfejs kao MemoryRepository, ali nad SQLite fajlom u WAL modu, tako da
+    # vise uvicorn worker procesa moze da deli iste podatke.
+    blocking_io = True
+
+    def __init__(self, path: str, shared_occupancy_entries: int = 0, shared_occupancy_name: Optional[str] = None):
+        self.path = path
+        self._local = threading.local()
+        # Tabele radnog vremena po menzi; menzu moze da izmeni i drugi proces, pa se tabela
+        # koristi samo dok je radno vreme procitane menze jednako onom iz kog je napravljena
+        self._working_hours: Dict[str, WorkingHoursTable] = {}
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+        # Epoha se pravi jednom po bazi; po njoj deljeni segment prepoznaje brojace druge baze
+        conn.execute("INSERT OR IGNORE INTO versions (key, version) VALUES (?, ?)", (_EPOCH_KEY, secrets.randbits(63)))
+
+        # Opciono: zauzetost dana u deljenoj memoriji, zajednickoj za sve worker procese na masini
+        self._shared_occupancy = None
+        if shared_occupancy_entries > 0:
+            # fcntl postoji samo na POSIX sistemima, pa se modul ucitava tek kada je mod ukljucen
+            from src.repository.shared_occupancy import SharedOccupancy
+            epoch = self._get_version(_EPOCH_KEY).to_bytes(16, "little")
+            self._shared_occupancy = SharedOccupancy(shared_occupancy_name or _shared_occupancy_name(path), shared_occupancy_entries, epoch)
+
+        # Brisanje rezervacija obrisane menze koje je prekinuo pad procesa se zavrsava odmah
+        for (canteen_id,) in conn.execute("SELECT canteenId FROM pending_cascades").fetchall():
+            while self.delete_reservations_by_canteen_id(canteen_id, limit=_CASCADE_CHUNK_SIZE) == _CASCADE_CHUNK_SIZE:
+                pass
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE odmah uzima write lock baze, pa provera kapaciteta i upis
+        # rezervacije ostaju atomicni i izmedju razlicitih procesa.
+        conn = self._connection()
+        if conn.in_transaction:
+            yield conn
+            return
+
+        self._local.occupancy_changes = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+        # Deljena zauzetost se menja tek posle commit-a; ako proces padne izmedju, unos ostaje
+        # na staroj verziji i sledece citanje ga racuna iz baze
+        if self._shared_occupancy is not None:
+            for canteen_id, reservation_date, version, changes in self._local.occupancy_changes:
+                self._shared_occupancy.apply(canteen_id, reservation_date, version, changes)
+
+    def add_student(self, data: Student) -> Student:
+        new_id = str(uuid.uuid4())
+        new_student = data.model_copy(update={"id": new_id})
+        try:
+            with self.transaction() as conn:
+                conn.execute(f"INSERT INTO students ({_STUDENT_COLUMNS}) VALUES (?, ?, ?, ?)",
+                             (new_id, new_student.name, new_student.email, int(new_student.isAdmin)))
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Student sa ovim email-om {data.email} već postoji.")
+        return new_student
+
+    def add_students(self, data: List[Student]) -> List[Student]:
+        new_students = [student.model_copy(update={"id": str(uuid.uuid4())}) for student in data]
+        try:
+            with self.transaction() as conn:
+                conn.executemany(f"INSERT INTO students ({_STUDENT_COLUMNS}) VALUES (?, ?, ?, ?)",
+                                 [(s.id, s.name, s.email, int(s.isAdmin)) for s in new_students])
+        except sqlite3.IntegrityError:
+            raise ValueError("Student sa nekim od ovih email-ova već postoji.")
+        return new_students
+
+    def get_student_by_id(self, student_id: str) -> Optional[Student]:
+        row = self._connection().execute(f"SELECT {_STUDENT_COLUMNS} FROM students WHERE id = ?", (student_id,)).fetchone()
+        return _to_student(row) if row else None
+
+    def get_student_by_email(self, email: str) -> Optional[Student]:
+        row = self._connection().execute(f"SELECT {_STUDENT_COLUMNS} FROM students WHERE email = ?", (email,)).fetchone()
+        return _to_student(row) if row else None
+
+    def add_canteen(self, data: Canteen) -> Canteen:
+        new_id = str(uuid.uuid4())
+        new_canteen = data.model_copy(update={"id": new_id})
+        with self.transaction() as conn:
+            conn.execute(f"INSERT INTO canteens ({_CANTEEN_COLUMNS}) VALUES (?, ?, ?, ?, ?)", _canteen_row(new_canteen))
+        return new_canteen
+
+    def get_canteen_by_id(self, canteen_id: str) -> Optional[Canteen]:
+        row = self._connection().execute(f"SELECT {_CANTEEN_COLUMNS} FROM canteens WHERE id = ?", (canteen_id,)).fetchone()
+        return _to_canteen(row) if row else None
+
+    def get_all_canteens(self) -> List[Canteen]:
+        rows = self._connection().execute(f"SELECT {_CANTEEN_COLUMNS} FROM canteens ORDER BY rowid").fetchall()
+        return [_to_canteen(row) for row in rows]
+
+    def update_canteen(self, canteen_id: str, data: dict) -> Optional[Canteen]:
+        with self.transaction() as conn:
+            existing_canteen = self.get_canteen_by_id(canteen_id)
+            if not existing_canteen:
+                return None
+
+            update_canteen = existing_canteen.model_copy(update=data)
+            conn.execute("UPDATE canteens SET id = ?, name = ?, location = ?, capacity = ?, workingHours = ? WHERE id = ?",
+                         (*_canteen_row(update_canteen), canteen_id))
+            self._bump_version(conn, _canteen_version_key(canteen_id))
+        return update_canteen
+
+    def get_working_hours(self, canteen: Canteen) -> WorkingHoursTable:
+        table = self._working_hours.get(canteen.id)
+        if table is None or table.working_hours != canteen.workingHours:
+            table = self._working_hours[canteen.id] = WorkingHoursTable(canteen.workingHours)
+        return table
+
+    def delete_canteen(self, canteen_id: str) -> bool:
+        with self.transaction() as conn:
+            if conn.execute("DELETE FROM canteens WHERE id = ?", (canteen_id,)).rowcount == 0:
+                return False
+            # U istoj transakciji se belezi namera da se obrisu rezervacije menze; brise je
+            # delete_reservations_by_canteen_id kada obrise i poslednju
+            conn.execute("INSERT OR IGNORE INTO pending_cascades (canteenId) VALUES (?)", (canteen_id,))
+            self._working_hours.pop(canteen_id, None)
+            self._bump_version(conn, _canteen_version_key(canteen_id))
+            return True
+
+    def add_reservation(self, data: Reservation) -> Reservation:
+        new_id = str(uuid.uuid4())
+        new_reservation = data.model_copy(update={"id": new_id})
+        with self.transaction() as conn:
+            conn.execute(f"INSERT INTO reservations ({_RESERVATION_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         _reservation_row(new_reservation))
+            if new_reservation.status == "Active":
+                self._bump_day_version(conn, new_reservation.canteenId, new_reservation.date,
+                                       [(new_reservation.time, new_reservation.duration, 1)])
+        return new_reservation
+
+    def add_reservations(self, data: List[Reservation]) -> List[Reservation]:
+        new_reservations = [reservation.model_copy(update={"id": str(uuid.uuid4())}) for reservation in data]
+        if not new_reservations:
+            return new_reservations
+
+        with self.transaction() as conn:
+            conn.executemany(f"INSERT INTO reservations ({_RESERVATION_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             [_reservation_row(reservation) for reservation in new_reservations])
+            days: Dict[Tuple[str, date], List[Tuple]] = {}
+            for reservation in new_reservations:
+                if reservation.status == "Active":
+                    days.setdefault((reservation.canteenId, reservation.date), []).append((reservation.time, reservation.duration, 1))
+            for (canteen_id, reservation_date), changes in days.items():
+                self._bump_day_version(conn, canteen_id, reservation_date, changes)
+        return new_reservations
+
+    def get_reservation_by_id(self, reservation_id: str) -> Optional[Reservation]:
+        row = self._connection().execute(f"SELECT {_RESERVATION_COLUMNS} FROM reservations WHERE id = ?", (reservation_id,)).fetchone()
+        return _to_reservation(row) if row else None
+
+    def get_reservations_by_student_id(self, student_id: str, since: Optional[date] = None) -> List[Reservation]:
+        if since is None:
+            rows = self._connection().execute(f"SELECT {_RESERVATION_COLUMNS} FROM reservations WHERE studentId = ? ORDER BY rowid", (student_id,)).fetchall()
+        else:
+            rows = self._connection().execute(f"SELECT {_RESERVATION_COLUMNS} FROM reservations WHERE studentId = ? AND date >= ? ORDER BY rowid",
+                                              (student_id, since.isoformat())).fetchall()
+        REPOSITORY_ROWS_SCANNED.inc(("sqlite", "get_reservations_by_student_id"), len(rows))
+        return [_to_reservation(row) for row in rows]
+
+    def cancel_reservation(self, reservation_id: str) -> Reservation:
+        with self.transaction() as conn:
+            row = conn.execute("UPDATE reservations SET status = 'Cancelled' WHERE id = ? AND status = 'Active' RETURNING canteenId, date, time, duration",
+                               (reservation_id,)).fetchone()
+            if row:
+                self._bump_day_version(conn, row[0], date.fromisoformat(row[1]), [(time.fromisoformat(row[2]), row[3], -1)])
+            return self.get_reservation_by_id(reservation_id)
+
+    def get_active_reservations_by_canteen_and_date(self, canteen_id: str, reservation_date: date) -> List[Reservation]:
+        rows = self._connection().execute(
+            f"SELECT {_RESERVATION_COLUMNS} FROM reservations WHERE canteenId = ? AND date = ? AND status = 'Active' ORDER BY rowid",
+            (canteen_id, reservation_date.isoformat())).fetchall()
+        REPOSITORY_ROWS_SCANNED.inc(("sqlite", "get_active_reservations_by_canteen_and_date"), len(rows))
+        return [_to_reservation(row) for row in rows]
+
+    def get_active_dates(self, canteen_id: str, since: date) -> List[date]:
+        # Cita se samo indeks (canteenId, date, status)
+        rows = self._connection().execute(
+            "SELECT DISTINCT date FROM reservations WHERE canteenId = ? AND date >= ? AND status = 'Active' ORDER BY date",
+            (canteen_id, since.isoformat())).fetchall()
+        return [date.fromisoformat(row[0]) for row in rows]
+
+    def get_occupancy(self, canteen_id: str, reservation_date: date) -> DayOccupancy:
+        if self._shared_occupancy is None:
+            return self._scan_occupancy(canteen_id, reservation_date)
+
+        version = self.get_day_version(canteen_id, reservation_date)
+        occupancy = self._shared_occupancy.get(canteen_id, reservation_date, version)
+        if occupancy is not None:
+            return occupancy
+
+        # Verzija i redovi se citaju iz istog snimka baze, da upisana zauzetost odgovara verziji
+        with self._read_snapshot():
+            version = self.get_day_version(canteen_id, reservation_date)
+            occupancy = self._scan_occupancy(canteen_id, reservation_date)
+        self._shared_occupancy.put(canteen_id, reservation_date, version, occupancy)
+        return occupancy
+
+    def get_canteen_version(self, canteen_id: str) -> int:
+        return self._get_version(_canteen_version_key(canteen_id))
+
+    def get_day_version(self, canteen_id: str, reservation_date: date) -> int:
+        return self._get_version(_day_version_key(canteen_id, reservation_date))
+
+    def delete_reservations_by_canteen_id(self, canteen_id: str, limit: Optional[int] = None) -> int:
+        with self.transaction() as conn:
+            if limit is None:
+                count = conn.execute("DELETE FROM reservations WHERE canteenId = ?", (canteen_id,)).rowcount
+            else:
+                # Kratka transakcija po delu, da rezervacije drugih menzi ne cekaju na celo brisanje
+                count = conn.execute("DELETE FROM reservations WHERE rowid IN (SELECT rowid FROM reservations WHERE canteenId = ? LIMIT ?)",
+                                     (canteen_id, limit)).rowcount
+            if limit is None or count < limit:
+                conn.execute("DELETE FROM pending_cascades WHERE canteenId = ?", (canteen_id,))
+            self._bump_version(conn, _canteen_version_key(canteen_id))
+            # Verzije dana te menze rastu, pa kesirana zauzetost tih dana prestaje da vazi
+            conn.execute("UPDATE versions SET version = version + 1 WHERE key >= ? AND key < ?",
+                         (_day_version_key_prefix(canteen_id), _day_version_key_prefix(canteen_id) + "\uffff"))
+            return count
+
+    def clear_all(self):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM reservations")
+            conn.execute("DELETE FROM canteens")
+            conn.execute("DELETE FROM students")
+            conn.execute("DELETE FROM pending_cascades")
+            # Verzije se ne vracaju na nulu: druge worker procese i deljenu zauzetost stare
+            # verzije bi posle novih izmena pogresno smatrali vazecim
+            conn.execute("UPDATE versions SET version = version + 1 WHERE key != ?", (_EPOCH_KEY,))
+        self._working_hours.clear()
+
+    def close(self) -> None:
+        if self._shared_occupancy is not None:
+            self._shared_occupancy.close()
+
+    def _get_version(self, key: str) -> int:
+        row = self._connection().execute("SELECT version FROM versions WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _bump_version(self, conn: sqlite3.Connection, key: str) -> int:
+        return conn.execute("INSERT INTO versions (key, version) VALUES (?, 1) ON CONFLICT (key) DO UPDATE SET version = version + 1 RETURNING version",
+                            (key,)).fetchone()[0]
+
+    def _bump_day_version(self, conn: sqlite3.Connection, canteen_id: str, reservation_date: date, changes: Iterable[Tuple]):
+        # changes: (pocetak, trajanje, +1/-1) za deljenu zauzetost, primenjuju se posle commit-a
+        version = self._bump_version(conn, _day_version_key(canteen_id, reservation_date))
+        self._local.occupancy_changes.append((canteen_id, reservation_date, version, changes))
+
+    @contextmanager
+    def _read_snapshot(self):
+        conn = self._connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("COMMIT")
+
+    def _scan_occupancy(self, canteen_id: str, reservation_date: date) -> DayOccupancy:
+        occupancy = DayOccupancy()
+        rows = self._connection().execute(
+            "SELECT time, duration FROM reservations WHERE canteenId = ? AND date = ? AND status = 'Active'",
+            (canteen_id, reservation_date.isoformat())).fetchall()
+        for res_time, duration in rows:
+            occupancy.add(time.fromisoformat(res_time), duration)
+        REPOSITORY_ROWS_SCANNED.inc(("sqlite", "get_occupancy"), len(rows))
+        return occupancy
+
+
+def _canteen_version_key(canteen_id: str) -> str:
+    return f"canteen:{canteen_id}"
+
+
+def _day_version_key(canteen_id: str, reservation_date: date) -> str:
+    return f"{_day_version_key_prefix(canteen_id)}{reservation_date.isoformat()}"
+
+
+def _day_version_key_prefix(canteen_id: str) -> str:
+    return f"day:{canteen_id}:"
+
+
+def _shared_occupancy_name(path: str) -> str:
+    # Isti fajl baze -> isti segment, i kada ga workeri otvaraju preko razlicitih relativnih putanja
+    return "canteen-occupancy-" + hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+
+
+def _to_student(row) -> Student:
+    return Student(id=row[0], name=row[1], email=row[2], isAdmin=bool(row[3]))
+
+
+def _canteen_row(canteen: Canteen) -> tuple:
+    working_hours = json.dumps([h.model_dump(mode="json", by_alias=True) for h in canteen.workingHours])
+    return (canteen.id, canteen.name, canteen.location, canteen.capacity, working_hours)
+
+
+def _to_canteen(row) -> Canteen:
+    working_hours = [WorkingHour.model_validate(h) for h in json.loads(row[4])]
+    return Canteen(id=row[0], name=row[1], location=row[2], capacity=row[3], workingHours=working_hours)
+
+
+def _reservation_row(reservation: Reservation) -> tuple:
+    return (reservation.id, reservation.studentId, reservation.canteenId, reservation.date.isoformat(),
+            reservation.time.isoformat(), reservation.duration, reservation.status)
+
+
+def _to_reservation(row) -> Reservation:
+    # Podaci iz baze su vec validirani pri upisu
+    return Reservation.model_construct(id=row[0], studentId=row[1], canteenId=row[2], date=date.fromisoformat(row[3]),
+                                       time=time.fromisoformat(row[4]), duration=row[5], status=row[6])
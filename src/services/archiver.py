@@ -0,0 +1,20 @@
+import asyncio
+import logging
+from datetime import date
+
+import anyio
+
+logger = logging.getLogger(__name__)
+
+
+async def run_archiver(repo, interval: float):
+    # Pozadinski posao: jednom u interval sekundi prosle dane prebacuje u arhivu repozitorijuma.
+    # Izvrsava se u posebnoj niti, da prepisivanje ne zaustavi event loop.
+    while True:
+        try:
+            moved = await anyio.to_thread.run_sync(repo.archive_reservations_before, date.today())
+            if moved:
+                logger.info("Arhivirano %d rezervacija pre %s.", moved, date.today())
+        except Exception:
+            logger.exception("Arhiviranje rezervacija nije uspelo.")
+        await asyncio.sleep(interval)
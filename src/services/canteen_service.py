@@ -1,13 +1,39 @@
+import hashlib
+import heapq
+import time as timer
 from datetime import datetime, date, time, timedelta
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Tuple
 from src.services.student_service import StudentService
-from src.domain.models import Canteen, WorkingHour
+from src.domain.models import Canteen
+from src.domain.working_hours import WorkingHoursTable
 from src.repository.repo import MemoryRepository
+from src.repository.occupancy import BUCKET_MINUTES, BUCKETS_PER_DAY, bucket_of
+from src.services.capacity_engine import NumpyCapacityEngine
+from src.services.status_cache import SlotCache
+from src.services.events import CapacityEvents, CANTEEN_CHANGED, CANTEEN_DELETED
+from src.services.jobs import Job, JobQueue
+from src.metrics import timed, SERVICE_DURATION
+
+CAPACITY_ENGINES = ("python", "numpy")
+STREAM_CHUNK_DAYS = 7
+NEXT_AVAILABLE_DEFAULT_DAYS = 14
+NEXT_AVAILABLE_MAX_DAYS = 60
+NEXT_AVAILABLE_MAX_LIMIT = 100
 
 class CanteenService:
-    def __init__(self, repo: MemoryRepository):
+    def __init__(self, repo: MemoryRepository, capacity_engine: str = "python", status_cache_size: int = 0,
+                 events: Optional[CapacityEvents] = None, jobs: Optional[JobQueue] = None, cascade_chunk_size: int = 1000):
+        if capacity_engine not in CAPACITY_ENGINES:
+            raise ValueError(f"Nepoznat capacity engine '{capacity_engine}', dozvoljeno: {', '.join(CAPACITY_ENGINES)}.")
+
         self.repo = repo
         self.student_service = StudentService(repo)
+        self.capacity_engine = capacity_engine
+        self._numpy_engine = NumpyCapacityEngine(repo) if capacity_engine == "numpy" else None
+        self.status_cache = SlotCache(status_cache_size) if status_cache_size > 0 else None
+        self.events = events
+        self.jobs = jobs
+        self.cascade_chunk_size = cascade_chunk_size
 
     def _check_admin_rights(self, student_id: str):
         student = self.student_service.get_student(student_id)
@@ -34,25 +60,98 @@ class CanteenService:
         updated = self.repo.update_canteen(canteen_id, update_data)
         if not updated:
             raise ValueError(f"Canteen with ID {canteen_id} not found.")
+        if self.events is not None:
+            self.events.publish(canteen_id, {"type": CANTEEN_CHANGED})
         return updated
 
-    def delete_canteen(self, admin_id: str, canteen_id: str) -> None:
+    def preview_canteen_update(self, admin_id: str, canteen_id: str, update_data: dict) -> Dict:
+        # Izvestaj o uticaju izmene bez primene izmene (dry run)
+        self._check_admin_rights(admin_id)
+
+        updated = self.get_canteen_by_id(canteen_id).model_copy(update=update_data)
+        # Tabela za novo radno vreme se pravi samo za izvestaj, da ne zameni kesiranu tabelu menze
+        working_hours = WorkingHoursTable(updated.workingHours) if "workingHours" in update_data else None
+        return self.get_update_impact(updated, working_hours)
+
+    @timed(SERVICE_DURATION, "CanteenService", "get_update_impact")
+    def get_update_impact(self, canteen: Canteen, working_hours: Optional[WorkingHoursTable] = None) -> Dict:
+        # Aktivne rezervacije od danas nadalje koje sa datim kapacitetom i radnim vremenom menze
+        # prelaze kapacitet (polusatni interval sa vise rezervacija od kapaciteta) ili su van radnog
+        # vremena. Dani se biraju iz zauzetosti (brojaci po intervalu), a rezervacije se citaju
+        # samo za pogodjene dane, pa cena zavisi od pogodjenih rezervacija, a ne od svih.
+        table = working_hours or self.repo.get_working_hours(canteen)
+        # Termini rezervacija pocinju na pun sat ili pola sata i traju 30 ili 60 minuta, pa se iz
+        # brojaca tacno zna koliko rezervacija pocinje u intervalu i koliko traje dva intervala
+        closed_short = {b for b in range(BUCKETS_PER_DAY) if not table.is_open(_bucket_start(b), BUCKET_MINUTES)}
+        closed_long = {b for b in range(BUCKETS_PER_DAY) if not table.is_open(_bucket_start(b), 2 * BUCKET_MINUTES)}
+
+        days = []
+        affected_total = 0
+        for day in self.repo.get_active_dates(canteen.id, date.today()):
+            occupancy = self.repo.get_occupancy(canteen.id, day)
+            counts, long_starts = occupancy.counts, occupancy.long_starts
+            overbooked = [b for b in range(BUCKETS_PER_DAY) if counts[b] > canteen.capacity]
+            outside = any(counts[b] - (long_starts[b - 1] if b else 0) > 0 for b in closed_short) or \
+                any(long_starts[b] for b in closed_long)
+            if not overbooked and not outside:
+                continue
+
+            reservations = self.repo.get_active_reservations_by_canteen_and_date(canteen.id, day)
+            slot_ids: Dict[int, List[str]] = {b: [] for b in overbooked}
+            outside_ids = []
+            affected = set()
+            for reservation in reservations:
+                if not table.is_open(reservation.time, reservation.duration):
+                    outside_ids.append(reservation.id)
+                    affected.add(reservation.id)
+                first = bucket_of(reservation.time)
+                for b in range(first, min(first + -(-reservation.duration // BUCKET_MINUTES), BUCKETS_PER_DAY)):
+                    if b in slot_ids:
+                        slot_ids[b].append(reservation.id)
+                        affected.add(reservation.id)
+
+            affected_total += len(affected)
+            days.append({
+                "date": day.isoformat(),
+                "overbookedSlots": [{"startTime": _bucket_start(b).strftime("%H:%M"), "reserved": counts[b],
+                                     "capacity": canteen.capacity, "excess": counts[b] - canteen.capacity,
+                                     "reservationIds": slot_ids[b]} for b in overbooked],
+                "outsideWorkingHours": outside_ids,
+            })
+
+        return {"canteenId": canteen.id, "capacity": canteen.capacity, "affectedReservations": affected_total, "days": days}
+
+    @timed(SERVICE_DURATION, "CanteenService", "delete_canteen")
+    def delete_canteen(self, admin_id: str, canteen_id: str) -> Optional[Job]:
+        # Menza se brise odmah (nove rezervacije vise ne prolaze), a njene rezervacije u
+        # pozadinskom poslu ako je zadat red poslova; vraca taj posao. Trajni repozitorijumi uz
+        # brisanje menze beleze i brisanje njenih rezervacija, pa posao prekinut padom zavrsavaju sami
         self._check_admin_rights(admin_id)
 
         deleted = self.repo.delete_canteen(canteen_id)
         if not deleted:
             raise ValueError(f"Canteen with ID {canteen_id} not found.")
-        
-        self.repo.delete_reservations_by_canteen_id(canteen_id)
+        if self.events is not None:
+            self.events.publish(canteen_id, {"type": CANTEEN_DELETED})
+
+        if self.jobs is None:
+            self.repo.delete_reservations_by_canteen_id(canteen_id)
+            return None
+        return self.jobs.submit("delete_canteen_reservations", lambda job: self._delete_reservations_in_chunks(job, canteen_id))
 
+    def _delete_reservations_in_chunks(self, job: Job, canteen_id: str) -> Dict:
+        # Svaki korak drzi bravu skladista (ili SQLite transakciju) samo za cascade_chunk_size redova,
+        # a izmedju koraka nit pusta GIL, pa rezervacije ostalih menzi ne cekaju na celo brisanje
+        while True:
+            count = self.repo.delete_reservations_by_canteen_id(canteen_id, limit=self.cascade_chunk_size)
+            if count == 0:
+                return {"canteenId": canteen_id, "deletedReservations": job.processed}
+            job.processed += count
+            timer.sleep(0)
+
+    @timed(SERVICE_DURATION, "CanteenService", "get_capacity_status")
     def get_capacity_status(self, canteen_id: Optional[str], start_date: date, end_date: date, start_time: time, end_time: time, duration: int) -> List[Dict]:
-        # Validacija
-        if duration not in [30, 60]:
-            raise ValueError("Trajanje obroka mora biti 30 ili 60 minuta.")
-        if start_date > end_date:
-            raise ValueError("startDate ne može biti nakon endDate.")
-        if start_time >= end_time:
-            raise ValueError("startTime mora biti pre endTime.")
+        self._validate_status_query(start_date, end_date, start_time, end_time, duration)
         
         check_canteens = self._get_relevant_canteens(canteen_id)
         results = []
@@ -65,6 +164,97 @@ class CanteenService:
                                 "slots": canteen_slots})
         
         return results
+
+    def iter_capacity_status(self, canteen_id: Optional[str], start_date: date, end_date: date, start_time: time, end_time: time, duration: int) -> Iterator[Dict]:
+        # Validacija se radi odmah, a zapisi (menza x dan) se prave tek pri citanju
+        self._validate_status_query(start_date, end_date, start_time, end_time, duration)
+        return self._iter_capacity_status(canteen_id, start_date, end_date, start_time, end_time, duration)
+
+    def _iter_capacity_status(self, canteen_id: Optional[str], start_date: date, end_date: date, start_time: time, end_time: time, duration: int) -> Iterator[Dict]:
+        days = self._date_range(start_date, end_date)
+
+        for canteen in self._get_relevant_canteens(canteen_id):
+            for offset in range(0, len(days), STREAM_CHUNK_DAYS):
+                chunk = days[offset:offset + STREAM_CHUNK_DAYS]
+                for day, slots in zip(chunk, self._get_day_slots(canteen, chunk, start_time, end_time, duration)):
+                    if slots:
+                        yield {"canteenId": canteen.id, "date": day.isoformat(), "slots": slots}
+
+    @timed(SERVICE_DURATION, "CanteenService", "find_next_available")
+    def find_next_available(self, meal: str, duration: int, party_size: int, canteen_ids: Optional[List[str]], limit: int,
+                            start_date: Optional[date] = None, end_date: Optional[date] = None) -> List[Dict]:
+        start_date = start_date or date.today()
+        end_date = end_date or start_date + timedelta(days=NEXT_AVAILABLE_DEFAULT_DAYS - 1)
+        if duration not in [30, 60]:
+            raise ValueError("Trajanje obroka mora biti 30 ili 60 minuta.")
+        if party_size < 1:
+            raise ValueError("partySize mora biti najmanje 1.")
+        if not 1 <= limit <= NEXT_AVAILABLE_MAX_LIMIT:
+            raise ValueError(f"limit mora biti između 1 i {NEXT_AVAILABLE_MAX_LIMIT}.")
+        if start_date > end_date:
+            raise ValueError("startDate ne može biti nakon endDate.")
+        if (end_date - start_date).days >= NEXT_AVAILABLE_MAX_DAYS:
+            raise ValueError(f"Pretraga može obuhvatiti najviše {NEXT_AVAILABLE_MAX_DAYS} dana.")
+
+        if canteen_ids:
+            canteens = [self.get_canteen_by_id(canteen_id) for canteen_id in dict.fromkeys(canteen_ids)]
+        else:
+            canteens = self.repo.get_all_canteens()
+
+        # Svaka menza daje svoje slobodne termine hronoloski, a heap (heapq.merge) uvek uzima
+        # najraniji sledeci; zauzetost dana se cita tek kada pretraga stigne do njega, pa se
+        # staje cim se nadje limit termina, bez pravljenja svih termina opsega
+        earliest = start_date if start_date > date.today() else date.today()
+        not_before = datetime.now().time() if earliest == date.today() else time.min
+        days = self._date_range(earliest, end_date)
+        free_slots = heapq.merge(*(self._iter_free_slots(order, canteen, meal, duration, party_size, days, not_before)
+                                   for order, canteen in enumerate(canteens)))
+
+        results = []
+        for (day, slot_time, _), canteen, remaining in free_slots:
+            results.append({"canteenId": canteen.id, "date": day.isoformat(), "meal": meal,
+                            "startTime": slot_time.strftime("%H:%M"), "remainingCapacity": remaining})
+            if len(results) == limit:
+                break
+        return results
+
+    def _iter_free_slots(self, order: int, canteen: Canteen, meal: str, duration: int, party_size: int, days: List[date],
+                         not_before: time) -> Iterator[Tuple]:
+        slot_times = self.repo.get_working_hours(canteen).meal_slots(meal, duration)
+        if not slot_times or canteen.capacity < party_size:
+            return
+
+        for index, day in enumerate(days):
+            occupancy = self.repo.get_occupancy(canteen.id, day)
+            for slot_time in slot_times:
+                if index == 0 and slot_time < not_before:
+                    continue
+                remaining = canteen.capacity - occupancy.count_overlapping(slot_time, duration)
+                if remaining >= party_size:
+                    # order razresava isti termin u vise menzi, pa se Canteen objekti nikad ne porede
+                    yield (day, slot_time, order), canteen, remaining
+
+    def get_capacity_status_etag(self, canteen_id: Optional[str], start_date: date, end_date: date, start_time: time, end_time: time, duration: int) -> str:
+        # ETag zavisi samo od parametara upita i verzija menzi i dana, pa se za
+        # neizmenjen status racuna bez ponovnog pravljenja odgovora
+        self._validate_status_query(start_date, end_date, start_time, end_time, duration)
+
+        # Verzije se citaju pre racunanja odgovora, pa je odgovor uz ovaj ETag bar toliko nov;
+        # kes termina ne cuva rezultat izracunat iz menze starije od verzije u kljucu
+        digest = hashlib.sha1(f"{start_date}|{end_date}|{start_time}|{end_time}|{duration}".encode())
+        for canteen in self._get_relevant_canteens(canteen_id):
+            versions = [self.repo.get_day_version(canteen.id, day) for day in self._date_range(start_date, end_date)]
+            digest.update(f"|{canteen.id}:{self.repo.get_canteen_version(canteen.id)}:{versions}".encode())
+        return f'"{digest.hexdigest()}"'
+
+    def _validate_status_query(self, start_date: date, end_date: date, start_time: time, end_time: time, duration: int):
+        # Validacija
+        if duration not in [30, 60]:
+            raise ValueError("Trajanje obroka mora biti 30 ili 60 minuta.")
+        if start_date > end_date:
+            raise ValueError("startDate ne može biti nakon endDate.")
+        if start_time >= end_time:
+            raise ValueError("startTime mora biti pre endTime.")
     
     def _get_relevant_canteens(self, canteen_id: Optional[str]) -> List[Canteen]:
         if canteen_id:
@@ -72,39 +262,76 @@ class CanteenService:
             return [canteen] if canteen else []
         else:
             return self.repo.get_all_canteens()
+
+    def _date_range(self, start_date: date, end_date: date) -> List[date]:
+        return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
     
+    @timed(SERVICE_DURATION, "CanteenService", "calculate_canteen_slots")
     def _calculate_canteen_slots(self, canteen: Canteen, start_date: date, end_date: date, start_time: time, end_time: time, duration: int) -> List[Dict]:
-        slots = []
-        current_date = start_date
+        day_slots = self._get_day_slots(canteen, self._date_range(start_date, end_date), start_time, end_time, duration)
+        return [slot for slots in day_slots for slot in slots]
+
+    def _get_day_slots(self, canteen: Canteen, days: List[date], start_time: time, end_time: time, duration: int) -> List[List[Dict]]:
+        if self.status_cache is None:
+            day_slots = self._compute_day_slots(canteen, days, start_time, end_time, duration)
+        else:
+            # Verzije se citaju pre racunanja: ako se u medjuvremenu desi izmena, rezultat
+            # ostaje pod starom verzijom i vise se nikad ne pogadja
+            canteen_version = self.repo.get_canteen_version(canteen.id)
+            keys = [(canteen.id, canteen_version, day, self.repo.get_day_version(canteen.id, day), start_time, end_time, duration) for day in days]
+            day_slots = [self.status_cache.get(key) for key in keys]
 
-        while current_date <= end_date:
+            missing = [index for index, slots in enumerate(day_slots) if slots is None]
+            if missing:
+                computed = self._compute_day_slots(canteen, [days[index] for index in missing], start_time, end_time, duration)
+                # Menza je ucitana pre citanja njene verzije, pa izmena u tom razmaku daje termine
+                # po starom kapacitetu pod novom verzijom. Kesira se samo ako je menza procitana
+                # posle racunanja ista, a verzija se od prvog citanja nije pomerila.
+                current = self.repo.get_canteen_by_id(canteen.id)
+                cacheable = current == canteen and self.repo.get_canteen_version(canteen.id) == canteen_version
+                for index, slots in zip(missing, computed):
+                    day_slots[index] = slots
+                    if cacheable:
+                        self.status_cache.put(keys[index], slots)
 
-            active_reservations = self.repo.get_active_reservations_by_canteen_and_date(canteen.id, current_date)
+        return day_slots
 
-            for current_slot_time in self._generate_time_slots(start_time, end_time, duration):
+    @timed(SERVICE_DURATION, "CanteenService", "compute_day_slots")
+    def _compute_day_slots(self, canteen: Canteen, days: List[date], start_time: time, end_time: time, duration: int) -> List[List[Dict]]:
+        if self._numpy_engine is not None:
+            return self._calculate_day_slots_numpy(canteen, days, start_time, end_time, duration)
 
-                meal_info = self._get_meal_for_slot(canteen.workingHours, current_slot_time)
-                if not meal_info:
-                    continue
+        return [self._calculate_day_slots(canteen, current_date, start_time, end_time, duration) for current_date in days]
 
-                remaining_capacity = canteen.capacity
+    def _calculate_day_slots(self, canteen: Canteen, current_date: date, start_time: time, end_time: time, duration: int) -> List[Dict]:
+        slots = []
+        occupancy = self.repo.get_occupancy(canteen.id, current_date)
+        working_hours = self.repo.get_working_hours(canteen)
 
-                slot_start = datetime.combine(current_date, current_slot_time)
-                slot_end = slot_start + timedelta(minutes=duration)
-                    
-                for res in active_reservations:
-                    res_start = datetime.combine(current_date, res.time)
-                    res_end = res_start + timedelta(minutes=res.duration)
+        for current_slot_time in self._generate_time_slots(start_time, end_time, duration):
 
-                    if slot_start < res_end and slot_end > res_start:
-                        remaining_capacity -= 1
-                
-                slots.append({"date": current_date.isoformat(), "meal": meal_info['meal'], "startTime": current_slot_time.strftime("%H:%M"), "remainingCapacity": max(0, remaining_capacity)})
+            meal = working_hours.meal_for(current_slot_time)
+            if not meal:
+                continue
 
-            current_date += timedelta(days=1)
+            remaining_capacity = canteen.capacity - occupancy.count_overlapping(current_slot_time, duration)
+            
+            slots.append({"date": current_date.isoformat(), "meal": meal.meal, "startTime": current_slot_time.strftime("%H:%M"), "remainingCapacity": max(0, remaining_capacity)})
         
         return slots
         
+    def _calculate_day_slots_numpy(self, canteen: Canteen, days: List[date], start_time: time, end_time: time, duration: int) -> List[List[Dict]]:
+        slot_times = []
+        slot_meals = []
+        working_hours = self.repo.get_working_hours(canteen)
+        for current_slot_time in self._generate_time_slots(start_time, end_time, duration):
+            meal = working_hours.meal_for(current_slot_time)
+            if meal:
+                slot_times.append(current_slot_time)
+                slot_meals.append(meal.meal)
+
+        return self._numpy_engine.calculate_day_slots(canteen, days, slot_times, slot_meals, duration)
+        
     def _generate_time_slots(self, start: time, end: time, step_minutes: int):
         current = datetime.combine(date.min, start)
         end_dt = datetime.combine(date.min, end)
@@ -117,8 +344,7 @@ class CanteenService:
         
         return slots
 
-    def _get_meal_for_slot(self, working_hours: List[WorkingHour], slot_time: time) -> Optional[Dict]:
-        for h in working_hours:
-            if h.from_time <= slot_time < h.to_time:
-                return {"meal": h.meal, "from": h.from_time, "to": h.to_time}
-        return None
\ No newline at end of file
+
+def _bucket_start(bucket: int) -> time:
+    minute = bucket * BUCKET_MINUTES
+    return time(minute // 60, minute % 60)
@@ -0,0 +1,60 @@
+from datetime import date, time
+from typing import Dict, List
+
+try:
+    import numpy as np
+except ImportError:  # numpy je opciona zavisnost
+    np = None
+
+from src.domain.models import Canteen
+from src.repository.occupancy import BUCKETS_PER_DAY, BUCKET_MINUTES, time_offset_us
+
+_BUCKET_US = BUCKET_MINUTES * 60 * 1_000_000
+
+
+class NumpyCapacityEngine:
+    # Racuna preostali kapacitet za ceo opseg datuma odjednom: matrica dani x intervali
+    # se pravi iz brojaca zauzetosti, a broj rezervacija koje seku termin se dobija
+    # razlikom prefiksnih suma, za sve dane i sve termine u jednom koraku.
+
+    def __init__(self, repo):
+        if np is None:
+            raise RuntimeError("CAPACITY_ENGINE=numpy zahteva instaliran numpy paket.")
+        self.repo = repo
+
+    def calculate_day_slots(self, canteen: Canteen, days: List[date], slot_times: List[time], slot_meals: List[str], duration: int) -> List[List[Dict]]:
+        if not slot_times:
+            return [[] for _ in days]
+
+        counts = np.zeros((len(days), BUCKETS_PER_DAY + 1), dtype=np.int64)
+        long_starts = np.zeros((len(days), BUCKETS_PER_DAY + 1), dtype=np.int64)
+
+        for day_index, day in enumerate(days):
+            occupancy = self.repo.get_occupancy(canteen.id, day)
+            counts[day_index, 1:] = occupancy.counts
+            long_starts[day_index, 1:] = occupancy.long_starts
+
+        np.cumsum(counts, axis=1, out=counts)
+        np.cumsum(long_starts, axis=1, out=long_starts)
+
+        first, last, inside = self._slot_buckets(slot_times, duration)
+        overlapping = (counts[:, last + 1] - counts[:, first]) - (long_starts[:, last] - long_starts[:, first])
+        overlapping *= inside
+        remaining = np.maximum(0, canteen.capacity - overlapping).tolist()
+
+        start_times = [t.strftime("%H:%M") for t in slot_times]
+        day_slots = []
+        for day, day_remaining in zip(days, remaining):
+            day_iso = day.isoformat()
+            day_slots.append([{"date": day_iso, "meal": meal, "startTime": start_time, "remainingCapacity": capacity}
+                              for meal, start_time, capacity in zip(slot_meals, start_times, day_remaining)])
+        return day_slots
+
+    def _slot_buckets(self, slot_times: List[time], duration: int):
+        offsets = np.array([time_offset_us(t) for t in slot_times], dtype=np.int64)
+        first = offsets // _BUCKET_US
+        last = (offsets + duration * 60 * 1_000_000 - 1) // _BUCKET_US
+        inside = (first < BUCKETS_PER_DAY).astype(np.int64)
+        first = np.minimum(first, BUCKETS_PER_DAY - 1)
+        last = np.minimum(last, BUCKETS_PER_DAY - 1)
+        return first, last, inside
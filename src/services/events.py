@@ -0,0 +1,75 @@
+import asyncio
+import threading
+from typing import Dict, Optional, Set
+from src import config
+
+# Dogadjaji o izmeni kapaciteta jedne menze
+DAY_CHANGED = "day"
+CANTEEN_CHANGED = "canteen"
+CANTEEN_DELETED = "deleted"
+
+
+class Subscription:
+    # Ogranicen red dogadjaja jednog pretplatnika. Kada se red napuni (klijent ne stize da cita),
+    # pretplatnik se izbacuje: red se prazni, dobija None kao oznaku kraja i vise ne prima dogadjaje
+    __slots__ = ("canteen_id", "queue", "loop", "dropped")
+
+    def __init__(self, canteen_id: str, maxsize: int):
+        self.canteen_id = canteen_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.loop = asyncio.get_running_loop()
+        self.dropped = False
+
+    def _deliver(self, event: Dict):
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class CapacityEvents:
+    # Pub/sub unutar procesa: servisi objavljuju izmene posle upisa (i iz niti thread pool-a),
+    # a SSE tokovi su pretplaceni po menzi. Objava nikad ne ceka na pretplatnike; bez
+    # pretplatnika na menzu to je samo provera u recniku.
+    def __init__(self, queue_size: int = 64):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, canteen_id: str) -> Subscription:
+        subscription = Subscription(canteen_id, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(canteen_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.canteen_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.canteen_id]
+
+    def publish(self, canteen_id: str, event: Dict):
+        if canteen_id not in self._subscribers:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers.get(canteen_id, ()))
+
+        try:
+            current_loop: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+        except RuntimeError:
+            current_loop = None
+        for subscription in subscribers:
+            if subscription.loop is current_loop:
+                subscription._deliver(event)
+            elif not subscription.loop.is_closed():
+                subscription.loop.call_soon_threadsafe(subscription._deliver, event)
+
+
+capacity_events = CapacityEvents(config.SSE_QUEUE_SIZE)
@@ -0,0 +1,92 @@
+import threading
+import time as timer
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+from src import config
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyKeyInUse(Exception):
+    pass
+
+
+class IdempotencyKeyMismatch(Exception):
+    pass
+
+
+class _Entry:
+    # Zahtev u toku ima expires_at None; zavrsen zahtev cuva status i sadrzaj odgovora
+    __slots__ = ("request", "status_code", "content", "expires_at")
+
+    def __init__(self, request: Any):
+        self.request = request
+        self.status_code = 0
+        self.content: Any = None
+        self.expires_at: Optional[float] = None
+
+
+class IdempotencyCache:
+    # Ograniceni kes odgovora po Idempotency-Key zaglavlju. begin upisuje oznaku da je zahtev u
+    # toku, complete ga zamenjuje odgovorom koji vazi ttl sekundi, a ponovljeni zahtev sa istim
+    # kljucem dobija taj odgovor iz recnika, bez ponovne obrade. Unosi su poredjani po vremenu
+    # zavrsetka, pa isteklih ima samo na pocetku; preko max_entries ispadaju najstariji.
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key: Hashable, request: Any) -> Optional[Tuple[int, Any]]:
+        # Vraca sacuvan (status, sadrzaj) za vec obradjen zahtev, ili None kada pozivalac
+        # obradjuje zahtev i mora da pozove complete ili release
+        with self._lock:
+            now = timer.monotonic()
+            self._evict(now)
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= now:
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self._entries[key] = _Entry(request)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                return None
+            if entry.request != request:
+                raise IdempotencyKeyMismatch("Idempotency-Key je već iskorišćen za drugačiji zahtev.")
+            if entry.expires_at is None:
+                raise IdempotencyKeyInUse("Zahtev sa istim Idempotency-Key se još obrađuje.")
+            return entry.status_code, entry.content
+
+    def complete(self, key: Hashable, status_code: int, content: Any):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.status_code = status_code
+            entry.content = content
+            entry.expires_at = timer.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+
+    def release(self, key: Hashable):
+        # Zahtev nije obradjen do kraja (neocekivana greska), pa ponovni pokusaj ide ispocetka
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at is None:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self, now: float):
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.expires_at is None or entry.expires_at > now:
+                return
+            self._entries.popitem(last=False)
+
+
+idempotency_cache = IdempotencyCache(config.IDEMPOTENCY_CACHE_SIZE, config.IDEMPOTENCY_TTL_SECONDS) \
+    if config.IDEMPOTENCY_CACHE_SIZE > 0 else None
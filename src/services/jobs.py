@@ -0,0 +1,107 @@
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from src import config
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    # Stanje jednog pozadinskog posla; processed uvecava sam posao dok napreduje
+    def __init__(self, kind: str):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.status = QUEUED
+        self.processed = 0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "processed": self.processed,
+            "result": self.result,
+            "error": self.error,
+            "createdAt": self.created_at.isoformat(timespec="seconds"),
+            "startedAt": self.started_at.isoformat(timespec="seconds") if self.started_at else None,
+            "finishedAt": self.finished_at.isoformat(timespec="seconds") if self.finished_at else None,
+        }
+
+
+class JobQueue:
+    # Teske admin operacije (npr. kaskadno brisanje rezervacija menze) rade se u ogranicenom
+    # broju pozadinskih niti, a zahtev odmah dobija ID posla za pracenje preko GET /jobs/{id}.
+    # Broj poslova koji cekaju je ogranicen (JobQueueFull), a registar cuva najvise
+    # max_history zavrsenih poslova.
+    def __init__(self, workers: int = 2, max_pending: int = 100, max_history: int = 1000):
+        self.max_pending = max_pending
+        self.max_history = max_history
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pending = 0
+
+    def submit(self, kind: str, work: Callable[[Job], Any]) -> Job:
+        # work dobija Job (za napredak), a njegova povratna vrednost postaje result
+        job = Job(kind)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull("Previše poslova čeka na izvršavanje, pokušajte kasnije.")
+            self._pending += 1
+            self._jobs[job.id] = job
+            self._trim()
+        self._executor.submit(self._run, job, work)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self):
+        # Poslovi koji su vec primljeni se zavrsavaju pre gasenja (i pre zatvaranja repozitorijuma)
+        self._executor.shutdown(wait=True)
+
+    def _run(self, job: Job, work: Callable[[Job], Any]):
+        job.status = RUNNING
+        job.started_at = datetime.now()
+        try:
+            job.result = work(job)
+            job.status = SUCCEEDED
+        except Exception as e:
+            logger.exception("Posao %s (%s) nije uspeo", job.id, job.kind)
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = datetime.now()
+            with self._lock:
+                self._pending -= 1
+                self._trim()
+
+    def _trim(self):
+        # Izbacuju se najstariji zavrseni poslovi; poslovi koji cekaju ili rade ostaju
+        finished = len(self._jobs) - self._pending
+        if finished <= self.max_history:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.status in (SUCCEEDED, FAILED)][:finished - self.max_history]:
+            del self._jobs[job_id]
+
+
+job_queue = JobQueue(config.JOB_WORKERS, config.JOB_QUEUE_SIZE)
@@ -0,0 +1,25 @@
+import threading
+from contextlib import contextmanager
+from typing import Hashable
+
+
+class StripedLock:
+    # Fiksan broj brava; kljuc se preslikava na jednu od njih, pa operacije nad
+    # razlicitim kljucevima (menza/dan, student) uglavnom idu paralelno.
+    def __init__(self, stripes: int = 256):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def _index(self, key: Hashable) -> int:
+        return hash(key) % len(self._locks)
+
+    @contextmanager
+    def hold(self, *keys: Hashable):
+        # Brave se uvek zakljucavaju rastucim redom indeksa da ne bi doslo do deadlock-a
+        indexes = sorted({self._index(key) for key in keys})
+        for index in indexes:
+            self._locks[index].acquire()
+        try:
+            yield
+        finally:
+            for index in reversed(indexes):
+                self._locks[index].release()
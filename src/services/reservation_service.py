@@ -1,13 +1,35 @@
 from datetime import datetime, date, time, timedelta
+from typing import Dict, Iterable, List, Optional
 from src.domain.models import Reservation, Canteen
 from src.dto.reservation_dto import CreateReservationDTO
 from src.repository.repo import MemoryRepository
+from src.repository.occupancy import DayOccupancy
+from src.services.locks import StripedLock
+from src.services.events import CapacityEvents, DAY_CHANGED
+from src.metrics import timed, SERVICE_DURATION
+
+MAX_BATCH_SIZE = 500
 
 class ReservationService:
-    def __init__(self, repo: MemoryRepository):
+    def __init__(self, repo: MemoryRepository, locks: Optional[StripedLock] = None, events: Optional[CapacityEvents] = None):
         self.repo = repo
+        self.locks = locks or StripedLock()
+        self.events = events
+
+    def _publish_day(self, canteen_id: str, reservation_date: date):
+        # Objavljuje se posle upisa, van brava, da pretplatnici nikad ne usporavaju rezervacije
+        if self.events is not None:
+            self.events.publish(canteen_id, {"type": DAY_CHANGED, "date": reservation_date})
+
+    def _booking_locks(self, canteen_id: str, reservation_date: date, student_id: str):
+        return self.locks.hold(("canteen", canteen_id, reservation_date), ("student", student_id))
         
-    def _validate_reservation_payload(self, payload: CreateReservationDTO):
+    def _validate_reservation_payload(self, payload: CreateReservationDTO, students: Optional[Dict] = None, canteens: Optional[Dict] = None):
+        # students/canteens su opcioni memo recnici, da grupna rezervacija svakog
+        # studenta i svaku menzu cita iz repozitorijuma samo jednom
+        students = {} if students is None else students
+        canteens = {} if canteens is None else canteens
+
         if payload.date < date.today():
             raise ValueError("Nije dozvoljeno kreirati rezervaciju za dane u prošlosti.")
             
@@ -15,21 +37,32 @@ class ReservationService:
             raise ValueError("Trajanje rezervacije mora biti 30 ili 60 minuta.")
             
         reservation_time = payload.time
-        if reservation_time.minute not in [0, 30]:
+        if reservation_time.minute not in [0, 30] or reservation_time.second or reservation_time.microsecond:
             raise ValueError("Termin mora krenuti na pun sat ili na pola sata (primer 15:00 ili 15:30).")
             
-        if not self.repo.get_student_by_id(payload.studentId):
+        if payload.studentId not in students:
+            students[payload.studentId] = self.repo.get_student_by_id(payload.studentId)
+        if not students[payload.studentId]:
             raise ValueError(f"Student sa ID-jem '{payload.studentId}' nije pronađen.")
             
-        canteen = self.repo.get_canteen_by_id(payload.canteenId)
+        if payload.canteenId not in canteens:
+            canteens[payload.canteenId] = self.repo.get_canteen_by_id(payload.canteenId)
+        canteen = canteens[payload.canteenId]
         if not canteen:
             raise ValueError(f"Menza sa ID-jem '{payload.canteenId}' nije pronađena.")
 
         return reservation_time, canteen
 
+    @timed(SERVICE_DURATION, "ReservationService", "check_student_overlap")
     def _check_student_overlap(self, student_id: str, requested_start: datetime, requested_end: datetime):
-        student_reservations = self.repo.get_reservations_by_student_id(student_id)
-        
+        self._check_overlap_with(self.repo.get_reservations_by_student_id(student_id, since=self._overlap_since(requested_start)), requested_start, requested_end)
+
+    def _overlap_since(self, requested_start: datetime) -> date:
+        # Termin od 60 minuta moze da predje u sledeci dan, pa se gleda i prethodni dan;
+        # starije rezervacije (i arhiva) ne mogu da se preklope
+        return requested_start.date() - timedelta(days=1)
+
+    def _check_overlap_with(self, student_reservations: Iterable[Reservation], requested_start: datetime, requested_end: datetime):
         for res in student_reservations:
             if res.status != "Active":
                 continue
@@ -41,31 +74,14 @@ class ReservationService:
                 raise ValueError(f"Student već ima aktivnu rezervaciju koja se preklapa u terminu {res.date} {res.time.strftime('%H:%M')}.")
 
 
-    def _check_capacity(self, canteen: Canteen, date: date, start_time: time, duration: int):
-        slot_start = datetime.combine(date, start_time)
-        slot_end = slot_start + timedelta(minutes=duration)
-        
-        is_open = False
-        for h in canteen.workingHours:
-            meal_start = datetime.combine(date, h.from_time)
-            meal_end = datetime.combine(date, h.to_time)
-            
-            if meal_start <= slot_start and slot_end <= meal_end:
-                 is_open = True
-                 break
-        
-        if not is_open:
+    @timed(SERVICE_DURATION, "ReservationService", "check_capacity")
+    def _check_capacity(self, canteen: Canteen, date: date, start_time: time, duration: int, occupancy: Optional[DayOccupancy] = None):
+        if not self.repo.get_working_hours(canteen).is_open(start_time, duration):
             raise ValueError("Menza nije otvorena u traženom terminu.")
 
-        active_reservations = self.repo.get_active_reservations_by_canteen_and_date(canteen.id, date)
-        
-        current_reservations_in_slot = 0
-        for res in active_reservations:
-            res_start = datetime.combine(res.date, res.time )
-            res_end = res_start + timedelta(minutes=res.duration)
-            
-            if slot_start < res_end and slot_end > res_start:
-                current_reservations_in_slot += 1
+        if occupancy is None:
+            occupancy = self.repo.get_occupancy(canteen.id, date)
+        current_reservations_in_slot = occupancy.count_overlapping(start_time, duration)
                 
         remaining_capacity = canteen.capacity - current_reservations_in_slot
         
@@ -73,26 +89,108 @@ class ReservationService:
             raise ValueError(f"Kapacitet za menzu '{canteen.name}' je pun u terminu {start_time.strftime('%H:%M')} na dan {date}.")
 
 
+    @timed(SERVICE_DURATION, "ReservationService", "create_reservation")
     def create_reservation(self, payload: CreateReservationDTO) -> Reservation:
         reservation_time, canteen = self._validate_reservation_payload(payload)
         
         requested_start = datetime.combine(payload.date, reservation_time)
         requested_end = requested_start + timedelta(minutes=payload.duration)
 
-        self._check_student_overlap(payload.studentId, requested_start, requested_end)
-        self._check_capacity(canteen, payload.date, reservation_time, payload.duration)
-        
-        new_reservation = Reservation(
-            studentId=payload.studentId,
-            canteenId=payload.canteenId,
-            date=payload.date,
-            time=reservation_time,
-            duration=payload.duration
-        )
-        
-        return self.repo.add_reservation(new_reservation)
+        with self._booking_locks(payload.canteenId, payload.date, payload.studentId), self.repo.transaction():
+            self._check_student_overlap(payload.studentId, requested_start, requested_end)
+            self._check_capacity(canteen, payload.date, reservation_time, payload.duration)
+            
+            new_reservation = Reservation(
+                studentId=payload.studentId,
+                canteenId=payload.canteenId,
+                date=payload.date,
+                time=reservation_time,
+                duration=payload.duration
+            )
+            
+            created = self.repo.add_reservation(new_reservation)
+
+        self._publish_day(created.canteenId, created.date)
+        return created
+
 
+    @timed(SERVICE_DURATION, "ReservationService", "create_reservations")
+    def create_reservations(self, payloads: List[CreateReservationDTO], atomic: bool = False) -> Dict:
+        if len(payloads) > MAX_BATCH_SIZE:
+            raise ValueError(f"Grupna rezervacija može imati najviše {MAX_BATCH_SIZE} stavki.")
 
+        results: List[Optional[Dict]] = [None] * len(payloads)
+        students: Dict = {}
+        canteens: Dict = {}
+        valid = []
+
+        for index, payload in enumerate(payloads):
+            try:
+                reservation_time, canteen = self._validate_reservation_payload(payload, students, canteens)
+                valid.append((index, payload, reservation_time, canteen))
+            except ValueError as e:
+                results[index] = {"index": index, "status": "failed", "reservation": None, "error": str(e)}
+
+        lock_keys = set()
+        first_dates: Dict[str, date] = {}
+        for _, payload, _, _ in valid:
+            lock_keys.add(("canteen", payload.canteenId, payload.date))
+            lock_keys.add(("student", payload.studentId))
+            first_dates[payload.studentId] = min(payload.date, first_dates.get(payload.studentId, payload.date))
+
+        with self.locks.hold(*lock_keys), self.repo.transaction():
+            # Zauzetost svakog dana menze i rezervacije svakog studenta se citaju jednom,
+            # a prihvacene stavke se upisuju u lokalne kopije pre provere sledecih
+            occupancies: Dict = {}
+            student_reservations: Dict = {}
+            accepted = []
+
+            for index, payload, reservation_time, canteen in valid:
+                day_key = (payload.canteenId, payload.date)
+                if day_key not in occupancies:
+                    occupancies[day_key] = self.repo.get_occupancy(payload.canteenId, payload.date).copy()
+                if payload.studentId not in student_reservations:
+                    since = self._overlap_since(datetime.combine(first_dates[payload.studentId], time.min))
+                    student_reservations[payload.studentId] = [
+                        res for res in self.repo.get_reservations_by_student_id(payload.studentId, since=since) if res.status == "Active"
+                    ]
+
+                requested_start = datetime.combine(payload.date, reservation_time)
+                requested_end = requested_start + timedelta(minutes=payload.duration)
+                try:
+                    self._check_overlap_with(student_reservations[payload.studentId], requested_start, requested_end)
+                    self._check_capacity(canteen, payload.date, reservation_time, payload.duration, occupancies[day_key])
+                except ValueError as e:
+                    results[index] = {"index": index, "status": "failed", "reservation": None, "error": str(e)}
+                    continue
+
+                new_reservation = Reservation(
+                    studentId=payload.studentId,
+                    canteenId=payload.canteenId,
+                    date=payload.date,
+                    time=reservation_time,
+                    duration=payload.duration
+                )
+                occupancies[day_key].add(reservation_time, payload.duration)
+                student_reservations[payload.studentId].append(new_reservation)
+                accepted.append((index, new_reservation))
+
+            if atomic and len(accepted) < len(payloads):
+                for index, _ in accepted:
+                    results[index] = {"index": index, "status": "rejected", "reservation": None, "error": "Grupna rezervacija je odbačena jer neke stavke nisu validne."}
+                accepted = []
+
+            created = self.repo.add_reservations([reservation for _, reservation in accepted])
+
+        for (index, _), reservation in zip(accepted, created):
+            results[index] = {"index": index, "status": "created", "reservation": reservation, "error": None}
+        for canteen_id, reservation_date in dict.fromkeys((reservation.canteenId, reservation.date) for reservation in created):
+            self._publish_day(canteen_id, reservation_date)
+
+        return {"created": len(created), "failed": len(payloads) - len(created), "results": results}
+
+
+    @timed(SERVICE_DURATION, "ReservationService", "cancel_reservation")
     def cancel_reservation(self, reservation_id: str, student_id: str) -> Reservation:
         reservation = self.repo.get_reservation_by_id(reservation_id)
         
@@ -101,9 +199,17 @@ class ReservationService:
 
         if reservation.studentId != student_id:
             raise PermissionError("Nije dozvoljeno otkazivanje tuđe rezervacije.")
-            
-        if reservation.status == "Cancelled":
-            raise ValueError("Rezervacija je već otkazana.")
-            
-        updated_reservation = self.repo.cancel_reservation(reservation_id)
+
+        with self._booking_locks(reservation.canteenId, reservation.date, reservation.studentId), self.repo.transaction():
+            # Ponovno citanje pod bravom, da dva istovremena otkazivanja ne prodju oba
+            reservation = self.repo.get_reservation_by_id(reservation_id)
+            if not reservation:
+                raise ValueError(f"Rezervacija sa ID-om '{reservation_id}' nije pronađena.")
+
+            if reservation.status == "Cancelled":
+                raise ValueError("Rezervacija je već otkazana.")
+                
+            updated_reservation = self.repo.cancel_reservation(reservation_id)
+
+        self._publish_day(updated_reservation.canteenId, updated_reservation.date)
         return updated_reservation
\ No newline at end of file
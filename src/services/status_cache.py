@@ -0,0 +1,31 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Dict, Optional
+
+
+class SlotCache:
+    # Ograniceni LRU kes izracunatih termina po menzi i danu. Kljuc sadrzi verzije
+    # menze i dana iz repozitorijuma, pa izmena samo pomeri verziju, a stari unosi
+    # ispadnu iz kesa kao najdavnije korisceni.
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, List[Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[List[Dict]]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: List[Dict]):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -1,7 +1,10 @@
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from pydantic import ValidationError
 from src.domain.models import Student
 from src.repository.repo import MemoryRepository
 
+MAX_IMPORT_ERRORS = 1000
+
 class CreateStudentDTO(Student):
     id: Optional[str] = None
 
@@ -20,4 +23,50 @@ class StudentService:
         student = self.repo.get_student_by_id(student_id)
         if not student:
             raise ValueError(f"Student sa ID-om '{student_id}' nije pronađen.")
-        return student
\ No newline at end of file
+        return student
+
+class StudentImport:
+    # Stanje jednog masovnog uvoza: redovi stizu u delovima, email-ovi se proveravaju
+    # kroz skup i indeks repozitorijuma, a svaki deo se upisuje jednim pozivom.
+    def __init__(self, repo: MemoryRepository):
+        self.repo = repo
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Dict] = []
+        self._seen_emails: Set[str] = set()
+
+    def add_error(self, row: int, error: str):
+        self.failed += 1
+        if len(self.errors) < MAX_IMPORT_ERRORS:
+            self.errors.append({"row": row, "error": error})
+
+    def add_chunk(self, rows: Iterable[Tuple[int, Dict]]):
+        valid: List[Tuple[int, Student]] = []
+        for row, data in rows:
+            try:
+                student = CreateStudentDTO.model_validate(data)
+            except ValidationError as e:
+                first = e.errors()[0]
+                self.add_error(row, f"{'.'.join(str(part) for part in first['loc'])}: {first['msg']}")
+                continue
+
+            if student.email in self._seen_emails or self.repo.get_student_by_email(student.email):
+                self.add_error(row, f"Student sa emailom '{student.email}' već postoji.")
+                continue
+
+            self._seen_emails.add(student.email)
+            valid.append((row, student))
+
+        try:
+            self.imported += len(self.repo.add_students([student for _, student in valid]))
+        except ValueError:
+            # Neko je u medjuvremenu dodao isti email; deo se upisuje red po red
+            for row, student in valid:
+                try:
+                    self.repo.add_student(student)
+                    self.imported += 1
+                except ValueError as e:
+                    self.add_error(row, str(e))
+
+    def report(self) -> Dict:
+        return {"imported": self.imported, "failed": self.failed, "errors": self.errors}
@@ -0,0 +1,45 @@
+import threading
+import anyio
+from src.repository.async_repo import AsyncRepositoryAdapter, INLINE_ITERATE_BATCH
+from src.repository.repo import MemoryRepository
+
+
+def test_memory_repository_runs_inline_and_offloads_heavy_work():
+    """
+    Kratki pozivi nad memorijskim repozitorijumom idu na event loop-u, a offload u thread pool
+    """
+    adapter = AsyncRepositoryAdapter(MemoryRepository())
+    loop_thread = threading.get_ident()
+
+    async def main():
+        inline = await adapter.run(threading.get_ident)
+        offloaded = await adapter.offload(threading.get_ident)
+        return inline, offloaded
+
+    inline, offloaded = anyio.run(main)
+    assert inline == loop_thread
+    assert offloaded != loop_thread
+
+
+def test_inline_iteration_yields_to_other_tasks():
+    """
+    Dug tok zapisa na event loop-u povremeno pusta druge zadatke
+    """
+    adapter = AsyncRepositoryAdapter(MemoryRepository())
+    progress = []
+
+    async def other():
+        progress.append("other")
+
+    async def main():
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(consume)
+            tg.start_soon(other)
+
+    async def consume():
+        async for item in adapter.iterate(iter(range(INLINE_ITERATE_BATCH * 4))):
+            progress.append(item)
+
+    anyio.run(main)
+    assert "other" in progress
+    assert progress.index("other") < INLINE_ITERATE_BATCH * 4
@@ -0,0 +1,28 @@
+from datetime import date, time
+from src.domain.models import Canteen, WorkingHour
+from src.repository.repo import MemoryRepository
+from src.services.canteen_service import CanteenService
+
+DAY = date(2030, 1, 7)
+
+
+def test_status_cache_skips_slots_computed_from_canteen_changed_meanwhile():
+    """
+    Termini izracunati iz menze ucitane pre izmene se vracaju, ali se ne kesiraju pod novom verzijom menze
+    """
+    repo = MemoryRepository()
+    service = CanteenService(repo, status_cache_size=64)
+    canteen = repo.add_canteen(Canteen(name="Menza", location="Novi Sad", capacity=10,
+                                       workingHours=[WorkingHour(meal="lunch", **{"from": time(11), "to": time(15)})]))
+    arguments = (canteen.id, DAY, DAY, time(12), time(13), 30)
+
+    # Menza je ucitana, a izmena stize pre nego sto se procita njena verzija
+    stale = repo.get_canteen_by_id(canteen.id)
+    repo.update_canteen(canteen.id, {"capacity": 20})
+    stale_slots = service._get_day_slots(stale, [DAY], time(12), time(13), 30)
+    assert {slot["remainingCapacity"] for slot in stale_slots[0]} == {10}
+
+    slots = service.get_capacity_status(*arguments)[0]["slots"]
+    assert {slot["remainingCapacity"] for slot in slots} == {20}
+    # Ispravan rezultat je sada u kesu i vraca se bez ponovnog racunanja
+    assert service.get_capacity_status(*arguments)[0]["slots"] == slots
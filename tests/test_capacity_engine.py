@@ -0,0 +1,44 @@
+import random
+from datetime import date, time, timedelta
+import pytest
+from src.domain.models import Canteen, Reservation, WorkingHour
+from src.repository.repo import MemoryRepository
+from src.services.canteen_service import CanteenService
+
+pytest.importorskip("numpy")
+
+FIRST_DAY = date(2030, 1, 7)
+
+
+def _hours(meal: str, start: time, end: time) -> WorkingHour:
+    return WorkingHour(meal=meal, **{"from": start, "to": end})
+
+
+def test_numpy_engine_matches_python_engine():
+    """
+    numpy engine daje iste termine i preostali kapacitet kao python engine, i kada je menza prepunjena
+    """
+    repo = MemoryRepository()
+    canteens = [repo.add_canteen(Canteen(name="Mala", location="Novi Sad", capacity=3,
+                                         workingHours=[_hours("breakfast", time(7), time(9, 45)), _hours("lunch", time(11, 15), time(15))])),
+                repo.add_canteen(Canteen(name="Velika", location="Novi Sad", capacity=40,
+                                         workingHours=[_hours("dinner", time(17), time(23, 59))]))]
+    generator = random.Random(7)
+    for _ in range(1500):
+        canteen = generator.choice(canteens)
+        # Pocetak na 15 minuta, pa rezervacija od 60 minuta moze da sece tri intervala, a neke idu i preko ponoci
+        start = time(generator.randrange(6, 24), generator.choice((0, 15, 30, 45)))
+        repo.add_reservation(Reservation(studentId=f"s{generator.randrange(300)}", canteenId=canteen.id,
+                                         date=FIRST_DAY + timedelta(days=generator.randrange(10)), time=start,
+                                         duration=generator.choice((30, 60))))
+
+    python_service = CanteenService(repo)
+    numpy_service = CanteenService(repo, capacity_engine="numpy")
+    remaining = []
+    for start_time, end_time in ((time(0), time(23, 59)), (time(7, 15), time(14, 45)), (time(22), time(23, 30))):
+        for duration in (30, 60):
+            arguments = (None, FIRST_DAY - timedelta(days=1), FIRST_DAY + timedelta(days=10), start_time, end_time, duration)
+            expected = python_service.get_capacity_status(*arguments)
+            assert numpy_service.get_capacity_status(*arguments) == expected
+            remaining.extend(slot["remainingCapacity"] for canteen in expected for slot in canteen["slots"])
+    assert 0 in remaining and max(remaining) > 3
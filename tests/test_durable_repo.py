@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+import threading
+from datetime import date, time, timedelta
+import pytest
+from src.domain.models import Canteen, Reservation, Student, WorkingHour
+from src.repository.durable_repo import AppendLog, DurableMemoryRepository
+
+DAY = date(2030, 1, 7)
+
+
+def _canteen(name: str) -> Canteen:
+    return Canteen(name=name, location="Novi Sad", capacity=10,
+                   workingHours=[WorkingHour(meal="lunch", **{"from": time(11), "to": time(15)})])
+
+
+def _fill(directory: str):
+    repo = DurableMemoryRepository(directory, fsync_interval=0)
+    deleted = repo.add_canteen(_canteen("Obrisana"))
+    kept = repo.add_canteen(_canteen("Ostaje"))
+    student = repo.add_student(Student(name="Pera", email="pera@test.com"))
+    for hour in (11, 12, 13):
+        repo.add_reservation(Reservation(studentId=student.id, canteenId=deleted.id, date=DAY, time=time(hour), duration=30))
+    repo.add_reservation(Reservation(studentId=student.id, canteenId=kept.id, date=DAY, time=time(14), duration=30))
+    repo.close()
+    return deleted.id, kept.id, student.id
+
+
+def _delete_canteen_and_crash(directory: str, canteen_id: str, snapshot: bool):
+    repo = DurableMemoryRepository(directory, fsync_interval=0)
+    repo.delete_canteen(canteen_id)
+    if snapshot:
+        repo.snapshot()
+    # Proces pada pre nego sto pozadinski posao obrise rezervacije menze
+    os._exit(1)
+
+
+@pytest.mark.parametrize("snapshot", [False, True])
+def test_canteen_deletion_interrupted_by_crash_is_finished_on_restart(tmp_path, snapshot):
+    """
+    Rezervacije menze obrisane neposredno pre pada procesa se brisu pri sledecem pokretanju
+    """
+    deleted_id, kept_id, student_id = _fill(str(tmp_path))
+    process = multiprocessing.get_context("fork").Process(target=_delete_canteen_and_crash, args=(str(tmp_path), deleted_id, snapshot))
+    process.start()
+    process.join()
+    assert process.exitcode == 1
+
+    repo = DurableMemoryRepository(str(tmp_path), fsync_interval=0)
+    assert repo.get_canteen_by_id(deleted_id) is None
+    # Preostale rezervacije studenta vise ne blokiraju termine u drugim menzama
+    assert [r.canteenId for r in repo.get_reservations_by_student_id(student_id)] == [kept_id]
+    assert repo.get_active_reservations_by_canteen_and_date(deleted_id, DAY) == []
+    repo.close()
+
+    # Zavrseno brisanje je upisano u log, pa ga ni sledece pokretanje ne ponavlja
+    repo = DurableMemoryRepository(str(tmp_path), fsync_interval=0)
+    assert [r.canteenId for r in repo.get_reservations_by_student_id(student_id)] == [kept_id]
+    assert repo._pending_cascades == set()
+    repo.close()
+
+
+def _state(repo: DurableMemoryRepository, canteen_ids, student_ids):
+    days = [DAY + timedelta(days=offset) for offset in range(3)]
+    return ({student_id: sorted(r.model_dump_json() for r in repo.get_reservations_by_student_id(student_id)) for student_id in student_ids},
+            {(canteen_id, day): (repo.get_occupancy(canteen_id, day).counts, repo.get_day_version(canteen_id, day))
+             for canteen_id in canteen_ids for day in days})
+
+
+def test_snapshot_and_log_tail_round_trip_with_torn_last_line(tmp_path):
+    """
+    Posle pokretanja je stanje isto kao pre gasenja: snapshot + rep loga, bez nedovrsenog poslednjeg zapisa
+    """
+    repo = DurableMemoryRepository(str(tmp_path), fsync_interval=0, snapshot_every=10**9)
+    canteen_ids = [repo.add_canteen(_canteen(f"Menza {i}")).id for i in range(2)]
+    student_ids = [repo.add_student(Student(name=f"Student {i}", email=f"s{i}@test.com")).id for i in range(5)]
+
+    def book(i: int):
+        return repo.add_reservation(Reservation(studentId=student_ids[i % 5], canteenId=canteen_ids[i % 2], date=DAY + timedelta(days=i % 3),
+                                                time=time(11 + i % 4, 30 * (i % 2)), duration=30 + 30 * (i % 2)))
+
+    before_snapshot = [book(i) for i in range(60)]
+    repo.cancel_reservation(before_snapshot[0].id)
+    repo.snapshot()
+    # Rep loga: nove rezervacije izmesane sa otkazivanjem i izmenom menze
+    tail = [book(i) for i in range(60, 100)]
+    repo.cancel_reservation(before_snapshot[1].id)
+    repo.cancel_reservation(tail[0].id)
+    repo.update_canteen(canteen_ids[0], {"capacity": 20})
+    book(100)
+    expected = _state(repo, canteen_ids, student_ids)
+    repo.close()
+
+    last_segment = sorted(name for name in os.listdir(tmp_path) if name.startswith("wal-"))[-1]
+    with open(tmp_path / last_segment, "ab") as f:
+        f.write(b'["reservation", "' + tail[1].id.encode())
+
+    repo = DurableMemoryRepository(str(tmp_path), fsync_interval=0)
+    assert any(name.startswith("snapshot-") for name in os.listdir(tmp_path))
+    assert _state(repo, canteen_ids, student_ids) == expected
+    assert repo.get_canteen_by_id(canteen_ids[0]).capacity == 20
+    assert repo.get_reservation_by_id(tail[0].id).status == "Cancelled"
+    # Novi zapisi idu u novi segment, iza nedovrsenog zapisa se ne dopisuje
+    added = book(101)
+    repo.close()
+
+    repo = DurableMemoryRepository(str(tmp_path), fsync_interval=0)
+    assert repo.get_reservation_by_id(added.id) == added
+    repo.close()
+
+
+def test_append_does_not_wait_for_periodic_fsync(tmp_path, monkeypatch):
+    """
+    Upis u log ne ceka periodicni fsync, a zapis je u fajlu i pre nego sto fsync zavrsi
+    """
+    started, release = threading.Event(), threading.Event()
+    fsync = os.fsync
+
+    def slow_fsync(descriptor):
+        started.set()
+        release.wait(5)
+        fsync(descriptor)
+
+    log = AppendLog(str(tmp_path), 1, fsync_interval=0.01)
+    monkeypatch.setattr(os, "fsync", slow_fsync)
+    log.append(["first"])
+    assert started.wait(5)
+
+    # Flusher stoji u fsync-u, a upis prolazi bez cekanja
+    writer = threading.Thread(target=log.append, args=(["second"],))
+    writer.start()
+    writer.join(2)
+    assert not writer.is_alive()
+    release.set()
+    log.close()
+    assert (tmp_path / "wal-00000001.log").read_bytes() == b'["first"]\n["second"]\n'
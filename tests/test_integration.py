@@ -327,4 +327,368 @@ def test_12_cancel_already_cancelled_reservation(client):
     response = client.delete(f"/reservations/{RESERVATION_ID}", headers=headers)
     
     assert response.status_code == 400
-    assert "Rezervacija je već otkazana" in response.json()["detail"]
\ No newline at end of file
+    assert "Rezervacija je već otkazana" in response.json()["detail"]
+
+def test_13_concurrent_reservations_do_not_overbook(client):
+    """
+    Testira da istovremene rezervacije za isti termin ne prekorace kapacitet menze
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    assert ADMIN_ID is not None
+
+    CAPACITY = 5
+    canteen_data = {
+        "name": "Menza Gužva Test",
+        "location": "Novi Sad",
+        "capacity": CAPACITY,
+        "workingHours": [{"meal": "lunch", "from": "12:00", "to": "15:00"}]
+    }
+    canteen_resp = client.post("/canteens", json=canteen_data, headers={"studentId": ADMIN_ID})
+    assert canteen_resp.status_code == 201
+    canteen_id = canteen_resp.json()["id"]
+
+    student_ids = []
+    for i in range(4 * CAPACITY):
+        student_resp = client.post("/students", json={"name": f"Gužva {i}", "email": f"guzva{i}@test.com"})
+        assert student_resp.status_code == 201
+        student_ids.append(student_resp.json()["id"])
+
+    day = (date.today() + timedelta(days=2)).isoformat()
+
+    def book(student_id):
+        with httpx.Client(base_url=BASE_URL, follow_redirects=True) as c:
+            payload = {"studentId": student_id, "canteenId": canteen_id, "date": day, "time": "12:00", "duration": 30}
+            return c.post("/reservations", json=payload).status_code
+
+    with ThreadPoolExecutor(max_workers=len(student_ids)) as pool:
+        statuses = list(pool.map(book, student_ids))
+
+    assert statuses.count(201) == CAPACITY
+    assert statuses.count(400) == len(student_ids) - CAPACITY
+
+
+def test_14_capacity_status_etag(client):
+    """
+    Testira da neizmenjen status vraca 304, a da ga nova rezervacija menja
+    """
+    assert STUDENT_ID is not None and CANTEEN_ID is not None
+
+    day = (date.today() + timedelta(days=3)).isoformat()
+    params = {"startDate": day, "endDate": day, "startTime": "12:00", "endTime": "15:00", "duration": 30}
+
+    first = client.get(f"/canteens/{CANTEEN_ID}/status", params=params)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    unchanged = client.get(f"/canteens/{CANTEEN_ID}/status", params=params, headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+
+    payload = {"studentId": STUDENT_ID, "canteenId": CANTEEN_ID, "date": day, "time": "12:00", "duration": 30}
+    assert client.post("/reservations", json=payload).status_code == 201
+
+    changed = client.get(f"/canteens/{CANTEEN_ID}/status", params=params, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["slots"][0]["remainingCapacity"] == first.json()["slots"][0]["remainingCapacity"] - 1
+
+
+def test_15_capacity_status_ndjson_stream(client):
+    """
+    Testira da status u NDJSON modu vraca po jedan zapis za svaku menzu i dan
+    """
+    import json
+
+    assert CANTEEN_ID is not None
+
+    start = date.today() + timedelta(days=1)
+    end = start + timedelta(days=2)
+    params = {"startDate": start.isoformat(), "endDate": end.isoformat(), "startTime": "08:00", "endTime": "15:00", "duration": 30}
+
+    response = client.get(f"/canteens/{CANTEEN_ID}/status", params=params, headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["date"] for r in records] == [(start + timedelta(days=i)).isoformat() for i in range(3)]
+    assert all(r["canteenId"] == CANTEEN_ID for r in records)
+
+    regular = client.get(f"/canteens/{CANTEEN_ID}/status", params=params).json()
+    assert [slot for r in records for slot in r["slots"]] == regular["slots"]
+
+
+def test_16_batch_reservations(client):
+    """
+    Testira grupnu rezervaciju u best-effort i all-or-nothing modu
+    """
+    assert CANTEEN_ID is not None
+
+    day = (date.today() + timedelta(days=4)).isoformat()
+    student_ids = []
+    for i in range(3):
+        student_resp = client.post("/students", json={"name": f"Tim {i}", "email": f"tim{i}@test.com"})
+        assert student_resp.status_code == 201
+        student_ids.append(student_resp.json()["id"])
+
+    items = [{"studentId": sid, "canteenId": CANTEEN_ID, "date": day, "time": "13:00", "duration": 30} for sid in student_ids]
+    invalid = {"studentId": student_ids[0], "canteenId": CANTEEN_ID, "date": day, "time": "13:00", "duration": 30}
+
+    atomic_resp = client.post("/reservations/batch", params={"atomic": "true"}, json=items + [invalid])
+    assert atomic_resp.status_code == 200
+    assert atomic_resp.json()["created"] == 0
+    assert [r["status"] for r in atomic_resp.json()["results"]] == ["rejected"] * 3 + ["failed"]
+
+    best_effort_resp = client.post("/reservations/batch", json=items + [invalid])
+    assert best_effort_resp.status_code == 200
+    body = best_effort_resp.json()
+    assert body["created"] == 3 and body["failed"] == 1
+    assert "Student već ima aktivnu rezervaciju" in body["results"][3]["error"]
+    assert all(r["reservation"]["status"] == "Active" for r in body["results"][:3])
+
+
+def test_17_bulk_student_import(client):
+    """
+    Testira masovni uvoz studenata iz CSV i NDJSON tela sa izvestajem o greskama po redu
+    """
+    csv_body = "name,email,isAdmin\n" \
+               "Uvoz Jedan,uvoz1@test.com,false\n" \
+               "Uvoz Dva,uvoz2@test.com,\n" \
+               "Uvoz Duplikat,uvoz1@test.com,false\n" \
+               "Bez Emaila,,false\n"
+    csv_resp = client.post("/students/import", content=csv_body, headers={"Content-Type": "text/csv"})
+    assert csv_resp.status_code == 200
+    report = csv_resp.json()
+    assert report["imported"] == 2 and report["failed"] == 2
+    assert [e["row"] for e in report["errors"]] == [4, 5]
+
+    ndjson_body = '{"name": "Uvoz Tri", "email": "uvoz3@test.com"}\n' \
+                  '{"name": "Uvoz Postojeci", "email": "uvoz2@test.com"}\n' \
+                  'nije json\n'
+    ndjson_resp = client.post("/students/import", content=ndjson_body, headers={"Content-Type": "application/x-ndjson"})
+    assert ndjson_resp.status_code == 200
+    assert ndjson_resp.json()["imported"] == 1 and ndjson_resp.json()["failed"] == 2
+
+    unsupported = client.post("/students/import", content="x", headers={"Content-Type": "text/plain"})
+    assert unsupported.status_code == 415
+
+
+def test_18_metrics_endpoint(client):
+    """
+    Testira da /metrics vraca Prometheus metrike po sablonu rute i operacijama repozitorijuma
+    """
+    assert CANTEEN_ID is not None
+
+    assert client.get(f"/canteens/{CANTEEN_ID}").status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/canteens/{canteen_id}",status="200"}' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/canteens/{canteen_id}",le="+Inf"}' in body
+    assert 'repository_operations_total{backend=' in body
+    assert 'service_operation_duration_seconds_count{service="ReservationService",operation="check_capacity"}' in body
+
+
+def test_19_next_available_slots(client):
+    """
+    Testira da pretraga vraca najranije slobodne termine i preskace popunjene
+    """
+    assert ADMIN_ID is not None
+
+    canteen_data = {
+        "name": "Menza Sledeci Termin",
+        "location": "Niš",
+        "capacity": 1,
+        "workingHours": [{"meal": "dinner", "from": "18:00", "to": "19:00"}]
+    }
+    canteen_resp = client.post("/canteens", json=canteen_data, headers={"studentId": ADMIN_ID})
+    assert canteen_resp.status_code == 201
+    canteen_id = canteen_resp.json()["id"]
+
+    student_resp = client.post("/students", json={"name": "Rani Termin", "email": "rani.termin@test.com"})
+    assert student_resp.status_code == 201
+
+    day = date.today() + timedelta(days=1)
+    payload = {"studentId": student_resp.json()["id"], "canteenId": canteen_id, "date": day.isoformat(), "time": "18:00", "duration": 30}
+    assert client.post("/reservations", json=payload).status_code == 201
+
+    params = {"meal": "dinner", "duration": 30, "canteenId": canteen_id, "startDate": day.isoformat(), "limit": 2}
+    response = client.get("/canteens/next-available", params=params)
+    assert response.status_code == 200
+    assert [(s["date"], s["startTime"]) for s in response.json()] == [
+        (day.isoformat(), "18:30"), ((day + timedelta(days=1)).isoformat(), "18:00")]
+    assert all(s["canteenId"] == canteen_id and s["remainingCapacity"] == 1 for s in response.json())
+
+    too_large = client.get("/canteens/next-available", params={**params, "partySize": 2})
+    assert too_large.status_code == 200 and too_large.json() == []
+
+    missing = client.get("/canteens/next-available", params={**params, "canteenId": "nepostojeca"})
+    assert missing.status_code == 404
+
+
+def test_20_capacity_status_stream(client):
+    """
+    Testira da SSE tok salje pocetni status, a zatim samo termine izmenjene novom rezervacijom
+    """
+    import json
+
+    assert STUDENT_ID is not None and CANTEEN_ID is not None
+
+    day = (date.today() + timedelta(days=4)).isoformat()
+    params = {"startDate": day, "endDate": day, "startTime": "12:00", "endTime": "15:00", "duration": 30}
+
+    with client.stream("GET", f"/canteens/{CANTEEN_ID}/status/stream", params=params) as stream:
+        assert stream.status_code == 200
+        assert stream.headers["content-type"].startswith("text/event-stream")
+
+        events = []
+        lines = stream.iter_lines()
+        for line in lines:
+            if line.startswith("event:"):
+                name = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                events.append((name, json.loads(line[len("data:"):])))
+                if name == "snapshot":
+                    payload = {"studentId": STUDENT_ID, "canteenId": CANTEEN_ID, "date": day, "time": "13:00", "duration": 30}
+                    assert httpx.post(f"{BASE_URL}/reservations/", json=payload).status_code == 201
+                else:
+                    break
+
+    (snapshot_name, snapshot), (delta_name, delta) = events
+    assert snapshot_name == "snapshot" and delta_name == "delta"
+    before = {slot["startTime"]: slot["remainingCapacity"] for slot in snapshot["slots"]}
+    assert delta["slots"] == [{"date": day, "startTime": "13:00", "remainingCapacity": before["13:00"] - 1}]
+
+    assert client.get("/canteens/nepostojeca/status/stream", params=params).status_code == 404
+
+
+def test_21_delete_canteen_runs_background_job(client):
+    """
+    Testira da brisanje menze vraca 202 sa poslom koji u pozadini brise njene rezervacije
+    """
+    import time
+
+    assert ADMIN_ID is not None
+
+    canteen_data = {
+        "name": "Menza Za Brisanje",
+        "location": "Kragujevac",
+        "capacity": 10,
+        "workingHours": [{"meal": "lunch", "from": "12:00", "to": "15:00"}]
+    }
+    canteen_resp = client.post("/canteens", json=canteen_data, headers={"studentId": ADMIN_ID})
+    assert canteen_resp.status_code == 201
+    canteen_id = canteen_resp.json()["id"]
+
+    day = (date.today() + timedelta(days=5)).isoformat()
+    reservation_ids = []
+    for i in range(3):
+        student_resp = client.post("/students", json={"name": f"Brisanje {i}", "email": f"brisanje{i}@test.com"})
+        assert student_resp.status_code == 201
+        payload = {"studentId": student_resp.json()["id"], "canteenId": canteen_id, "date": day, "time": "12:00", "duration": 30}
+        reservation_resp = client.post("/reservations", json=payload)
+        assert reservation_resp.status_code == 201
+        reservation_ids.append(reservation_resp.json()["id"])
+
+    delete_resp = client.delete(f"/canteens/{canteen_id}", headers={"studentId": ADMIN_ID})
+    assert delete_resp.status_code == 202
+    job = delete_resp.json()
+    assert delete_resp.headers["Location"] == f"/jobs/{job['id']}"
+    assert client.get(f"/canteens/{canteen_id}").status_code == 404
+
+    for _ in range(50):
+        job = client.get(f"/jobs/{job['id']}").json()
+        if job["status"] in ("succeeded", "failed"):
+            break
+        time.sleep(0.1)
+
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"canteenId": canteen_id, "deletedReservations": 3}
+    assert all(client.delete(f"/reservations/{rid}", headers={"studentId": ADMIN_ID}).status_code == 404 for rid in reservation_ids)
+
+    assert client.get("/jobs/nepostojeci").status_code == 404
+
+
+def test_22_canteen_update_impact_report(client):
+    """
+    Testira dryRun izvestaj o rezervacijama koje bi smanjenje kapaciteta i radnog vremena pogodilo
+    """
+    assert ADMIN_ID is not None
+
+    canteen_data = {
+        "name": "Menza Za Izmenu",
+        "location": "Subotica",
+        "capacity": 5,
+        "workingHours": [{"meal": "lunch", "from": "12:00", "to": "16:00"}]
+    }
+    canteen_resp = client.post("/canteens", json=canteen_data, headers={"studentId": ADMIN_ID})
+    assert canteen_resp.status_code == 201
+    canteen_id = canteen_resp.json()["id"]
+
+    day = (date.today() + timedelta(days=6)).isoformat()
+    reservation_ids = []
+    for i, slot in enumerate(["12:00", "12:00", "12:30", "15:00"]):
+        student_resp = client.post("/students", json={"name": f"Izmena {i}", "email": f"izmena{i}@test.com"})
+        assert student_resp.status_code == 201
+        payload = {"studentId": student_resp.json()["id"], "canteenId": canteen_id, "date": day, "time": slot, "duration": 60}
+        reservation_resp = client.post("/reservations", json=payload)
+        assert reservation_resp.status_code == 201
+        reservation_ids.append(reservation_resp.json()["id"])
+
+    update = {"capacity": 2, "workingHours": [{"meal": "lunch", "from": "12:00", "to": "15:30"}]}
+    dry_resp = client.put(f"/canteens/{canteen_id}", params={"dryRun": "true"}, json=update, headers={"studentId": ADMIN_ID})
+    assert dry_resp.status_code == 200
+    report = dry_resp.json()
+    assert report["affectedReservations"] == 4
+    assert len(report["days"]) == 1 and report["days"][0]["date"] == day
+    slots = report["days"][0]["overbookedSlots"]
+    assert [slot["startTime"] for slot in slots] == ["12:30"]
+    assert slots[0]["reserved"] == 3 and slots[0]["excess"] == 1
+    assert sorted(slots[0]["reservationIds"]) == sorted(reservation_ids[:3])
+    assert report["days"][0]["outsideWorkingHours"] == [reservation_ids[3]]
+
+    # dryRun ne menja menzu
+    assert client.get(f"/canteens/{canteen_id}").json()["capacity"] == 5
+
+    apply_resp = client.put(f"/canteens/{canteen_id}", params={"impact": "true"}, json={"capacity": 3}, headers={"studentId": ADMIN_ID})
+    assert apply_resp.status_code == 200
+    assert apply_resp.json()["canteen"]["capacity"] == 3
+    assert apply_resp.json()["canteen"]["workingHours"][0]["from"] == "12:00"
+    assert apply_resp.json()["impact"]["affectedReservations"] == 0
+
+
+def test_23_idempotent_reservation_retry(client):
+    """
+    Testira da ponovljen zahtev sa istim Idempotency-Key vraca prvobitnu rezervaciju
+    """
+    assert CANTEEN_ID is not None
+
+    student_resp = client.post("/students", json={"name": "Mobilni Klijent", "email": "mobilni@test.com"})
+    assert student_resp.status_code == 201
+    student_id = student_resp.json()["id"]
+
+    payload = {
+        "studentId": student_id,
+        "canteenId": CANTEEN_ID,
+        "date": (date.today() + timedelta(days=7)).isoformat(),
+        "time": "13:00",
+        "duration": 30
+    }
+    headers = {"Idempotency-Key": "rezervacija-1"}
+    first = client.post("/reservations", json=payload, headers=headers)
+    assert first.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+
+    retry = client.post("/reservations", json=payload, headers=headers)
+    assert retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+
+    # Isti kljuc za drugaciji zahtev se odbija
+    other = client.post("/reservations", json={**payload, "time": "14:00"}, headers=headers)
+    assert other.status_code == 422
+
+    # Bez kljuca ponovljen zahtev prolazi celu proveru i pada na preklapanju
+    assert client.post("/reservations", json=payload).status_code == 400
@@ -0,0 +1,32 @@
+import anyio
+from src.profiling import ProfilingMiddleware
+
+
+def test_loop_profile_reports_requests_handled_in_same_window(tmp_path):
+    """
+    Pregled profila navodi koliko drugih zahteva je obradjeno na event loop-u dok je trajao profilisan zahtev
+    """
+    async def main():
+        release = anyio.Event()
+
+        async def app(scope, receive, send):
+            if scope["path"] == "/slow":
+                await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def send(message):
+            pass
+
+        # Sa sample_rate 1 se profilise prvi zahtev, a ostali prolaze dok je profiler zauzet
+        middleware = ProfilingMiddleware(app, repo=None, directory=str(tmp_path), sample_rate=1)
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(middleware, {"type": "http", "path": "/slow", "headers": [(b"x-request-id", b"probe")]}, None, send)
+            await anyio.sleep(0.01)
+            for _ in range(3):
+                await middleware({"type": "http", "path": "/fast", "headers": []}, None, send)
+            release.set()
+
+    anyio.run(main)
+    summary = (tmp_path / "probe.txt").read_text()
+    assert summary.startswith("Napomena: deo profila iz event loop niti obuhvata i 3 drugih zahteva")
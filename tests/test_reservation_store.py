@@ -0,0 +1,154 @@
+import threading
+from datetime import date, time, timedelta
+from src.domain.models import Reservation
+from src.repository.occupancy import DayOccupancy
+from src.repository.repo import MemoryRepository
+from src.repository.reservation_store import ReservationStore
+
+
+def _reservation(student_id: str = "s1", canteen_id: str = "c1", day: date = date(2030, 1, 7), start: time = time(12), duration: int = 30) -> Reservation:
+    return Reservation(studentId=student_id, canteenId=canteen_id, date=day, time=start, duration=duration)
+
+
+def test_reservation_from_store_can_be_assigned_and_copied():
+    """
+    Rezervacija procitana iz skladista se ponasa kao obican pydantic model
+    """
+    store = ReservationStore()
+    added = store.add(_reservation())
+
+    reservation = store.get(added.id)
+    reservation.status = "Cancelled"
+    copy = reservation.model_copy(update={"duration": 60})
+
+    assert reservation.status == "Cancelled"
+    assert copy.duration == 60 and copy.status == "Cancelled"
+    assert "status" in reservation.model_fields_set
+    # Izmena procitane kopije ne menja skladiste ni druge procitane rezervacije
+    assert store.get(added.id).status == "Active"
+    assert store.get(added.id).model_fields_set == set(Reservation.model_fields)
+
+
+def test_archive_moves_past_days_and_merges_segments():
+    """
+    Arhiviranje seli prosle dane u segmente koji se spajaju, a rezervacije ostaju dostupne
+    """
+    store = ReservationStore()
+    first_day = date(2030, 1, 1)
+    added = [store.add(_reservation(student_id=f"s{i % 7}", canteen_id=f"c{i % 3}", day=first_day + timedelta(days=i % 20),
+                                    start=time(12 + i % 3)))
+             for i in range(2000)]
+    cancelled = {reservation.id for reservation in added[::5]}
+    for reservation_id in cancelled:
+        store.cancel(reservation_id)
+
+    moved = 0
+    for offset in range(1, 16):
+        moved += store.archive_before(first_day + timedelta(days=offset))
+    assert moved == sum(1 for reservation in added if reservation.date < first_day + timedelta(days=15))
+    # Drugi prolaz sa istom granicom nema sta da premesti
+    assert store.archive_before(first_day + timedelta(days=15)) == 0
+    assert store.archived_until == first_day + timedelta(days=15)
+
+    # Svaki segment je bar dvostruko veci od sledeceg, pa ih je O(log n)
+    lives = [segment.live for segment in store._segments]
+    assert all(previous > 2 * following for previous, following in zip(lives, lives[1:]))
+    assert len(store) == len(added)
+
+    for reservation in added:
+        stored = store.get(reservation.id)
+        assert stored.date == reservation.date and stored.studentId == reservation.studentId
+        assert stored.status == ("Cancelled" if reservation.id in cancelled else "Active")
+    assert sorted(r.id for r in store.by_student("s3")) == sorted(r.id for r in added if r.studentId == "s3")
+    expected = sorted(r.id for r in added if r.canteenId == "c1" and r.date == first_day + timedelta(days=4) and r.id not in cancelled)
+    assert sorted(r.id for r in store.active_by_canteen_and_date("c1", first_day + timedelta(days=4))) == expected
+
+    # Arhivirana rezervacija moze da se otkaze, a brisanje menze brise i arhivu
+    archived = next(r for r in added if r.canteenId == "c0" and r.date == first_day + timedelta(days=1) and r.id not in cancelled)
+    assert store.cancel(archived.id)[1] is True
+    assert store.get(archived.id).status == "Cancelled"
+    count, _ = store.delete_by_canteen("c0")
+    assert count == sum(1 for r in added if r.canteenId == "c0")
+    assert store.get(archived.id) is None
+    assert len(store) == len(added) - count
+
+
+def test_archive_prunes_per_day_state_of_memory_repository():
+    """
+    Arhiviranje brise zauzetost i verzije proslih dana, a status tih dana ostaje tacan
+    """
+    repo = MemoryRepository()
+    first_day = date(2030, 1, 1)
+    added = [repo.add_reservation(_reservation(student_id=f"s{i}", canteen_id=f"c{i % 2}", day=first_day + timedelta(days=i % 6),
+                                               start=time(12, 30 * (i % 2)), duration=30 + 30 * (i % 2)))
+             for i in range(120)]
+    days = [first_day + timedelta(days=offset) for offset in range(6)]
+    counts = {(canteen_id, day): repo.get_occupancy(canteen_id, day).counts[:] for canteen_id in ("c0", "c1") for day in days}
+    versions = {(canteen_id, day): repo.get_day_version(canteen_id, day) for canteen_id in ("c0", "c1") for day in days}
+
+    cutoff = first_day + timedelta(days=3)
+    repo.archive_reservations_before(cutoff)
+
+    assert all(day >= cutoff for _, day in repo._occupancy)
+    assert all(day >= cutoff for _, day in repo._day_versions)
+    assert repo.get_active_dates("c0", first_day) == sorted({r.date for r in added if r.canteenId == "c0" and r.date >= cutoff})
+    for (canteen_id, day), previous in counts.items():
+        assert repo.get_occupancy(canteen_id, day).counts == previous
+    # Verzija arhiviranog dana je nova, pa se ne poklapa ni sa jednom ranijom verzijom tog dana
+    assert all(repo.get_day_version(canteen_id, day) > versions[(canteen_id, day)] for canteen_id, day in versions if day < cutoff)
+
+    archived = next(r for r in added if r.date == first_day)
+    version = repo.get_day_version(archived.canteenId, first_day)
+    repo.cancel_reservation(archived.id)
+    assert repo.get_day_version(archived.canteenId, first_day) > version
+    expected = DayOccupancy()
+    for reservation in repo.get_active_reservations_by_canteen_and_date(archived.canteenId, first_day):
+        expected.add(reservation.time, reservation.duration)
+    assert repo.get_occupancy(archived.canteenId, first_day).counts == expected.counts
+    assert sum(expected.counts) < sum(counts[(archived.canteenId, first_day)])
+
+
+def test_archive_and_compaction_keep_changes_made_while_rebuilding():
+    """
+    Otkazivanja, brisanja i nove rezervacije dok se arhiva i kolone prepisuju van brave ostaju u skladistu
+    """
+    store = ReservationStore()
+    first_day = date(2030, 1, 1)
+    expected = {}
+    for i in range(6000):
+        reservation = store.add(_reservation(student_id=f"s{i % 11}", canteen_id=f"c{i % 4}", day=first_day + timedelta(days=i % 30)))
+        expected[reservation.id] = reservation
+
+    def archive():
+        for offset in range(1, 31):
+            store.archive_before(first_day + timedelta(days=offset))
+
+    archiver = threading.Thread(target=archive)
+    archiver.start()
+    ids = list(expected)
+    step = 0
+    while archiver.is_alive() or step < 200:
+        reservation_id = ids[(step * 7919) % len(ids)]
+        if reservation_id in expected and store.cancel(reservation_id)[0] is not None:
+            expected[reservation_id] = expected[reservation_id].model_copy(update={"status": "Cancelled"})
+        # I rezervacije za vec arhivirane dane, koje ostaju u toplom delu do sledeceg arhiviranja
+        added = store.add(_reservation(student_id=f"s{step % 11}", canteen_id=f"c{step % 4}", day=first_day + timedelta(days=step % 40)))
+        expected[added.id] = added
+        if step == 100:
+            while store.delete_by_canteen("c3", limit=500)[0]:
+                pass
+            expected = {key: value for key, value in expected.items() if value.canteenId != "c3"}
+        step += 1
+    archiver.join()
+    store.archive_before(first_day + timedelta(days=30))
+
+    assert len(store) == len(expected)
+    for reservation_id, reservation in expected.items():
+        assert store.get(reservation_id) == reservation
+    for student in {r.studentId for r in expected.values()}:
+        assert sorted(r.id for r in store.by_student(student)) == sorted(r.id for r in expected.values() if r.studentId == student)
+    for canteen in ("c0", "c1", "c2", "c3"):
+        for offset in range(40):
+            day = first_day + timedelta(days=offset)
+            assert sorted(r.id for r in store.active_by_canteen_and_date(canteen, day)) == \
+                sorted(r.id for r in expected.values() if r.canteenId == canteen and r.date == day and r.status == "Active")
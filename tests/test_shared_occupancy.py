@@ -0,0 +1,89 @@
+import os
+import tempfile
+import uuid
+from datetime import date, time
+from multiprocessing import shared_memory
+import pytest
+from src.domain.models import Canteen, Reservation, WorkingHour
+from src.repository.occupancy import DayOccupancy
+from src.repository.sqlite_repo import SqliteRepository
+
+# Deljena zauzetost koristi fcntl, pa postoji samo na POSIX sistemima
+SharedOccupancy = pytest.importorskip("src.repository.shared_occupancy").SharedOccupancy
+
+DAY = date(2030, 1, 7)
+EPOCH = bytes(range(16))
+
+
+@pytest.fixture
+def segment_name():
+    name = f"test-occupancy-{uuid.uuid4().hex[:16]}"
+    yield name
+    segment = shared_memory.SharedMemory(name=name)
+    segment.close()
+    segment.unlink()
+    os.remove(os.path.join(tempfile.gettempdir(), f"{name}.lock"))
+
+
+def _occupancy(*slots) -> DayOccupancy:
+    occupancy = DayOccupancy()
+    for start, duration in slots:
+        occupancy.add(start, duration)
+    return occupancy
+
+
+def test_entries_are_used_only_for_matching_version(segment_name):
+    """
+    Unos vazi samo za verziju dana sa kojom je upisan; stariji upis ne gazi noviji, a izmena se primenjuje samo na prethodnu verziju
+    """
+    shared = SharedOccupancy(segment_name, 64, EPOCH)
+    shared.put("c1", DAY, 3, _occupancy((time(12), 60)))
+    assert shared.get("c1", DAY, 3).counts == _occupancy((time(12), 60)).counts
+    assert shared.get("c1", DAY, 4) is None
+    assert shared.get("c2", DAY, 3) is None
+
+    # Sporiji proces koji je procitao stariju verziju ne sme da vrati unos unazad
+    shared.put("c1", DAY, 2, _occupancy())
+    assert shared.get("c1", DAY, 3) is not None
+
+    shared.apply("c1", DAY, 4, [(time(12), 30, 1)])
+    assert shared.get("c1", DAY, 4).counts == _occupancy((time(12), 60), (time(12), 30)).counts
+    # Izmena koja ne nastavlja verziju unosa (propustena izmena drugog procesa) se preskace
+    shared.apply("c1", DAY, 6, [(time(13), 30, 1)])
+    assert shared.get("c1", DAY, 4) is not None and shared.get("c1", DAY, 6) is None
+
+    # Drugi proces vidi isti segment, a segment druge baze (druga epoha) se prazni
+    other_process = SharedOccupancy(segment_name, 64, EPOCH)
+    assert other_process.get("c1", DAY, 4) is not None
+    other_database = SharedOccupancy(segment_name, 64, bytes(16))
+    assert shared.get("c1", DAY, 4) is None
+    with pytest.raises(ValueError):
+        SharedOccupancy(segment_name, 128, bytes(16))
+    for instance in (shared, other_process, other_database):
+        instance.close()
+
+
+def test_sqlite_workers_never_read_stale_shared_occupancy(tmp_path, segment_name):
+    """
+    Workeri nad istom bazom dele zauzetost, a izmena koja nije stigla u segment (npr. pad pre apply) se prepoznaje po verziji
+    """
+    path = str(tmp_path / "canteen.db")
+    first = SqliteRepository(path, shared_occupancy_entries=64, shared_occupancy_name=segment_name)
+    second = SqliteRepository(path, shared_occupancy_entries=64, shared_occupancy_name=segment_name)
+    # Proces koji ne azurira segment, kao worker koji padne izmedju commit-a i apply
+    without_segment = SqliteRepository(path)
+    canteen = first.add_canteen(Canteen(name="Menza", location="Novi Sad", capacity=10,
+                                        workingHours=[WorkingHour(meal="lunch", **{"from": time(11), "to": time(15)})]))
+
+    first.add_reservation(Reservation(studentId="s1", canteenId=canteen.id, date=DAY, time=time(12), duration=30))
+    assert second.get_occupancy(canteen.id, DAY).count_overlapping(time(12), 30) == 1
+    reservation = second.add_reservation(Reservation(studentId="s2", canteenId=canteen.id, date=DAY, time=time(12), duration=60))
+    assert first.get_occupancy(canteen.id, DAY).count_overlapping(time(12), 30) == 2
+
+    without_segment.cancel_reservation(reservation.id)
+    without_segment.add_reservation(Reservation(studentId="s3", canteenId=canteen.id, date=DAY, time=time(14), duration=30))
+    expected = _occupancy((time(12), 30), (time(14), 30)).counts
+    assert first.get_occupancy(canteen.id, DAY).counts == expected
+    assert second.get_occupancy(canteen.id, DAY).counts == expected
+    first.close()
+    second.close()
@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+from datetime import date, time, timedelta
+import pytest
+from src.domain.models import Canteen, Reservation, Student, WorkingHour
+from src.repository.sqlite_repo import SqliteRepository
+
+DAY = date(2030, 1, 7)
+
+
+def _canteen(name: str) -> Canteen:
+    return Canteen(name=name, location="Novi Sad", capacity=10,
+                   workingHours=[WorkingHour(meal="lunch", **{"from": time(11), "to": time(15)})])
+
+
+def _delete_canteen_and_crash(path: str, canteen_id: str):
+    repo = SqliteRepository(path)
+    repo.delete_canteen(canteen_id)
+    # Proces pada pre nego sto pozadinski posao obrise rezervacije menze
+    os._exit(1)
+
+
+def test_canteen_deletion_interrupted_by_crash_is_finished_on_restart(tmp_path):
+    """
+    Rezervacije menze obrisane neposredno pre pada procesa se brisu pri sledecem otvaranju baze
+    """
+    path = str(tmp_path / "canteen.db")
+    repo = SqliteRepository(path)
+    deleted = repo.add_canteen(_canteen("Obrisana"))
+    kept = repo.add_canteen(_canteen("Ostaje"))
+    student = repo.add_student(Student(name="Pera", email="pera@test.com"))
+    for hour in (11, 12, 13):
+        repo.add_reservation(Reservation(studentId=student.id, canteenId=deleted.id, date=DAY, time=time(hour), duration=30))
+    repo.add_reservation(Reservation(studentId=student.id, canteenId=kept.id, date=DAY, time=time(14), duration=30))
+
+    process = multiprocessing.get_context("fork").Process(target=_delete_canteen_and_crash, args=(path, deleted.id))
+    process.start()
+    process.join()
+    assert process.exitcode == 1
+    # Bez ponovnog otvaranja rezervacije obrisane menze su jos u bazi
+    assert len(repo.get_reservations_by_student_id(student.id)) == 4
+
+    repo = SqliteRepository(path)
+    assert repo.get_canteen_by_id(deleted.id) is None
+    assert [r.canteenId for r in repo.get_reservations_by_student_id(student.id)] == [kept.id]
+    assert repo._connection().execute("SELECT COUNT(*) FROM pending_cascades").fetchone()[0] == 0
+
+
+def test_versions_change_with_every_write_and_never_go_back(tmp_path):
+    """
+    Verzije dana i menze rastu pri svakoj izmeni koja ih se tice, a clear_all ih ne vraca na nulu
+    """
+    repo = SqliteRepository(str(tmp_path / "canteen.db"))
+    canteen = repo.add_canteen(_canteen("Prva"))
+    other = repo.add_canteen(_canteen("Druga"))
+    next_day = DAY + timedelta(days=1)
+    assert repo.get_day_version(canteen.id, DAY) == 0
+
+    reservation = repo.add_reservation(Reservation(studentId="s1", canteenId=canteen.id, date=DAY, time=time(12), duration=60))
+    repo.add_reservations([Reservation(studentId="s2", canteenId=canteen.id, date=next_day, time=time(12), duration=30),
+                           Reservation(studentId="s3", canteenId=canteen.id, date=next_day, time=time(13), duration=30)])
+    repo.add_reservation(Reservation(studentId="s4", canteenId=other.id, date=DAY, time=time(12), duration=30))
+    assert (repo.get_day_version(canteen.id, DAY), repo.get_day_version(canteen.id, next_day)) == (1, 1)
+
+    # Otkazivanje menja verziju samo kada rezervacija zaista prestane da bude aktivna
+    repo.cancel_reservation(reservation.id)
+    repo.cancel_reservation(reservation.id)
+    assert repo.get_day_version(canteen.id, DAY) == 2
+    assert not any(repo.get_occupancy(canteen.id, DAY).counts)
+
+    repo.update_canteen(canteen.id, {"capacity": 20})
+    assert repo.get_canteen_version(canteen.id) == 1
+
+    # Brisanje rezervacija menze menja verzije svih njenih dana, a druge menze ne dira
+    assert repo.delete_reservations_by_canteen_id(canteen.id, limit=1) == 1
+    assert repo.delete_reservations_by_canteen_id(canteen.id, limit=5) == 2
+    assert repo.get_canteen_version(canteen.id) == 3
+    assert (repo.get_day_version(canteen.id, DAY), repo.get_day_version(canteen.id, next_day)) == (4, 3)
+    assert repo.get_day_version(other.id, DAY) == 1
+
+    versions = (repo.get_day_version(other.id, DAY), repo.get_canteen_version(canteen.id))
+    epoch = repo._get_version("epoch")
+    repo.clear_all()
+    assert (repo.get_day_version(other.id, DAY), repo.get_canteen_version(canteen.id)) == (versions[0] + 1, versions[1] + 1)
+    assert repo._get_version("epoch") == epoch
+
+
+def test_nested_transaction_commits_or_rolls_back_as_one(tmp_path):
+    """
+    Unutrasnja transakcija je deo spoljasnje: greska ponistava sve upise i verzije, a commit je vidljiv drugim konekcijama
+    """
+    path = str(tmp_path / "canteen.db")
+    repo = SqliteRepository(path)
+    # Druga instanca nad istim fajlom ima svoju konekciju, kao drugi worker proces
+    other_process = SqliteRepository(path)
+    canteen = repo.add_canteen(_canteen("Prva"))
+
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.add_reservation(Reservation(studentId="s1", canteenId=canteen.id, date=DAY, time=time(12), duration=30))
+            repo.update_canteen(canteen.id, {"capacity": 20})
+            raise RuntimeError("prekid")
+    assert repo.get_reservations_by_student_id("s1") == []
+    assert repo.get_canteen_by_id(canteen.id).capacity == 10
+    assert (repo.get_day_version(canteen.id, DAY), repo.get_canteen_version(canteen.id)) == (0, 0)
+
+    with repo.transaction():
+        reservation = repo.add_reservation(Reservation(studentId="s1", canteenId=canteen.id, date=DAY, time=time(12), duration=30))
+        # Pre commit-a druga konekcija ne vidi ni rezervaciju ni novu verziju
+        assert other_process.get_reservation_by_id(reservation.id) is None
+        assert other_process.get_day_version(canteen.id, DAY) == 0
+    assert other_process.get_reservation_by_id(reservation.id) == reservation
+    assert other_process.get_day_version(canteen.id, DAY) == 1
+    assert other_process.get_occupancy(canteen.id, DAY).count_overlapping(time(12), 30) == 1